@@ -0,0 +1,105 @@
+# services/acquisition_service.py
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, TimeoutError, wait
+
+# Constants
+MAX_CONCURRENT_FETCHES = 8  # Upper bound on simultaneous upstream requests across all sessions
+DEFAULT_FETCH_TIMEOUT = 10  # Seconds
+
+# Per-product wall-clock budget in seconds; the global feeds are large, station products are small
+PRODUCT_TIMEOUTS = {
+    "METAR": 5,
+    "TAF": 5,
+    "PIREP": 10,
+    "SIGMET": 10,
+    "GAIRMET": 10,
+    "WINDS": 10,
+}
+
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_FETCHES, thread_name_prefix="weather-fetch")
+
+def product_timeout(product):
+    """Return the fetch timeout in seconds for a weather product."""
+    return PRODUCT_TIMEOUTS.get(product, DEFAULT_FETCH_TIMEOUT)
+
+def submit_fetch(func, *args):
+    """Start one fetch on the shared pool and return its Future."""
+    return _executor.submit(func, *args)
+
+def iter_concurrently(tasks):
+    """Run independent fetches on the shared pool and yield (key, outcome) as each one finishes.
+
+    tasks maps a key to (func, args, timeout). All tasks start immediately and are
+    yielded in completion order. The outcome is the function's result, or the
+    exception it raised (TimeoutError when it overran its own deadline), so one
+    slow or failing fetch never holds back or hides the others.
+    """
+    started = time.monotonic()
+    pending = {
+        _executor.submit(func, *args): (key, started + timeout, timeout)
+        for key, (func, args, timeout) in tasks.items()
+    }
+    while pending:
+        next_deadline = min(deadline for _, deadline, _ in pending.values())
+        done, _ = wait(pending, timeout=max(0.0, next_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        for future in done:
+            key, _, _ = pending.pop(future)
+            try:
+                outcome = future.result()
+            except Exception as e:
+                outcome = e
+            yield key, outcome
+        now = time.monotonic()
+        for future, (key, deadline, timeout) in list(pending.items()):
+            if deadline <= now and not future.done():
+                future.cancel()
+                del pending[future]
+                yield key, TimeoutError(f"timed out after {timeout}s")
+
+def run_concurrently(tasks):
+    """Run independent fetches on the shared pool and collect every outcome.
+
+    Same contract as iter_concurrently, but waits for all tasks and returns a dict
+    mapping every key to its result or exception.
+    """
+    return dict(iter_concurrently(tasks))
+
+class FetchContext:
+    """Request-scoped memo of upstream calls, e.g. for the lifetime of one pilot briefing.
+
+    call(func, *args) runs func at most once per (func, args) within the context;
+    concurrent callers of the same key wait for the first call's result (or
+    exception) instead of repeating it. submit() runs independent work, such as
+    briefing sections, concurrently on the context's own small pool, which is
+    shut down when the context exits.
+    """
+
+    def __init__(self, max_workers=4):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch-context")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._executor.shutdown(wait=True)
+
+    def call(self, func, *args):
+        key = (func, args)
+        with self._lock:
+            future = self._calls.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._calls[key] = future
+        if owner:
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+    def submit(self, func, *args):
+        return self._executor.submit(func, *args)
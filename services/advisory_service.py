@@ -0,0 +1,257 @@
+# services/advisory_service.py
+import numpy as np
+from utils.geodesy import densify_route, to_unit_vectors, angle_between, EARTH_RADIUS_NM
+
+# Constants
+ADVISORY_SPACING_NM = 5  # Route sample spacing for the polygon tests; crossing extents are accurate to about this
+SEVERE_HAZARDS = ("CONVECTIVE", "TS", "ASH", "VA")  # SIGMET hazards shown red regardless of their text
+ADVISORY_KINDS = {"SIGMET": "SIGMET", "GAIRMET": "G-AIRMET"}  # Feed product -> label
+
+def _feet(value, hundreds=False):
+    """Parse an advisory altitude bound; SFC/FZL and missing bounds give None."""
+    try:
+        feet = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(feet * 100) if hundreds else int(feet)
+
+def _advisory_text(entry, kind):
+    raw = entry.get("rawAirSigmet") or entry.get("rawSigmet") or entry.get("rawOb")
+    if raw:
+        return raw
+    # G-AIRMETs are issued as graphics only, so describe them from their fields
+    parts = [kind, entry.get("product"), entry.get("hazard"), entry.get("dueTo")]
+    return " ".join(str(part) for part in parts if part)
+
+def parse_advisory_areas(entries, product="SIGMET"):
+    """Extract each advisory polygon from a SIGMET or G-AIRMET feed.
+
+    Returns [{"kind", "raw", "hazard", "coords": [(lat, lon), ...], "base_ft",
+    "top_ft", "severity"}]. base_ft is 0 for surface-based (or freezing-level-based)
+    advisories and top_ft is None when no top is given. severity follows the
+    0/1/2 scheme of services.briefing_model: severe or convective SIGMETs are 2,
+    every other advisory 1. Only the current G-AIRMET snapshot (the earliest
+    forecast hour in the feed) is kept, and freezing-level lines are skipped.
+    """
+    kind = ADVISORY_KINDS[product]
+    if product == "GAIRMET":
+        hours = [entry.get("forecastHour") for entry in entries if entry.get("forecastHour") is not None]
+        current = min(hours, default=None)
+        entries = [entry for entry in entries if entry.get("forecastHour") in (None, current)]
+
+    areas = []
+    for entry in entries:
+        if entry.get("geom") == "LINE":
+            continue
+        coords = [
+            (float(point["lat"]), float(point["lon"]))
+            for point in entry.get("coords") or []
+            if point.get("lat") is not None and point.get("lon") is not None
+        ]
+        if len(coords) < 3:
+            continue
+        raw = _advisory_text(entry, kind)
+        hazard = str(entry.get("hazard") or "")
+        if product == "GAIRMET":
+            base_ft, top_ft = _feet(entry.get("base"), hundreds=True), _feet(entry.get("top"), hundreds=True)
+        else:
+            base_ft, top_ft = _feet(entry.get("altitudeLow1")), _feet(entry.get("altitudeHi1"))
+        severe = product == "SIGMET" and (
+            "SEV" in raw or str(entry.get("severity", "")).upper().startswith("SEV") or hazard.upper() in SEVERE_HAZARDS
+        )
+        areas.append({
+            "kind": kind,
+            "raw": raw,
+            "hazard": hazard,
+            "coords": coords,
+            "base_ft": base_ft or 0,
+            "top_ft": top_ft,
+            "severity": 2 if severe else 1,
+        })
+    return areas
+
+def _flight_level(feet):
+    return f"FL{feet // 100:03d}" if feet >= 18000 else f"{feet}ft"
+
+def altitude_range_text(area):
+    """Describe an advisory's vertical extent, e.g. "SFC-FL180" or "FL200-FL350"."""
+    base = "SFC" if not area["base_ft"] else _flight_level(area["base_ft"])
+    top = "unlimited" if area["top_ft"] is None else _flight_level(area["top_ft"])
+    return f"{base}-{top}"
+
+class AdvisoryIndex:
+    """Advisory polygons as flat vertex/edge arrays with a bounding box per polygon.
+
+    Polygons are treated as straight-edged in latitude/longitude, as they are drawn
+    on charts. Each polygon's longitudes are unwrapped and centred on [-180, 180),
+    and every query is shifted by whole turns to the polygon's side of the
+    antimeridian, so areas crossing it need no special casing. Queries run in two
+    stages: bounding boxes select candidate (query, polygon) pairs, then only those
+    pairs get exact point-in-polygon and edge-intersection tests, all vectorized.
+    """
+
+    def __init__(self, areas):
+        self.areas = list(areas)
+        self.counts = np.array([len(area["coords"]) for area in self.areas], dtype=np.intp)
+        self.offsets = np.cumsum(self.counts) - self.counts
+        coords = [np.asarray(area["coords"], dtype=np.float64).reshape(-1, 2) for area in self.areas]
+        lat = np.concatenate([c[:, 0] for c in coords]) if coords else np.zeros(0)
+        lon = np.concatenate([np.degrees(np.unwrap(np.radians(c[:, 1]))) for c in coords]) if coords else np.zeros(0)
+
+        # Centre each polygon so its mean longitude lies in [-180, 180)
+        owner = np.repeat(np.arange(len(self.areas)), self.counts)
+        if len(self.areas):
+            mean_lon = np.bincount(owner, weights=lon, minlength=len(self.areas)) / self.counts
+            lon = lon + (((mean_lon + 180.0) % 360.0 - 180.0) - mean_lon)[owner]
+        self.lat, self.lon = lat, lon
+
+        # Edge i runs from vertex i to the next vertex of the same polygon, closing the ring
+        following = np.arange(len(lat)) + 1
+        if len(self.areas):
+            following[self.offsets + self.counts - 1] = self.offsets
+        self.next_vertex = following
+
+        self.min_lat = self._reduce(np.minimum, lat)
+        self.max_lat = self._reduce(np.maximum, lat)
+        self.min_lon = self._reduce(np.minimum, lon)
+        self.max_lon = self._reduce(np.maximum, lon)
+        self.center_lon = (self.min_lon + self.max_lon) / 2.0
+        self.severity = np.array([area["severity"] for area in self.areas], dtype=np.intp)
+
+    def __len__(self):
+        return len(self.areas)
+
+    def _reduce(self, ufunc, values):
+        return ufunc.reduceat(values, self.offsets) if len(self.areas) else np.zeros(0)
+
+    def _box_candidates(self, min_lat, max_lat, min_lon, max_lon):
+        """Return (query, polygon, lon_shift) for every query box overlapping a polygon's box."""
+        center = (np.asarray(min_lon) + np.asarray(max_lon)) / 2.0
+        shift = 360.0 * np.round((self.center_lon[None, :] - center[:, None]) / 360.0)
+        overlap = (
+            (np.asarray(min_lat)[:, None] <= self.max_lat[None, :])
+            & (np.asarray(max_lat)[:, None] >= self.min_lat[None, :])
+            & (np.asarray(min_lon)[:, None] + shift <= self.max_lon[None, :])
+            & (np.asarray(max_lon)[:, None] + shift >= self.min_lon[None, :])
+        )
+        queries, polygons = np.nonzero(overlap)
+        return queries, polygons, shift[queries, polygons]
+
+    def _pair_edges(self, polygons):
+        """Expand (pair -> polygon) into (pair, edge) rows covering every edge of each pair's polygon."""
+        counts = self.counts[polygons]
+        pairs = np.repeat(np.arange(len(polygons)), counts)
+        edges = self.offsets[polygons][pairs] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return pairs, edges
+
+    def _inside(self, lats, lons, polygons):
+        """Even-odd ray test of point i against polygon polygons[i], for all pairs at once."""
+        pairs, edges = self._pair_edges(polygons)
+        y, x = lats[pairs], lons[pairs]
+        y0, x0 = self.lat[edges], self.lon[edges]
+        y1, x1 = self.lat[self.next_vertex[edges]], self.lon[self.next_vertex[edges]]
+        spans = (y0 > y) != (y1 > y)
+        dy = np.where(spans, y1 - y0, 1.0)
+        crossings = spans & (x < x0 + (y - y0) * (x1 - x0) / dy)
+        return np.bincount(pairs, weights=crossings, minlength=len(polygons)) % 2 == 1
+
+    def _crosses_edge(self, lat0, lon0, lat1, lon1, polygons):
+        """True where segment i properly intersects any edge of polygon polygons[i]."""
+        pairs, edges = self._pair_edges(polygons)
+        ax, ay, bx, by = lon0[pairs], lat0[pairs], lon1[pairs], lat1[pairs]
+        cx, cy = self.lon[edges], self.lat[edges]
+        dx, dy = self.lon[self.next_vertex[edges]], self.lat[self.next_vertex[edges]]
+        side_a = (dx - cx) * (ay - cy) - (dy - cy) * (ax - cx)
+        side_b = (dx - cx) * (by - cy) - (dy - cy) * (bx - cx)
+        side_c = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+        side_d = (bx - ax) * (dy - ay) - (by - ay) * (dx - ax)
+        hits = (side_a * side_b < 0) & (side_c * side_d < 0)
+        return np.bincount(pairs, weights=hits, minlength=len(polygons)) > 0
+
+    def containing(self, lats, lons):
+        """Return, for each point, the indices of the advisory areas that contain it."""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        result = [[] for _ in range(len(lats))]
+        if not len(self.areas) or not len(lats):
+            return result
+        points, polygons, shift = self._box_candidates(lats, lats, lons, lons)
+        inside = self._inside(lats[points], lons[points] + shift, polygons)
+        for point, polygon in zip(points[inside].tolist(), polygons[inside].tolist()):
+            result[point].append(polygon)
+        return result
+
+    def route_crossings(self, lats, lons, spacing_nm=ADVISORY_SPACING_NM):
+        """Find the advisory areas each great-circle leg of a route passes through.
+
+        Legs are densified to spacing_nm, leg bounding boxes select candidate
+        polygons, segment boxes narrow those down, and the remaining
+        (segment, polygon) pairs are tested exactly: a segment crosses an area when
+        either end lies inside it or it cuts one of its edges. Returns, per leg, a
+        list of (area index, from_nm, to_nm) giving the stretch of the leg (NM from
+        its start) inside the area, ordered by where the leg enters it.
+        """
+        waypoints = to_unit_vectors(lats, lons)
+        n_legs = len(waypoints) - 1
+        if n_legs < 1:
+            return []
+        result = [[] for _ in range(n_legs)]
+        if not len(self.areas):
+            return result
+
+        sample_lats, sample_lons, leg_ids, fractions = densify_route(lats, lons, max_spacing_nm=spacing_nm)
+        # Segment i joins samples i and i + 1 and belongs to the leg of its start
+        seg_leg = leg_ids[:-1]
+        seg_from = fractions[:-1]
+        seg_to = np.where(leg_ids[1:] == seg_leg, fractions[1:], 1.0)
+        lat0, lat1 = sample_lats[:-1], sample_lats[1:]
+        lon0, lon1 = sample_lons[:-1], sample_lons[1:]
+        seg_min_lat, seg_max_lat = np.minimum(lat0, lat1), np.maximum(lat0, lat1)
+        seg_min_lon, seg_max_lon = np.minimum(lon0, lon1), np.maximum(lon0, lon1)
+
+        # Stage 1: leg boxes against polygon boxes
+        first = np.searchsorted(seg_leg, np.arange(n_legs))
+        last = np.searchsorted(seg_leg, np.arange(n_legs), side="right")
+        legs, polygons, shifts = self._box_candidates(
+            np.minimum.reduceat(seg_min_lat, first), np.maximum.reduceat(seg_max_lat, first),
+            np.minimum.reduceat(seg_min_lon, first), np.maximum.reduceat(seg_max_lon, first),
+        )
+        if not len(legs):
+            return result
+
+        # Stage 2: every segment of a candidate leg against that leg's candidate polygons
+        counts = last[legs] - first[legs]
+        pair = np.repeat(np.arange(len(legs)), counts)
+        segments = first[legs][pair] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        polygons, shifts = polygons[pair], shifts[pair]
+        keep = (
+            (seg_min_lat[segments] <= self.max_lat[polygons]) & (seg_max_lat[segments] >= self.min_lat[polygons])
+            & (seg_min_lon[segments] + shifts <= self.max_lon[polygons])
+            & (seg_max_lon[segments] + shifts >= self.min_lon[polygons])
+        )
+        segments, polygons, shifts = segments[keep], polygons[keep], shifts[keep]
+
+        # Stage 3: exact tests on the surviving pairs
+        hits = (
+            self._inside(lat0[segments], lon0[segments] + shifts, polygons)
+            | self._inside(lat1[segments], lon1[segments] + shifts, polygons)
+            | self._crosses_edge(lat0[segments], lon0[segments] + shifts, lat1[segments], lon1[segments] + shifts, polygons)
+        )
+        segments, polygons = segments[hits], polygons[hits]
+        if not len(segments):
+            return result
+
+        # Merge each (leg, polygon)'s hit segments into the stretch between the first entry and last exit
+        keys, inverse = np.unique(seg_leg[segments] * len(self.areas) + polygons, return_inverse=True)
+        enter = np.full(len(keys), np.inf)
+        leave = np.full(len(keys), -np.inf)
+        np.minimum.at(enter, inverse, seg_from[segments])
+        np.maximum.at(leave, inverse, seg_to[segments])
+        hit_legs, hit_polygons = np.divmod(keys, len(self.areas))
+        leg_nm = EARTH_RADIUS_NM * angle_between(waypoints[:-1], waypoints[1:])
+        order = np.lexsort((enter, hit_legs))
+        enter_nm = enter[order] * leg_nm[hit_legs[order]]
+        leave_nm = leave[order] * leg_nm[hit_legs[order]]
+        for leg, polygon, lo, hi in zip(hit_legs[order].tolist(), hit_polygons[order].tolist(), enter_nm.tolist(), leave_nm.tolist()):
+            result[leg].append((polygon, lo, hi))
+        return result
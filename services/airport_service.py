@@ -1,65 +1,206 @@
 # services/airport_service.py
 
+import io
+import os
+import sqlite3
+from contextlib import closing
+import numpy as np
+import pandas as pd
 import streamlit as st
-import requests
+from services import http_client
 
 # Constants
 OPENFLIGHTS_URL = "https://raw.githubusercontent.com/jpatokal/openflights/master/data/airports.dat"
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+AIRPORT_DB_PATH = os.path.join(DATA_DIR, "airports.sqlite")
+AIRPORT_STORE_VERSION = 2  # PRAGMA user_version of the store layout; stores of another version are rebuilt
+
+# Column layout of OpenFlights airports.dat (no header row)
+OPENFLIGHTS_COLUMNS = [
+    "id", "name", "city", "country", "iata", "icao", "lat", "lon",
+    "elevation", "utc_offset", "dst", "tz", "type", "source",
+]
+AIRPORT_COLUMNS = ["icao", "iata", "name", "city", "country", "lat", "lon", "elevation"]
+
+class AirportTable:
+    """Columnar airport data: typed NumPy/pandas arrays plus an ICAO -> row index.
+
+    Indexing by ICAO (airport_coords["KJFK"]) returns a (lat, lon) tuple read
+    from the arrays, so code written against the old coordinate dict keeps working;
+    coordinates() looks up many airports in one vectorized step.
+    """
+
+    def __init__(self, frame, rejected=0):
+        self.icao = frame["icao"].to_numpy(dtype=object)
+        self.iata = frame["iata"].to_numpy(dtype=object)
+        self.name = frame["name"].to_numpy(dtype=object)
+        self.city = frame["city"].to_numpy(dtype=object)
+        self.country = pd.Categorical(frame["country"])
+        self.lat = frame["lat"].to_numpy(dtype=np.float64)
+        self.lon = frame["lon"].to_numpy(dtype=np.float64)
+        self.elevation = pd.array(frame["elevation"], dtype="Int32")
+        self.rejected = rejected
+        self.row_by_icao = {icao: row for row, icao in enumerate(self.icao)}
+
+    def __len__(self):
+        return len(self.icao)
+
+    def __contains__(self, icao_id):
+        return icao_id in self.row_by_icao
+
+    def __getitem__(self, icao_id):
+        row = self.row_by_icao[icao_id]
+        return (float(self.lat[row]), float(self.lon[row]))
+
+    def rows(self, icao_ids):
+        """Return the row numbers of the given ICAO codes as an integer array."""
+        return np.fromiter((self.row_by_icao[icao] for icao in icao_ids), dtype=np.intp, count=len(icao_ids))
+
+    def coordinates(self, icao_ids):
+        """Return (lat, lon) float64 arrays for a sequence of ICAO codes."""
+        rows = self.rows(icao_ids)
+        return self.lat[rows], self.lon[rows]
+
+    def info(self, icao_id):
+        """Return one airport's attributes as a dict, or None if it is unknown."""
+        row = self.row_by_icao.get(icao_id)
+        if row is None:
+            return None
+        elevation = self.elevation[row]
+        return {
+            "icao": icao_id,
+            "iata": self.iata[row],
+            "name": self.name[row],
+            "city": self.city[row],
+            "country": self.country[row],
+            "lat": float(self.lat[row]),
+            "lon": float(self.lon[row]),
+            "elevation": None if pd.isna(elevation) else int(elevation),
+        }
+
+def parse_airports(text):
+    """Parse airports.dat into a typed DataFrame and count the rows that were rejected.
+
+    Quoted fields are handled by the CSV parser, so names containing commas no
+    longer shift the columns. Rows without an ICAO code or valid coordinates are
+    rejected, as are duplicate ICAO codes after the first.
+    """
+    total_rows = sum(1 for line in text.splitlines() if line.strip())
+    frame = pd.read_csv(
+        io.StringIO(text),
+        header=None,
+        names=OPENFLIGHTS_COLUMNS,
+        usecols=AIRPORT_COLUMNS,
+        na_values=["\\N"],
+        keep_default_na=False,
+        dtype=str,
+        on_bad_lines="skip",
+    )
+    frame["lat"] = pd.to_numeric(frame["lat"], errors="coerce")
+    frame["lon"] = pd.to_numeric(frame["lon"], errors="coerce")
+    frame["elevation"] = pd.to_numeric(frame["elevation"], errors="coerce").round().astype("Int32")
+
+    valid = (
+        frame["icao"].str.fullmatch(r"[A-Z0-9]{4}", na=False)
+        & frame["lat"].between(-90, 90)
+        & frame["lon"].between(-180, 180)
+    )
+    frame = frame[valid].drop_duplicates(subset="icao", keep="first")
+    frame = frame[AIRPORT_COLUMNS].reset_index(drop=True)
+    frame["country"] = frame["country"].astype("category")
+    return frame, total_rows - len(frame)
+
+def build_airport_store(db_path=AIRPORT_DB_PATH):
+    """Download airports.dat once and compile it into the local SQLite airport store.
+
+    Returns (airports stored, rows rejected).
+    """
+    response = http_client.get(OPENFLIGHTS_URL, timeout=10)
+    response.raise_for_status()
+    frame, rejected = parse_airports(response.text)
+
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    tmp_path = f"{db_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    # The inner context commits; closing() releases the file before it is swapped in
+    with closing(sqlite3.connect(tmp_path)) as conn, conn:
+        conn.execute(
+            "CREATE TABLE airports (icao TEXT PRIMARY KEY, iata TEXT, name TEXT, city TEXT, "
+            "country TEXT, lat REAL, lon REAL, elevation INTEGER) WITHOUT ROWID"
+        )
+        frame.astype({"country": str}).to_sql("airports", conn, if_exists="append", index=False)
+        conn.execute("CREATE TABLE store_info (key TEXT PRIMARY KEY, value INTEGER)")
+        conn.execute("INSERT INTO store_info VALUES ('rejected_rows', ?)", (rejected,))
+        conn.execute(f"PRAGMA user_version = {AIRPORT_STORE_VERSION}")
+    # Swap the finished file in atomically so readers never see a half-built store
+    os.replace(tmp_path, db_path)
+    return len(frame), rejected
+
+def _store_version(db_path):
+    """Return the layout version of the airport store at db_path, or None if it is missing or unreadable."""
+    if not os.path.exists(db_path):
+        return None
+    try:
+        with closing(sqlite3.connect(db_path)) as conn:
+            (version,) = conn.execute("PRAGMA user_version").fetchone()
+    except sqlite3.DatabaseError:
+        return None
+    return version
+
+def _read_airport_store(db_path):
+    with closing(sqlite3.connect(db_path)) as conn:
+        frame = pd.read_sql(f"SELECT {', '.join(AIRPORT_COLUMNS)} FROM airports", conn)
+        (rejected,) = conn.execute("SELECT value FROM store_info WHERE key = 'rejected_rows'").fetchone()
+    return frame, rejected
+
+@st.cache_resource
+def load_airport_table(db_path=AIRPORT_DB_PATH):
+    """Load the compiled airport store into a columnar AirportTable.
+
+    The store is built from OpenFlights on first use only; later starts read it
+    from disk. A store from an older layout (see AIRPORT_STORE_VERSION), or one
+    whose tables can't be read, is rebuilt.
+    """
+    if _store_version(db_path) != AIRPORT_STORE_VERSION:
+        build_airport_store(db_path)
+    try:
+        frame, rejected = _read_airport_store(db_path)
+    except sqlite3.DatabaseError:
+        build_airport_store(db_path)
+        frame, rejected = _read_airport_store(db_path)
+    return AirportTable(frame, rejected=rejected)
 
-@st.cache_data
 def load_airport_coordinates():
-    """Load airport coordinates from OpenFlights dataset."""
+    """Load the airport table used for coordinate lookups throughout the app."""
     try:
-        response = requests.get(OPENFLIGHTS_URL, timeout=10)
-        response.raise_for_status()
-        airports = {}
-        for line in response.text.splitlines():
-            fields = line.split(',')
-            if len(fields) < 11:
-                continue
-            icao = fields[5].strip('"')
-            lat = fields[6].strip('"')
-            lon = fields[7].strip('"')
-            if icao and lat and lon and icao != "\\N":
-                try:
-                    airports[icao] = (float(lat), float(lon))
-                except ValueError:
-                    continue
-        return airports
+        return load_airport_table()
     except Exception as e:
         st.error(f"Failed to load airport coordinates: {str(e)}")
         return {}
-    
+
+def airport_info_fields(icao_id):
+    """Return an airport's briefing fields as [(label, value), ...], or None if it is unknown."""
+    airport = load_airport_table().info(icao_id)
+    if airport is None:
+        return None
+    return [
+        ("Name", airport["name"]),
+        ("Location", f"{airport['city']}, {airport['country']}"),
+        ("Coordinates", f"{airport['lat']}°N, {airport['lon']}°E"),
+        ("Elevation", f"{airport['elevation']} ft"),
+    ]
+
 def get_airport_info(icao_id):
     """Get detailed information about an airport."""
     try:
-        airports = load_airport_coordinates()
-        if icao_id not in airports:
+        fields = airport_info_fields(icao_id)
+        if fields is None:
             return None
-            
-        # Get airport data from OpenFlights
-        response = requests.get(OPENFLIGHTS_URL, timeout=10)
-        response.raise_for_status()
-        
-        for line in response.text.splitlines():
-            fields = line.split(',')
-            if len(fields) < 11:
-                continue
-            icao = fields[5].strip('"')
-            if icao == icao_id:
-                name = fields[1].strip('"')
-                city = fields[2].strip('"')
-                country = fields[3].strip('"')
-                lat = fields[6].strip('"')
-                lon = fields[7].strip('"')
-                
-                info = []
-                info.append(f"*Name:* {name}")
-                info.append(f"*Location:* {city}, {country}")
-                info.append(f"*Coordinates:* {lat}°N, {lon}°E")
-                info.append(f"*Elevation:* {fields[8].strip('"')} ft")
-                
-                return "\n".join(info)
-        return None
+        return "\n".join(f"*{label}:* {value}" for label, value in fields)
     except Exception as e:
-        return None
\ No newline at end of file
+        return None
+
+if __name__ == "__main__":
+    stored, rejected = build_airport_store()
+    print(f"Compiled {stored} airports into {AIRPORT_DB_PATH} ({rejected} rows rejected)")
@@ -0,0 +1,342 @@
+# services/briefing_model.py
+import hashlib
+import json
+import time
+import numpy as np
+from services.advisory_service import AdvisoryIndex, altitude_range_text
+from services.metar_decoder import decode_metar, CEILING_COVERS
+from services.taf_decoder import decode_taf, forecast_text
+from services.winds_aloft_service import DEFAULT_FUEL_BURN_GPH, route_winds
+from utils.altitude_index import AltitudeIndex
+from utils.geodesy import route_geometry
+
+# Severity levels shared by the map, the profile chart and the reports
+SEVERITY_LABELS = ("VFR Conditions", "Significant Weather Activity", "Severe Weather Activity")
+SEVERITY_COLORS = ("green", "yellow", "red")
+
+# Constants
+ALTITUDE_MARGIN_FT = 1000  # Hazards this close to the planned altitude count as flown through
+CLOUD_DEPTH_FT = 3000  # METARs give no tops; a layer is assumed this deep unless the next one starts sooner
+LAPSE_RATE_C_PER_1000FT = 2.0  # Standard lapse rate, used to estimate the freezing level
+ICING_DEPTH_FT = 10000  # Structural icing is likeliest in cloud from 0 °C to about -20 °C
+
+class WaypointAssessment:
+    """Everything the renderers need about one waypoint, computed once per briefing.
+
+    conditions is the VFR/MVFR/IFR/Unknown scheme used by the reports and severity
+    (0 green, 1 yellow, 2 red) the scheme used by the map and profile. Both come
+    from the same flight category and hazard flags, so they always agree:
+    IFR/LIFR or a thunderstorm/severe SIGMET is red, MVFR, an active SIGMET or
+    G-AIRMET, cloud or icing at the planned altitude or missing data is yellow,
+    and VFR with none of these is green. A SIGMET counts when the station's feed
+    text names it or its polygon covers the waypoint at the planned altitude.
+    With an ETA, the TAF's category then counts as well: a prevailing IFR/LIFR
+    forecast is red, and a prevailing MVFR one or a TEMPO/PROB group below VFR yellow.
+    unknown lists the products that could not be fetched (the station's
+    "Degraded"); their placeholder text never counts as a SIGMET or PIREP.
+    """
+
+    __slots__ = (
+        "icao", "altitude", "weather", "observation", "flight_category", "advisories", "altitude_hazards",
+        "eta", "taf", "forecast", "forecast_category",
+        "unknown", "has_sigmet", "has_pirep", "severe_sigmet", "has_airmet", "thunderstorm", "severity",
+    )
+
+    def __init__(self, icao, altitude, weather_data, advisories=(), altitude_hazards=(), eta=None):
+        self.icao = icao
+        self.altitude = altitude
+        self.weather = weather_data
+        self.observation = decode_metar(weather_data.get("METAR", ""))
+        self.flight_category = self.observation.flight_category
+        # Advisory areas (services.advisory_service) whose polygon contains the waypoint at its altitude,
+        # and the cloud/icing layers of the station's METAR at that altitude (see station_layers)
+        self.advisories = list(advisories)
+        self.altitude_hazards = list(altitude_hazards)
+        # Estimated time of arrival (epoch seconds, None when no departure time was given) and the
+        # decoded TAF's forecast in force then (or now, without an ETA)
+        self.eta = eta
+        self.taf = decode_taf(weather_data.get("TAF", ""))
+        self.forecast = forecast_text(self.taf, eta if eta is not None else time.time())
+        prevailing, temporary = self.taf.forecast_at(eta) if eta is not None else (None, [])
+        # Prevailing flight category forecast for the ETA (None without an ETA or a TAF covering it)
+        self.forecast_category = prevailing.flight_category if prevailing is not None else None
+        temporary_below_vfr = any(period.flight_category in ("MVFR", "IFR", "LIFR") for period in temporary)
+
+        self.unknown = tuple(weather_data.get("Degraded", ()))
+        sigmet = weather_data.get("SIGMET", "") if "SIGMET" not in self.unknown else ""
+        pirep = weather_data.get("PIREP", "") if "PIREP" not in self.unknown else ""
+        sigmet_areas = [area for area in self.advisories if area["kind"] == "SIGMET"]
+        self.has_sigmet = (bool(sigmet) and sigmet != "No active SIGMET") or bool(sigmet_areas)
+        self.has_pirep = bool(pirep) and pirep != "No recent PIREP"
+        self.severe_sigmet = (self.has_sigmet and "SEV" in sigmet) or any(area["severity"] == 2 for area in sigmet_areas)
+        self.has_airmet = any(area["kind"] == "G-AIRMET" for area in self.advisories)
+        self.thunderstorm = self.observation.has_thunderstorm
+
+        if (self.thunderstorm or self.severe_sigmet or self.flight_category in ("IFR", "LIFR")
+                or self.forecast_category in ("IFR", "LIFR")):
+            self.severity = 2
+        elif (self.has_sigmet or self.has_airmet or self.altitude_hazards or self.flight_category != "VFR"
+              or self.forecast_category == "MVFR" or temporary_below_vfr):
+            self.severity = 1
+        else:
+            self.severity = 0
+
+    @property
+    def conditions(self):
+        """VFR, MVFR, IFR or Unknown (LIFR is reported as IFR)."""
+        return "IFR" if self.flight_category == "LIFR" else self.flight_category
+
+    @property
+    def label(self):
+        return SEVERITY_LABELS[self.severity]
+
+    @property
+    def color(self):
+        return SEVERITY_COLORS[self.severity]
+
+    @property
+    def has_ceiling(self):
+        return self.observation.ceiling_ft is not None
+
+class Briefing:
+    """Weather assessments for every waypoint of a flight plan, in route order.
+
+    geometry is the route's utils.geodesy.RouteGeometry (None without coordinates),
+    computed once so the reports and the profile chart share the same leg distances.
+    advisory_areas holds the SIGMET and G-AIRMET polygons (see services.advisory_service)
+    and leg_advisories, per leg, the areas the leg passes through as
+    {"area": index into advisory_areas, "from_nm", "to_nm", "at_altitude"} (NM
+    from the leg's start; at_altitude when the planned altitude over that
+    stretch is within the area's vertical extent).
+    leg_pireps holds, per leg, the pilot reports near the leg and within the
+    altitude band of the planned altitude (see services.pirep_service), ordered along the leg.
+    leg_hazards answers, per leg, which hazards overlap the planned altitude band:
+    {"kind", "description", "base_ft", "top_ft", "severity"} dicts ordered by base.
+    winds is the route's services.winds_aloft_service.RouteWinds (headwinds, ETE and
+    fuel at the planned altitudes), None when no airspeed was given.
+    """
+
+    __slots__ = (
+        "waypoints", "assessments", "geometry", "advisory_areas", "leg_advisories", "leg_pireps", "leg_hazards", "winds",
+    )
+
+    def __init__(self, waypoints, assessments, geometry=None, advisory_areas=(), leg_advisories=None, leg_pireps=None,
+                 leg_hazards=None, winds=None):
+        n_legs = max(len(waypoints) - 1, 0)
+        self.waypoints = waypoints
+        self.assessments = assessments
+        self.geometry = geometry
+        self.advisory_areas = list(advisory_areas)
+        self.leg_advisories = leg_advisories if leg_advisories is not None else [[] for _ in range(n_legs)]
+        self.leg_pireps = leg_pireps if leg_pireps is not None else [[] for _ in range(n_legs)]
+        self.leg_hazards = leg_hazards if leg_hazards is not None else [[] for _ in range(n_legs)]
+        self.winds = winds
+
+    @property
+    def total_distance(self):
+        return float(self.geometry.cumulative_nm[-1]) if self.geometry is not None else 0.0
+
+    @property
+    def total_hours(self):
+        return float(self.winds.cumulative_hours[-1]) if self.winds is not None else None
+
+    @property
+    def total_fuel(self):
+        return float(self.winds.leg_fuel_gal.sum()) if self.winds is not None else None
+
+    @property
+    def weather_data_list(self):
+        return [assessment.weather for assessment in self.assessments]
+
+    @property
+    def severities(self):
+        return [assessment.severity for assessment in self.assessments]
+
+    @property
+    def crossed_areas(self):
+        """Indices of the advisory areas the route passes through, in the order it first enters them."""
+        return list(dict.fromkeys(crossing["area"] for crossings in self.leg_advisories for crossing in crossings))
+
+    @property
+    def hazard_areas(self):
+        """Indices of the advisory areas the route passes through at the planned altitude."""
+        return list(dict.fromkeys(
+            crossing["area"] for crossings in self.leg_advisories for crossing in crossings if crossing["at_altitude"]
+        ))
+
+    @property
+    def leg_severities(self):
+        """Highest severity among each leg's hazards at the planned altitude (0 when there are none)."""
+        return [max((hazard["severity"] for hazard in hazards), default=0) for hazards in self.leg_hazards]
+
+    @property
+    def hazard_spans(self):
+        """(from_nm, to_nm, severity) along the whole route for every advisory crossed at the planned altitude."""
+        if self.geometry is None:
+            return []
+        return [
+            (
+                float(self.geometry.cumulative_nm[leg]) + crossing["from_nm"],
+                float(self.geometry.cumulative_nm[leg]) + crossing["to_nm"],
+                self.advisory_areas[crossing["area"]]["severity"],
+            )
+            for leg, crossings in enumerate(self.leg_advisories)
+            for crossing in crossings
+            if crossing["at_altitude"]
+        ]
+
+    def span_severity(self, distances_nm):
+        """Highest advisory severity at each distance along the route (0 outside every crossing)."""
+        distances = np.asarray(distances_nm, dtype=np.float64)
+        spans = np.asarray(self.hazard_spans, dtype=np.float64).reshape(-1, 3)
+        covered = (distances[:, None] >= spans[:, 0]) & (distances[:, None] <= spans[:, 1])
+        return np.where(covered, spans[:, 2], 0.0).max(axis=1, initial=0.0)
+
+    @property
+    def weather_digest(self):
+        """Stable hash of the weather behind this briefing, for caching rendered artefacts."""
+        snapshot = [(assessment.icao, assessment.weather) for assessment in self.assessments]
+        snapshot.append(("Advisory areas", self.advisory_areas))
+        snapshot.append(("Leg advisories", self.leg_advisories))
+        snapshot.append(("Leg PIREPs", self.leg_pireps))
+        snapshot.append(("Leg hazards", self.leg_hazards))
+        snapshot.append(("ETAs", [assessment.eta for assessment in self.assessments]))
+        if self.winds is not None:
+            snapshot.append(("Winds", [self.winds.leg_hours.round(4).tolist(), self.winds.leg_headwind_kt.round(1).tolist()]))
+        return hashlib.sha1(json.dumps(snapshot, sort_keys=True, default=str).encode()).hexdigest()
+
+def station_layers(icao, observation, elevation_ft):
+    """Return the altitude hazards implied by a station's METAR, with MSL base_ft/top_ft.
+
+    Broken, overcast and obscured layers are cloud, each assumed to reach the next
+    reported layer or CLOUD_DEPTH_FT above its base; the part of a cloud layer
+    from the estimated freezing level up to ICING_DEPTH_FT above it is possible icing.
+    """
+    hazards = []
+    bases = sorted(base for _, base in observation.clouds if base is not None)
+    freezing_ft = None
+    if observation.temperature is not None:
+        freezing_ft = elevation_ft + round(max(observation.temperature, 0) / LAPSE_RATE_C_PER_1000FT * 1000)
+    for cover, base in observation.clouds:
+        if cover not in CEILING_COVERS or base is None:
+            continue
+        above = [other for other in bases if other > base]
+        bottom = elevation_ft if cover == "VV" else elevation_ft + base
+        top = elevation_ft + (base if cover == "VV" else min(above, default=base + CLOUD_DEPTH_FT))
+        hazards.append({
+            "kind": "Cloud",
+            "description": f"{cover} layer at {icao}, about {bottom}-{top}ft MSL",
+            "base_ft": bottom,
+            "top_ft": top,
+            "severity": 1,
+        })
+        if freezing_ft is not None and top > freezing_ft and bottom < freezing_ft + ICING_DEPTH_FT:
+            icing_base, icing_top = max(bottom, freezing_ft), min(top, freezing_ft + ICING_DEPTH_FT)
+            hazards.append({
+                "kind": "Icing",
+                "description": f"Possible icing in cloud at {icao} above the freezing level (about {freezing_ft}ft MSL)",
+                "base_ft": icing_base,
+                "top_ft": icing_top,
+                "severity": 1,
+            })
+    return hazards
+
+def _advisory_hazard(area, crossing):
+    return {
+        "kind": area["kind"],
+        "description": f"{area['hazard']} ({altitude_range_text(area)}), NM {crossing['from_nm']}-{crossing['to_nm']} of the leg",
+        "base_ft": area["base_ft"],
+        "top_ft": area["top_ft"],
+        "severity": area["severity"],
+    }
+
+def _pirep_hazard(report):
+    kinds = [kind for kind in ("turbulence", "icing") if report[kind]]
+    return {
+        "kind": "PIREP",
+        "description": f"{' and '.join(kinds).capitalize()} reported: {report['raw']}",
+        "base_ft": report["altitude_ft"],
+        "top_ft": report["altitude_ft"],
+        "severity": 2 if "SEV" in report["raw"] else 1,
+    }
+
+def build_briefing(waypoints, weather_by_icao, airport_coords=None, advisory_areas=(), pirep_index=None,
+                   departure_time=None, true_airspeed_kt=None, wind_grid=None, fuel_burn_gph=DEFAULT_FUEL_BURN_GPH):
+    """Assess each (icao, altitude) waypoint once from the fetched weather data.
+
+    With airport coordinates the advisory polygons covering each waypoint and
+    crossed by each leg are found once here and, given a
+    services.pirep_service.PirepIndex, the pilot reports along each leg as well.
+    Vertical extents go into utils.altitude_index.AltitudeIndex trees (one over
+    the advisories, one per station over its cloud and icing layers), so each
+    waypoint and leg only keeps the hazards overlapping its planned altitude
+    band (+/- ALTITUDE_MARGIN_FT). Given a true airspeed, the winds aloft of
+    wind_grid (services.winds_aloft_service.WindGrid; still air without one)
+    are interpolated along the route at the planned altitudes for headwinds,
+    time en route and fuel; with a departure time (epoch seconds) as well, each
+    waypoint gets an ETA from those times and the TAF forecast valid at that ETA.
+    """
+    advisory_areas = list(advisory_areas)
+    altitudes = [altitude for _, altitude in waypoints]
+    n_legs = max(len(waypoints) - 1, 0)
+    point_areas = [[] for _ in waypoints]
+    point_layers = [[] for _ in waypoints]
+    etas = [None for _ in waypoints]
+    geometry = None
+    leg_advisories = None
+    leg_pireps = None
+    winds = None
+    if airport_coords is not None:
+        lats, lons = airport_coords.coordinates([icao for icao, _ in waypoints])
+        geometry = route_geometry(lats, lons)
+        if true_airspeed_kt:
+            winds = route_winds(wind_grid, lats, lons, altitudes, true_airspeed_kt, fuel_burn_gph)
+        if departure_time is not None and winds is not None:
+            etas = (departure_time + winds.cumulative_hours * 3600.0).tolist()
+        elif departure_time is not None and len(waypoints) == 1:
+            etas = [departure_time]
+        if advisory_areas:
+            index = AdvisoryIndex(advisory_areas)
+            levels = AltitudeIndex([area["base_ft"] for area in advisory_areas], [area["top_ft"] for area in advisory_areas])
+            point_areas = [
+                sorted(set(areas) & set(levels.overlapping(altitude - ALTITUDE_MARGIN_FT, altitude + ALTITUDE_MARGIN_FT)))
+                for areas, altitude in zip(index.containing(lats, lons), altitudes)
+            ]
+            leg_advisories = []
+            for leg, crossings in enumerate(index.route_crossings(lats, lons)):
+                records = []
+                for area, lo, hi in crossings:
+                    # Planned altitude over the crossed stretch, interpolated along the leg
+                    fractions = np.array([lo, hi]) / max(float(geometry.leg_nm[leg]), 1e-9)
+                    planned = altitudes[leg] + fractions * (altitudes[leg + 1] - altitudes[leg])
+                    band = levels.overlapping(planned.min() - ALTITUDE_MARGIN_FT, planned.max() + ALTITUDE_MARGIN_FT)
+                    records.append({"area": area, "from_nm": round(lo, 1), "to_nm": round(hi, 1), "at_altitude": area in band})
+                leg_advisories.append(records)
+        if pirep_index is not None:
+            leg_pireps = [
+                [pirep_index.record(row, distance) for row, distance in zip(rows, distances)]
+                for rows, distances in pirep_index.along_route(lats, lons, altitudes)
+            ]
+        for i, (icao_id, altitude) in enumerate(waypoints):
+            info = airport_coords.info(icao_id)
+            if info is None or info["elevation"] is None:
+                continue
+            layers = station_layers(icao_id, decode_metar(weather_by_icao[icao_id].get("METAR", "")), info["elevation"])
+            station_index = AltitudeIndex([layer["base_ft"] for layer in layers], [layer["top_ft"] for layer in layers], layers)
+            point_layers[i] = station_index.overlapping(altitude - ALTITUDE_MARGIN_FT, altitude + ALTITUDE_MARGIN_FT)
+
+    assessments = [
+        WaypointAssessment(icao_id, altitude, weather_by_icao[icao_id], [advisory_areas[area] for area in areas], layers, eta)
+        for (icao_id, altitude), areas, layers, eta in zip(waypoints, point_areas, point_layers, etas)
+    ]
+    leg_hazards = []
+    for leg in range(n_legs):
+        hazards = [
+            _advisory_hazard(advisory_areas[crossing["area"]], crossing)
+            for crossing in (leg_advisories[leg] if leg_advisories else [])
+            if crossing["at_altitude"]
+        ]
+        hazards += [_pirep_hazard(report) for report in (leg_pireps[leg] if leg_pireps else []) if report["turbulence"] or report["icing"]]
+        hazards += assessments[leg].altitude_hazards + assessments[leg + 1].altitude_hazards
+        leg_hazards.append(sorted(hazards, key=lambda hazard: hazard["base_ft"] if hazard["base_ft"] is not None else altitudes[leg]))
+    return Briefing(waypoints, assessments, geometry, advisory_areas, leg_advisories, leg_pireps, leg_hazards, winds)
@@ -1,4 +1,10 @@
 # services/flight_plan_service.py
+from services.airport_service import load_airport_table
+from services.weather_service import cached_wind_grid
+from services.winds_aloft_service import DEFAULT_TRUE_AIRSPEED_KT, DEFAULT_FUEL_BURN_GPH, format_duration, route_winds
+
+# Constants
+DEFAULT_CRUISE_ALTITUDE_FT = 6000  # Used when a route gives no usable altitude
 
 def parse_flight_plan(flight_plan, airport_coords):
     """Parse flight plan into a list of (airport_id, altitude) tuples."""
@@ -23,7 +29,46 @@ def parse_flight_plan(flight_plan, airport_coords):
     except Exception as e:
         return f"Error parsing flight plan: {str(e)}"
     
-def get_flight_plan_summary(departure, destination, flight_date):
+def estimate_flight_time(route, true_airspeed_kt=DEFAULT_TRUE_AIRSPEED_KT, fuel_burn_gph=DEFAULT_FUEL_BURN_GPH,
+                         wind_grid=None):
+    """Estimate headwinds, time en route and fuel for (icao, altitude) pairs flown direct between them.
+
+    wind_grid is a services.winds_aloft_service.WindGrid (still air without one);
+    nothing is downloaded here. Altitudes that aren't numbers (e.g. "Unknown"
+    from a typed route) count as DEFAULT_CRUISE_ALTITUDE_FT. Raises KeyError for
+    an airport missing from the airport table.
+    Returns a services.winds_aloft_service.RouteWinds.
+    """
+    lats, lons = load_airport_table().coordinates([icao for icao, _ in route])
+    altitudes = [int(altitude) if str(altitude).isdigit() else DEFAULT_CRUISE_ALTITUDE_FT for _, altitude in route]
+    return route_winds(wind_grid, lats, lons, altitudes, true_airspeed_kt, fuel_burn_gph)
+
+def flight_time_fields(route, true_airspeed_kt=DEFAULT_TRUE_AIRSPEED_KT, fuel_burn_gph=DEFAULT_FUEL_BURN_GPH,
+                       wind_grid=None):
+    """Return a route's estimated time en route, mean wind component and fuel as [(label, value), ...].
+
+    When the route can't be located, the only field is a note saying why.
+    """
+    try:
+        winds = estimate_flight_time(route, true_airspeed_kt, fuel_burn_gph, wind_grid)
+    except KeyError as e:
+        return [("Note", f"Flight time unavailable: no coordinates for {e.args[0]}.")]
+    except Exception:
+        return [("Note", "Flight time unavailable: the airport data could not be loaded.")]
+    distance = float(winds.leg_nm.sum())
+    # Distance-weighted over the whole route, positive for a headwind
+    headwind = float((winds.leg_headwind_kt * winds.leg_nm).sum() / distance) if distance else 0.0
+    fields = [
+        ("Estimated Time En Route", f"{format_duration(winds.cumulative_hours[-1])} ({distance:.0f} NM at {winds.true_airspeed_kt:.0f} kt TAS)"),
+        ("Average Wind Component", f"{abs(headwind):.0f} kt {'headwind' if headwind >= 0 else 'tailwind'}"),
+        ("Estimated Fuel", f"{winds.leg_fuel_gal.sum():.1f} gal at {fuel_burn_gph:g} gal/hr"),
+    ]
+    if not winds.covered.all():
+        fields.append(("Note", "Winds aloft unavailable for part or all of the route; still air assumed there."))
+    return fields
+
+def get_flight_plan_summary(departure, destination, flight_date, altitude_ft=DEFAULT_CRUISE_ALTITUDE_FT,
+                            true_airspeed_kt=DEFAULT_TRUE_AIRSPEED_KT, fuel_burn_gph=DEFAULT_FUEL_BURN_GPH):
     """Generate a summary of the flight plan."""
     try:
         summary = []
@@ -32,9 +77,11 @@ def get_flight_plan_summary(departure, destination, flight_date):
         summary.append(f"*Destination:* {destination}")
         summary.append(f"*Flight Date:* {flight_date}")
         
-        # Add estimated flight time (placeholder)
+        # Add estimated flight time from the winds aloft at the cruise altitude, if already downloaded
         summary.append("\n### Estimated Flight Time")
-        summary.append("Note: This is a placeholder. Actual flight time would be calculated based on aircraft performance and weather conditions.")
+        route = [(departure, altitude_ft), (destination, altitude_ft)]
+        fields = flight_time_fields(route, true_airspeed_kt, fuel_burn_gph, cached_wind_grid())
+        summary.extend(f"*{label}:* {value}" for label, value in fields)
         
         # Add route description
         summary.append("\n### Route Description")
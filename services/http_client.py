@@ -0,0 +1,81 @@
+# services/http_client.py
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from tenacity import Retrying, retry_if_exception_type, stop_after_attempt, stop_before_delay, wait_random_exponential
+from services.acquisition_service import MAX_CONCURRENT_FETCHES
+
+# Constants
+CONNECT_TIMEOUT = 3.05  # Seconds; slightly above a multiple of 3s TCP retransmit windows
+READ_TIMEOUT = 10
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF_MAX = 4  # Seconds; upper bound of the jittered exponential backoff
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Keep-alive connections held per host; sized to the number of fetches that can hit it at once.
+# The pools don't block: a request beyond the size opens a throwaway connection instead of
+# waiting for a free one, a wait no per-product deadline would bound.
+HOST_POOL_SIZES = {
+    "https://aviationweather.gov": MAX_CONCURRENT_FETCHES,
+    "https://raw.githubusercontent.com": 2,
+}
+DEFAULT_POOL_SIZE = 4
+
+DEFAULT_HEADERS = {
+    "Accept-Encoding": "gzip, deflate",
+    "User-Agent": "FlightWeatherPro/1.0",
+}
+
+class TransientHTTPError(requests.HTTPError):
+    """Raised for HTTP status codes that are worth retrying."""
+
+def _create_session():
+    """Build the shared session with a connection pool per upstream host."""
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+    default_adapter = HTTPAdapter(pool_connections=DEFAULT_POOL_SIZE, pool_maxsize=DEFAULT_POOL_SIZE)
+    session.mount("https://", default_adapter)
+    session.mount("http://", default_adapter)
+    for host, pool_size in HOST_POOL_SIZES.items():
+        session.mount(host, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False))
+    return session
+
+_session = _create_session()
+
+def _retrying(budget):
+    """Build the retry policy for one call; budget caps the seconds spent on attempts and backoff together."""
+    stop = stop_after_attempt(MAX_ATTEMPTS)
+    if budget is not None:
+        stop = stop | stop_before_delay(budget)
+    return Retrying(
+        retry=retry_if_exception_type((requests.ConnectionError, requests.Timeout, TransientHTTPError)),
+        wait=wait_random_exponential(multiplier=0.5, max=RETRY_BACKOFF_MAX),
+        stop=stop,
+        reraise=True,
+    )
+
+def _get_once(url, timeout, deadline, **kwargs):
+    connect_timeout, read_timeout = CONNECT_TIMEOUT, timeout
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise requests.Timeout(f"deadline passed before requesting {url}")
+        connect_timeout, read_timeout = min(connect_timeout, remaining), min(read_timeout, remaining)
+    response = _session.get(url, timeout=(connect_timeout, read_timeout), **kwargs)
+    if response.status_code in RETRY_STATUS_CODES:
+        raise TransientHTTPError(f"{response.status_code} from {url}", response=response)
+    return response
+
+def get(url, timeout=None, deadline=None, **kwargs):
+    """GET a URL through the shared keep-alive session, retrying transient failures.
+
+    timeout is the read timeout in seconds (READ_TIMEOUT when omitted); the
+    connect timeout is CONNECT_TIMEOUT. deadline, a time.monotonic() instant,
+    bounds the whole call: each attempt's timeouts are trimmed to the time
+    left and no retry is started that would sleep past it, so a fetch its
+    caller has given up on stops instead of retrying in the shared pool.
+    """
+    budget = None if deadline is None else deadline - time.monotonic()
+    for attempt in _retrying(budget):
+        with attempt:
+            return _get_once(url, timeout or READ_TIMEOUT, deadline, **kwargs)
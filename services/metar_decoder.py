@@ -0,0 +1,165 @@
+# services/metar_decoder.py
+import re
+from functools import lru_cache
+
+# Constants
+METERS_PER_SM = 1609.344
+HPA_TO_INHG = 0.02953
+MPS_TO_KT = 1.943844
+CEILING_COVERS = ("BKN", "OVC", "VV")
+CLEAR_SKY = ("CLR", "SKC", "NSC", "NCD", "CAVOK")
+BODY_TERMINATORS = ("RMK", "TEMPO", "BECMG", "NOSIG")
+
+WIND_RE = re.compile(r"^(\d{3}|VRB)(\d{2,3})(?:G(\d{2,3}))?(KT|MPS)$")
+VISIBILITY_SM_RE = re.compile(r"^([MP])?(?:(\d+)/(\d+)|(\d+))SM$")
+VISIBILITY_M_RE = re.compile(r"^(\d{4})(?:NDV)?$")
+WEATHER_RE = re.compile(
+    r"^(?:[-+]|VC)?(?:MI|PR|BC|DR|BL|SH|TS|FZ)?"
+    r"(?:DZ|RA|SN|SG|IC|PL|GR|GS|UP|BR|FG|FU|VA|DU|SA|HZ|PY|PO|SQ|FC|SS|DS)*$"
+)
+CLOUD_RE = re.compile(r"^(FEW|SCT|BKN|OVC|VV)(\d{3}|///)(CB|TCU)?$")
+TEMPERATURE_RE = re.compile(r"^(M?\d{2})/(M?\d{2})?$")
+ALTIMETER_RE = re.compile(r"^([AQ])(\d{4})$")
+
+class MetarObservation:
+    """Decoded METAR. Cloud layers are (cover, base_ft) tuples, lowest first."""
+
+    __slots__ = (
+        "raw", "station", "wind_direction", "wind_speed", "wind_gust",
+        "visibility_sm", "visibility_bound", "weather", "clouds", "sky_clear",
+        "temperature", "dewpoint", "altimeter_inhg", "flight_category",
+    )
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.station = None
+        self.wind_direction = None  # Degrees true, or "VRB"
+        self.wind_speed = None  # Knots
+        self.wind_gust = None
+        self.visibility_sm = None
+        self.visibility_bound = ""  # "P" when visibility_sm is a lower bound (P6SM), "M" an upper one (M1/4SM)
+        self.weather = ()
+        self.clouds = ()
+        self.sky_clear = False
+        self.temperature = None  # Celsius
+        self.dewpoint = None
+        self.altimeter_inhg = None
+        self.flight_category = "Unknown"
+
+    @property
+    def ceiling_ft(self):
+        """Base of the lowest broken, overcast or obscured layer, or None."""
+        bases = [base for cover, base in self.clouds if cover in CEILING_COVERS and base is not None]
+        return min(bases) if bases else None
+
+    @property
+    def has_thunderstorm(self):
+        return any("TS" in phenomenon for phenomenon in self.weather)
+
+    @property
+    def is_reported(self):
+        return self.flight_category != "Unknown"
+
+def _signed(value):
+    return -int(value[1:]) if value.startswith("M") else int(value)
+
+def flight_category(ceiling_ft, visibility_sm):
+    """FAA flight category from ceiling (ft AGL) and visibility (SM); None means unlimited/unknown."""
+    ceiling = ceiling_ft if ceiling_ft is not None else float("inf")
+    visibility = visibility_sm if visibility_sm is not None else float("inf")
+    if ceiling < 500 or visibility < 1:
+        return "LIFR"
+    if ceiling < 1000 or visibility < 3:
+        return "IFR"
+    if ceiling <= 3000 or visibility <= 5:
+        return "MVFR"
+    return "VFR"
+
+@lru_cache(maxsize=2048)
+def decode_metar(raw):
+    """Decode a raw METAR into a MetarObservation. Results are cached per raw report.
+
+    Only the body before RMK/TEMPO/BECMG/NOSIG is decoded, and the station ID is
+    consumed first, so remarks and identifiers like KTSP can't be mistaken for weather.
+    """
+    observation = MetarObservation(raw or "")
+    tokens = (raw or "").split()
+    if tokens and tokens[0] in ("METAR", "SPECI"):
+        tokens = tokens[1:]
+    if not tokens or not re.fullmatch(r"[A-Z][A-Z0-9]{3}", tokens[0]):
+        return observation
+    observation.station = tokens[0]
+
+    weather = []
+    clouds = []
+    whole_miles = 0
+    decoded_any = False
+    for token in tokens[1:]:
+        if token in BODY_TERMINATORS:
+            break
+        if re.fullmatch(r"\d{6}Z", token) or token in ("AUTO", "COR"):
+            continue
+        if token == "CAVOK":
+            observation.visibility_sm = 10.0
+            observation.sky_clear = True
+            decoded_any = True
+            continue
+        if token in CLEAR_SKY:
+            observation.sky_clear = True
+            decoded_any = True
+            continue
+        match = WIND_RE.match(token)
+        if match:
+            direction, speed, gust, unit = match.groups()
+            factor = MPS_TO_KT if unit == "MPS" else 1.0
+            observation.wind_direction = direction if direction == "VRB" else int(direction)
+            observation.wind_speed = round(int(speed) * factor)
+            observation.wind_gust = round(int(gust) * factor) if gust else None
+            decoded_any = True
+            continue
+        if re.fullmatch(r"\d", token):
+            # Whole miles of a split visibility such as "1 1/2SM"
+            whole_miles = int(token)
+            continue
+        match = VISIBILITY_SM_RE.match(token)
+        if match:
+            bound, numerator, denominator, whole = match.groups()
+            miles = int(whole) if whole else int(numerator) / int(denominator)
+            observation.visibility_sm = whole_miles + miles
+            observation.visibility_bound = bound or ""
+            decoded_any = True
+            continue
+        match = VISIBILITY_M_RE.match(token)
+        if match and observation.visibility_sm is None:
+            meters = int(match.group(1))
+            observation.visibility_sm = 10.0 if meters == 9999 else round(meters / METERS_PER_SM, 2)
+            decoded_any = True
+            continue
+        match = CLOUD_RE.match(token)
+        if match:
+            cover, height, _ = match.groups()
+            clouds.append((cover, None if height == "///" else int(height) * 100))
+            decoded_any = True
+            continue
+        match = TEMPERATURE_RE.match(token)
+        if match:
+            temperature, dewpoint = match.groups()
+            observation.temperature = _signed(temperature)
+            observation.dewpoint = _signed(dewpoint) if dewpoint else None
+            decoded_any = True
+            continue
+        match = ALTIMETER_RE.match(token)
+        if match:
+            kind, value = match.groups()
+            observation.altimeter_inhg = int(value) / 100 if kind == "A" else round(int(value) * HPA_TO_INHG, 2)
+            decoded_any = True
+            continue
+        if len(token) >= 2 and WEATHER_RE.match(token) and token not in ("VC", "-", "+"):
+            weather.append(token)
+            decoded_any = True
+
+    observation.weather = tuple(weather)
+    observation.clouds = tuple(sorted(clouds, key=lambda layer: layer[1] if layer[1] is not None else 0))
+    if decoded_any:
+        observation.flight_category = flight_category(observation.ceiling_ft, observation.visibility_sm)
+    return observation
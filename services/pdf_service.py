@@ -0,0 +1,134 @@
+# services/pdf_service.py
+import hashlib
+import json
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from cachetools import LRUCache
+from fpdf import FPDF
+from services.template_service import template_macro
+
+# Constants
+PDF_WORKERS = 2  # Worker processes rendering PDFs off the request thread
+PDF_CACHE_BYTES = 64 * 1024 * 1024  # Rendered PDFs kept in memory, evicted least recently used
+PDF_TIMEOUT = 30  # Seconds a request waits for its PDF
+
+_pdf_cache = LRUCache(maxsize=PDF_CACHE_BYTES, getsizeof=len)
+_pending = {}  # Content hash -> Future of a render in progress, shared by identical requests
+_lock = threading.RLock()
+_pool = None
+
+def briefing_digest(briefing):
+    """Content hash of a pilot briefing model; identical briefings share one rendered PDF."""
+    return hashlib.sha256(json.dumps(briefing, sort_keys=True, default=str).encode()).hexdigest()
+
+def _pdf_text(text):
+    # The core PDF fonts only cover Latin-1
+    return str(text).encode("latin-1", "replace").decode("latin-1")
+
+def render_briefing_pdf(briefing):
+    """Lay out the pilot briefing model as an FAA-style PDF and return its bytes.
+
+    Section bodies come from the text template's render_block macro, so the PDF
+    says exactly what the other formats say. Nothing is written to disk.
+    """
+    departure = briefing["departure"]
+    destination = briefing["destination"]
+    flight_date = briefing["flight_date"]
+    render_block = template_macro("pilot_briefing_blocks.txt.j2", "render_block")
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=15)
+
+    # Header
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 10, "PILOT WEATHER BRIEFING - FAA FORM 7233-2", ln=True, align="C")
+    pdf.ln(5)
+
+    pdf.set_font("Arial", "", 12)
+    pdf.cell(0, 10, _pdf_text(f"DATE OF FLIGHT: {flight_date}"), ln=True)
+    pdf.cell(0, 10, _pdf_text(f"ROUTE: {departure} -> {destination}"), ln=True)
+    pdf.ln(5)
+
+    for section in briefing["sections"]:
+        # Add section header with underline
+        pdf.set_font("Arial", "B", 12)
+        pdf.multi_cell(0, 8, section["pdf_title"])
+        pdf.line(10, pdf.get_y(), 200, pdf.get_y())
+        pdf.ln(5)
+
+        # Add section content
+        pdf.set_font("Arial", "", 11)
+        for block in section["blocks"]:
+            if block["kind"] == "unavailable":
+                pdf.set_text_color(128, 128, 128)  # Gray color for unavailable data
+                pdf.multi_cell(0, 8, "INFORMATION NOT AVAILABLE")
+                pdf.set_text_color(0, 0, 0)  # Reset to black
+            else:
+                pdf.multi_cell(0, 8, _pdf_text(str(render_block(block)).strip()))
+            pdf.ln(3)
+        pdf.ln(5)
+
+    # Footer
+    pdf.set_y(-25)
+    pdf.set_font("Arial", "I", 9)
+    pdf.cell(0, 10, "Generated per FAA Order JO 7110.10 and FAA Form 7233-2 briefing standards.", ln=True, align="C")
+
+    # fpdf 1.7 returns the document as a Latin-1 str
+    return pdf.output(dest="S").encode("latin-1")
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # Spawned workers import only this module's dependencies, not the Streamlit app
+        _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def _submit(briefing):
+    global _pool
+    try:
+        return _get_pool().submit(render_briefing_pdf, briefing)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed by the OS); start a fresh pool once
+        _pool = None
+        return _get_pool().submit(render_briefing_pdf, briefing)
+
+def _finish(key, future):
+    global _pool
+    with _lock:
+        _pending.pop(key, None)
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            if isinstance(future.exception(), BrokenProcessPool):
+                _pool = None
+            return
+        pdf = future.result()
+        if len(pdf) <= PDF_CACHE_BYTES:
+            _pdf_cache[key] = pdf
+
+def request_briefing_pdf(briefing):
+    """Start rendering a briefing's PDF on the worker pool and return a Future of its bytes.
+
+    Cached briefings resolve immediately, and concurrent requests for identical
+    content share the render already in progress.
+    """
+    key = briefing_digest(briefing)
+    with _lock:
+        pdf = _pdf_cache.get(key)
+        if pdf is not None:
+            future = Future()
+            future.set_result(pdf)
+            return future
+        future = _pending.get(key)
+        if future is None:
+            future = _submit(briefing)
+            _pending[key] = future
+            future.add_done_callback(lambda done, key=key: _finish(key, done))
+        return future
+
+def get_briefing_pdf(briefing, timeout=PDF_TIMEOUT):
+    """Return a briefing's PDF bytes, rendering them on the worker pool when not cached."""
+    return request_briefing_pdf(briefing).result(timeout=timeout)
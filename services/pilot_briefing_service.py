@@ -1,23 +1,47 @@
 # File: services/pilot_briefing_service.py
-from services.weather_service import get_weather_summary
-from services.airport_service import get_airport_info
-from services.flight_plan_service import get_flight_plan_summary
-from services.avwx_service import get_metar, get_taf
-from fpdf import FPDF
-import os
-
-def safe_fetch(func, *args, default="_Data not available._"):
+from services.weather_service import (
+    FEED_PRODUCTS, STATION_PRODUCTS, fetch_weather_batch, fetch_wind_grid, product_text, weather_summary_fields
+)
+from services.acquisition_service import FetchContext
+from services.airport_service import airport_info_fields
+from services.flight_plan_service import flight_time_fields
+from services.winds_aloft_service import DEFAULT_TRUE_AIRSPEED_KT, DEFAULT_FUEL_BURN_GPH
+from services.spatial_index import DEFAULT_CORRIDOR_NM, route_alternates, suggest_alternates
+from services.metar_decoder import decode_metar
+from services.template_service import render_document
+from services.pdf_service import get_briefing_pdf
+
+# Only what the briefing renders: the stations' METAR/TAF and the PIREP/SIGMET feeds they quote
+BRIEFING_PRODUCTS = (*STATION_PRODUCTS, *FEED_PRODUCTS)
+
+def fetch_block(kind, func, *args, heading=None):
+    """Build a briefing block from a fetch, or an "unavailable" block when it fails or returns nothing."""
     try:
-        result = func(*args)
-        return result if result else default
+        content = func(*args)
     except Exception as e:
-        return f"_Error fetching data: {e}_"
+        return {"kind": "unavailable", "heading": heading, "content": f"Error fetching data: {e}"}
+    if not content:
+        return {"kind": "unavailable", "heading": heading, "content": "Data not available."}
+    return {"kind": kind, "heading": heading, "content": content}
 
 def determine_vfr_safety(metar_text):
-    if any(x in metar_text for x in ["1SM", "1/2SM", "OVC", "BKN"]):
+    observation = decode_metar(metar_text)
+    if not observation.is_reported:
+        return "V-F-R suitability cannot be determined: no usable METAR."
+    if observation.flight_category != "VFR":
         return "V-F-R NOT RECOMMENDED due to low visibility or ceiling conditions."
     return "V-F-R conditions appear acceptable based on current METAR."
 
+def alternate_items(icao_id):
+    return [f"{alt_icao} ({name}): {distance:.0f} NM" for alt_icao, name, distance in suggest_alternates(icao_id)]
+
+def route_alternate_items(icao_ids):
+    return [
+        f"{icao_ids[leg]}-{icao_ids[leg + 1]}: {alt_icao} ({name}), {distance:.0f} NM off route"
+        for leg, alternates in enumerate(route_alternates(icao_ids))
+        for alt_icao, name, distance in alternates
+    ]
+
 def parse_route_input(route_input):
     items = route_input.split(',')
     route = []
@@ -27,125 +51,130 @@ def parse_route_input(route_input):
         route.append((icao, altitude))
     return route
 
-def generate_pilot_briefing_from_route(route_input, flight_date):
-    route = parse_route_input(route_input)
-    if len(route) < 2:
-        return "Invalid route input. Please provide at least departure and destination."
+def _departure_section(context, route, flight_date):
+    return [fetch_block("fields", context.call, airport_info_fields, route[0][0])]
+
+def _destination_section(context, route, flight_date):
+    destination = route[-1][0]
+    alternates = fetch_block("list", context.call, alternate_items, destination, heading="Nearby Alternates")
+    if alternates["kind"] == "unavailable":
+        alternates = {"kind": "text", "heading": "Nearby Alternates", "content": "None within range."}
+    return [fetch_block("fields", context.call, airport_info_fields, destination), alternates]
+
+def _route_weather(context, route):
+    # Both stations in one batch: one upstream call per product, shared by every section
+    return context.call(fetch_weather_batch, (route[0][0], route[-1][0]), BRIEFING_PRODUCTS)
+
+def _weather_section(context, route, flight_date):
+    blocks = []
+    for heading, icao_id in (("Departure", route[0][0]), ("Destination", route[-1][0])):
+        heading = f"{heading} ({icao_id})"
+        try:
+            weather_data = _route_weather(context, route)[icao_id]
+        except Exception as e:
+            blocks.append({"kind": "unavailable", "heading": heading, "content": f"Error fetching data: {e}"})
+            continue
+        blocks.append(fetch_block("fields", weather_summary_fields, weather_data, heading=heading))
+    return blocks
+
+def _station_text(context, route, icao_id, product):
+    try:
+        return product_text(_route_weather(context, route)[icao_id], product)
+    except Exception:
+        return f"Error fetching {product}"
 
+def _metar_taf_section(context, route, flight_date):
     departure = route[0][0]
     destination = route[-1][0]
-    briefing = []
-
-    briefing.append(f"Date of Flight: {flight_date}")
-    briefing.append(f"From: {departure} → To: {destination}\n")
-
-    briefing.append("\n---\n\nSECTION 1: DEPARTURE AIRPORT INFO")
-    briefing.append(safe_fetch(get_airport_info, departure))
-
-    briefing.append("\n---\n\nSECTION 2: DESTINATION AIRPORT INFO")
-    briefing.append(safe_fetch(get_airport_info, destination))
-
-    briefing.append("\n---\n\nSECTION 3: WEATHER BRIEFING")
-    briefing.append(safe_fetch(get_weather_summary, departure, destination, flight_date))
-
-    briefing.append("\n---\n\nSECTION 4: CURRENT METAR & TAF")
-    dep_metar = get_metar(departure)
-    briefing.append(f"METAR for {departure}:\n{dep_metar}\n")
-    briefing.append(f"TAF for {departure}:\n{get_taf(departure)}\n")
-    briefing.append(f"TAF for {destination}:\n{get_taf(destination)}")
-
-    briefing.append("\n---\n\nSECTION 5: VFR FLIGHT ADVISORY")
-    briefing.append(determine_vfr_safety(dep_metar))
-
-    briefing.append("\n---\n\nSECTION 6: FLIGHT PLAN SUMMARY")
-    for leg in route:
-        icao, altitude = leg
-        briefing.append(f"Waypoint: {icao} | Planned Altitude: {altitude} ft")
-
-    briefing.append("\n---\n\nSECTION 7: FAA FORM RECORD")
-    briefing.append(f"""
-FAA Form 7233-2 (Preflight Briefing Log)
-----------------------------------------
-Date: {flight_date}
-Departure: {departure}
-Destination: {destination}
-Type of Briefing: Standard
-Specialist ID: [AUTO]
-Time Issued: [AUTO]
-VNR: {determine_vfr_safety(dep_metar)}
-""")
-
-    return "\n".join(briefing)
-
-def export_briefing_to_pdf(departure, destination, flight_date, briefing_text):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=15)
-
-    # Header
-    pdf.set_font("Arial", "B", 16)
-    pdf.cell(0, 10, "PILOT WEATHER BRIEFING - FAA FORM 7233-2", ln=True, align="C")
-    pdf.ln(5)
-
-    pdf.set_font("Arial", "", 12)
-    pdf.cell(0, 10, f"DATE OF FLIGHT: {flight_date}", ln=True)
-    pdf.cell(0, 10, f"ROUTE: {departure} -> {destination}", ln=True)
-    pdf.ln(5)
-
-    # Define FAA-style section headers
-    section_titles = [
-        "DEPARTURE AIRPORT INFORMATION",
-        "DESTINATION AIRPORT INFORMATION",
-        "WEATHER BRIEFING",
-        "CURRENT METAR AND TAF",
-        "VFR FLIGHT ADVISORY",
-        "FLIGHT PLAN SUMMARY",
-        "FAA FORM LOG ENTRY"
+    return [
+        {"kind": "pre", "heading": f"METAR for {departure}", "content": _station_text(context, route, departure, "METAR")},
+        {"kind": "pre", "heading": f"TAF for {departure}", "content": _station_text(context, route, departure, "TAF")},
+        {"kind": "pre", "heading": f"TAF for {destination}", "content": _station_text(context, route, destination, "TAF")},
     ]
 
-    # Clean up the briefing text by removing markdown characters
-    briefing_text = briefing_text.replace("#", "").replace("*", "").replace("_", "")
-
-    # Break into sections and render cleanly
-    sections = briefing_text.split("\n---\n\n")
-    for i, section in enumerate(sections[1:], start=0):  # Skip general info
-        title = section_titles[i] if i < len(section_titles) else f"SECTION {i+1}"
-        lines = section.strip().split("\n", 1)
-        body = lines[1] if len(lines) == 2 else lines[0]
-
-        # Add section header with underline
-        pdf.set_font("Arial", "B", 12)
-        pdf.multi_cell(0, 8, title.upper())
-        pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-        pdf.ln(5)
-
-        # Add section content
-        pdf.set_font("Arial", "", 11)
-        
-        # Check if body is empty or contains error messages
-        if not body.strip() or "Error fetching data" in body or "Data not available" in body:
-            pdf.set_text_color(128, 128, 128)  # Gray color for unavailable data
-            pdf.multi_cell(0, 8, "INFORMATION NOT AVAILABLE")
-            pdf.set_text_color(0, 0, 0)  # Reset to black
-        else:
-            # Split body into paragraphs and add proper spacing
-            paragraphs = [p.strip() for p in body.split("\n\n") if p.strip()]
-            for para in paragraphs:
-                if "Error fetching data" in para or "Data not available" in para:
-                    pdf.set_text_color(128, 128, 128)  # Gray color for unavailable data
-                    pdf.multi_cell(0, 8, "INFORMATION NOT AVAILABLE")
-                    pdf.set_text_color(0, 0, 0)  # Reset to black
-                else:
-                    pdf.multi_cell(0, 8, para)
-                pdf.ln(3)
-        pdf.ln(5)
-
-    # Footer
-    pdf.set_y(-25)
-    pdf.set_font("Arial", "I", 9)
-    pdf.cell(0, 10, "Generated per FAA Order JO 7110.10 and FAA Form 7233-2 briefing standards.", ln=True, align="C")
-
-    output_path = f"briefings/{departure}_{destination}_{flight_date}.pdf"
-    os.makedirs("briefings", exist_ok=True)
-    pdf.output(output_path)
-    return output_path
\ No newline at end of file
+def _vfr_advisory(context, route):
+    return context.call(determine_vfr_safety, _station_text(context, route, route[0][0], "METAR"))
+
+def _vfr_section(context, route, flight_date):
+    return [{"kind": "text", "heading": None, "content": _vfr_advisory(context, route)}]
+
+def _flight_plan_section(context, route, flight_date):
+    alternates = fetch_block(
+        "list", context.call, route_alternate_items, tuple(icao for icao, _ in route), heading="Alternates Along Route"
+    )
+    if alternates["kind"] == "unavailable" and alternates["content"] == "Data not available.":
+        alternates = {"kind": "text", "heading": "Alternates Along Route", "content": f"None within {DEFAULT_CORRIDOR_NM} NM of the route."}
+    return [
+        {"kind": "list", "heading": None, "content": [
+            f"Waypoint: {icao} | Planned Altitude: {altitude} ft" for icao, altitude in route
+        ]},
+        fetch_block(
+            "fields", context.call, flight_time_fields, tuple(route), DEFAULT_TRUE_AIRSPEED_KT, DEFAULT_FUEL_BURN_GPH,
+            context.call(fetch_wind_grid), heading="Estimated Flight Time"
+        ),
+        alternates,
+    ]
+
+def _faa_form_section(context, route, flight_date):
+    return [{"kind": "pre", "heading": "FAA Form 7233-2 (Preflight Briefing Log)", "content": "\n".join([
+        f"Date: {flight_date}",
+        f"Departure: {route[0][0]}",
+        f"Destination: {route[-1][0]}",
+        "Type of Briefing: Standard",
+        "Specialist ID: [AUTO]",
+        "Time Issued: [AUTO]",
+        f"VNR: {_vfr_advisory(context, route)}",
+    ])}]
+
+# (title, FAA-style PDF title, builder) in briefing order
+BRIEFING_SECTIONS = [
+    ("DEPARTURE AIRPORT INFO", "DEPARTURE AIRPORT INFORMATION", _departure_section),
+    ("DESTINATION AIRPORT INFO", "DESTINATION AIRPORT INFORMATION", _destination_section),
+    ("WEATHER BRIEFING", "WEATHER BRIEFING", _weather_section),
+    ("CURRENT METAR & TAF", "CURRENT METAR AND TAF", _metar_taf_section),
+    ("VFR FLIGHT ADVISORY", "VFR FLIGHT ADVISORY", _vfr_section),
+    ("FLIGHT PLAN SUMMARY", "FLIGHT PLAN SUMMARY", _flight_plan_section),
+    ("FAA FORM RECORD", "FAA FORM LOG ENTRY", _faa_form_section),
+]
+
+def build_pilot_briefing(route_input, flight_date):
+    """Assemble the pilot briefing as a structured model that every export format renders from.
+
+    Returns {"flight_date", "departure", "destination", "route", "sections", "error"}.
+    Each section has a title, the FAA-style pdf_title and a list of blocks
+    ({"kind": fields|list|text|pre|unavailable, "heading", "content"}). Sections
+    are built concurrently within one FetchContext, so every upstream call (one
+    per product for both stations, the airport lookups, the alternates) is made
+    once per briefing however many sections use it.
+    """
+    route = parse_route_input(route_input)
+    if len(route) < 2:
+        return {"error": "Invalid route input. Please provide at least departure and destination."}
+
+    with FetchContext() as context:
+        futures = [context.submit(builder, context, route, flight_date) for _, _, builder in BRIEFING_SECTIONS]
+        sections = [
+            {"number": number, "title": title, "pdf_title": pdf_title, "blocks": future.result()}
+            for number, ((title, pdf_title, _), future) in enumerate(zip(BRIEFING_SECTIONS, futures), 1)
+        ]
+    return {
+        "error": None,
+        "flight_date": flight_date,
+        "departure": route[0][0],
+        "destination": route[-1][0],
+        "route": route,
+        "sections": sections,
+    }
+
+def generate_pilot_briefing_from_route(route_input, flight_date):
+    briefing = build_pilot_briefing(route_input, flight_date)
+    if briefing["error"]:
+        return briefing["error"]
+    return render_document("pilot_briefing", "markdown", briefing)
+
+def briefing_pdf_filename(briefing):
+    return f"{briefing['departure']}_{briefing['destination']}_{briefing['flight_date']}.pdf"
+
+def export_briefing_to_pdf(briefing):
+    """Return the pilot briefing as PDF bytes (rendered off-thread and cached by content)."""
+    return get_briefing_pdf(briefing)
\ No newline at end of file
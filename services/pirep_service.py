@@ -0,0 +1,130 @@
+# services/pirep_service.py
+import re
+import time
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+from services.spatial_index import leg_distances
+from utils.geodesy import to_unit_vectors, nm_to_chord, angle_between, sample_legs, EARTH_RADIUS_NM
+
+# Constants
+PIREP_RADIUS_NM = 50  # Lateral distance from a station or leg within which a report is relevant
+PIREP_ALTITUDE_BAND_FT = 4000  # +/- band around the planned altitude
+PIREP_MAX_AGE_S = 2 * 3600  # Older reports no longer describe the conditions
+MAX_STATION_PIREPS = 3  # Reports quoted per station, newest first
+NO_HAZARD_INTENSITIES = ("", "NEG", "NEGCLR", "NONE", "SMTH")
+
+TURBULENCE_RE = re.compile(r"/TB\s+(?!NEG|SMTH)\S")
+ICING_RE = re.compile(r"/IC\s+(?!NEG)\S")
+
+def _column(frame, name):
+    return frame[name] if name in frame else pd.Series([None] * len(frame), dtype=object)
+
+def _numeric(frame, name):
+    return pd.to_numeric(_column(frame, name), errors="coerce")
+
+def _intensity_reported(values, raws, pattern):
+    """True where an intensity field reports a hazard, falling back to the raw /TB or /IC group."""
+    values = values.fillna("").astype(str).str.strip().str.upper()
+    from_raw = raws.str.contains(pattern)
+    return np.where(values == "", from_raw, ~values.isin(NO_HAZARD_INTENSITIES))
+
+class PirepIndex:
+    """Position, altitude, time and hazard arrays for a PIREP feed with a KD-tree over positions.
+
+    Positions are 3-D unit vectors, as in services.spatial_index, so radius
+    queries are exact great-circle queries. Altitudes are in feet (NaN when the
+    report gives none, e.g. DURC/UNKN); obs_time is epoch seconds (NaN when unknown).
+    """
+
+    def __init__(self, entries):
+        frame = pd.DataFrame(entries or [])
+        located = _numeric(frame, "lat").notna() & _numeric(frame, "lon").notna()
+        frame = frame[located.to_numpy()].reset_index(drop=True)
+        raw = _column(frame, "rawOb").fillna("").astype(str)
+
+        self.lat = _numeric(frame, "lat").to_numpy(dtype=np.float64)
+        self.lon = _numeric(frame, "lon").to_numpy(dtype=np.float64)
+        self.raw = raw.to_numpy(dtype=object)
+        # fltLvl is in hundreds of feet
+        self.altitude_ft = _numeric(frame, "fltLvl").to_numpy(dtype=np.float64) * 100.0
+        self.obs_time = _numeric(frame, "obsTime").to_numpy(dtype=np.float64)
+        self.turbulence = _intensity_reported(_column(frame, "tbInt1"), raw, TURBULENCE_RE)
+        self.icing = _intensity_reported(_column(frame, "icgInt1"), raw, ICING_RE)
+        self.vectors = to_unit_vectors(self.lat, self.lon).reshape(-1, 3)
+        self.tree = cKDTree(self.vectors) if len(self.vectors) else None
+
+    def __len__(self):
+        return len(self.raw)
+
+    def _current(self, rows, now, max_age_s):
+        age = (time.time() if now is None else now) - self.obs_time[rows]
+        return rows[~(age > max_age_s)]  # Keep reports of unknown age
+
+    def near_point(self, lat, lon, radius_nm=PIREP_RADIUS_NM, now=None, max_age_s=PIREP_MAX_AGE_S):
+        """Return the rows of current reports within radius_nm of a point, newest first."""
+        if self.tree is None:
+            return np.zeros(0, dtype=np.intp)
+        rows = np.asarray(self.tree.query_ball_point(to_unit_vectors(lat, lon), nm_to_chord(radius_nm)), dtype=np.intp)
+        rows = self._current(rows, now, max_age_s)
+        return rows[np.argsort(-np.nan_to_num(self.obs_time[rows], nan=-np.inf), kind="stable")]
+
+    def along_route(self, lats, lons, altitudes, radius_nm=PIREP_RADIUS_NM, band_ft=PIREP_ALTITUDE_BAND_FT,
+                    now=None, max_age_s=PIREP_MAX_AGE_S):
+        """Find the current reports near each leg of a route and within the altitude band.
+
+        All legs are sampled and queried in one KD-tree call; candidate (leg, report)
+        pairs are then filtered in one vectorized pass by exact distance to the leg
+        and by altitude against the planned altitude, interpolated linearly between
+        the leg's waypoints at the report's position. Reports without an altitude
+        are kept. Returns one (rows, distances_nm) pair per leg, ordered along the leg.
+        """
+        waypoints = to_unit_vectors(lats, lons)
+        starts, ends = waypoints[:-1], waypoints[1:]
+        n_legs = len(starts)
+        if n_legs == 0:
+            return []
+        empty = [(np.zeros(0, dtype=np.intp), np.zeros(0)) for _ in range(n_legs)]
+        if self.tree is None:
+            return empty
+
+        samples, sample_legs_ids, _ = sample_legs(starts, ends, radius_nm)
+        # A ball of this radius around each sample covers the corridor up to the next sample
+        hits = self.tree.query_ball_point(samples, nm_to_chord(np.hypot(radius_nm, radius_nm / 2.0)))
+        counts = np.fromiter((len(rows) for rows in hits), dtype=np.intp, count=len(hits))
+        if not counts.sum():
+            return empty
+        rows = np.concatenate([np.asarray(rows, dtype=np.intp) for rows in hits if rows])
+        pairs = np.unique(sample_legs_ids.repeat(counts) * len(self) + rows)
+        legs, rows = np.divmod(pairs, len(self))
+
+        distances, along = leg_distances(self.vectors[rows], starts[legs], ends[legs])
+        altitudes = np.asarray(altitudes, dtype=np.float64)
+        leg_nm = EARTH_RADIUS_NM * angle_between(starts, ends)
+        fraction = np.clip(along / np.where(leg_nm[legs] > 0, leg_nm[legs], 1.0), 0.0, 1.0)
+        planned = altitudes[legs] + fraction * (altitudes[legs + 1] - altitudes[legs])
+        reported = self.altitude_ft[rows]
+        age = (time.time() if now is None else now) - self.obs_time[rows]
+        keep = (distances <= radius_nm) & ~(np.abs(reported - planned) > band_ft) & ~(age > max_age_s)
+
+        legs, rows, distances, along = legs[keep], rows[keep], distances[keep], along[keep]
+        order = np.lexsort((along, legs))
+        legs, rows, distances = legs[order], rows[order], distances[order]
+        bounds = np.searchsorted(legs, np.arange(n_legs + 1))
+        return [(rows[lo:hi], distances[lo:hi]) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+    def record(self, row, distance_nm=None):
+        """Describe one report as a plain dict for the briefing model."""
+        altitude = self.altitude_ft[row]
+        return {
+            "raw": self.raw[row],
+            "altitude_ft": None if np.isnan(altitude) else int(altitude),
+            "distance_nm": None if distance_nm is None else round(float(distance_nm), 1),
+            "turbulence": bool(self.turbulence[row]),
+            "icing": bool(self.icing[row]),
+        }
+
+def station_pirep_text(index, lat, lon, missing="No recent PIREP", radius_nm=PIREP_RADIUS_NM, limit=MAX_STATION_PIREPS):
+    """Return the newest reports near a station, one per line, or the missing placeholder."""
+    rows = index.near_point(lat, lon, radius_nm)[:limit]
+    return "\n".join(index.raw[row] for row in rows) if len(rows) else missing
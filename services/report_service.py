@@ -2,169 +2,195 @@
 import datetime
 import streamlit as st
 import base64
+import hashlib
 import io
 import matplotlib.pyplot as plt
 import numpy as np
+from matplotlib.collections import LineCollection
 from matplotlib.colors import LinearSegmentedColormap
+from services.advisory_service import altitude_range_text
+from services.briefing_model import WaypointAssessment
+from services.metar_decoder import decode_metar
+from services.taf_decoder import format_time
+from services.winds_aloft_service import format_duration
+from services.template_service import FORMAT_EXTENSIONS, render_all_formats, render_document
+from utils.geodesy import route_geometry
 
-def generate_weather_report(flight_plan, waypoints, weather_data_list, airport_coords):
-    """Generate a comprehensive weather report for the flight plan."""
-    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC")
-    
-    report = io.StringIO()
-    report.write(f"""
-# Flight Weather Briefing
-## {flight_plan}
-Generated on: {now}
+# Constants
+PROFILE_SAMPLES = 100  # Points along the severity-colored profile curve
+PROFILE_CACHE_SIZE = 64  # Rendered profile charts kept in memory
+REPORT_MIME_TYPES = {"markdown": "text/markdown", "html": "text/html", "text": "text/plain"}
+PIREP_HAZARDS = ("turbulence", "icing")  # Hazard flags of a leg PIREP record
+STRONG_HEADWIND_FRACTION = 0.25  # A leg's mean headwind above this share of the airspeed is worth a recommendation
 
-## Flight Summary
-""")
-    
-    # Flight summary information
-    total_distance = calculate_distance(waypoints, airport_coords)
-    report.write(f"* **Route**: {' → '.join([icao for icao, _ in waypoints])}\n")
-    report.write(f"* **Distance**: {total_distance:.1f} NM\n")
-    report.write(f"* **Waypoints**: {len(waypoints)}\n")
-    
-    # Weather overview
-    report.write("\n## Weather Overview\n")
-    conditions = [classify_conditions(weather_data) for weather_data in weather_data_list]
-    report.write(f"* **Overall Conditions**: {get_overall_conditions(conditions)}\n")
-    report.write(f"* **Hazard Areas**: {count_hazards(weather_data_list)}\n")
-    
-    # Detailed waypoint information
-    report.write("\n## Waypoint Details\n")
-    for i, ((icao, altitude), weather_data) in enumerate(zip(waypoints, weather_data_list)):
-        report.write(f"\n### {i+1}. {icao} at {altitude}ft\n")
-        report.write(f"* **METAR**: {weather_data.get('METAR', 'Unavailable')}\n")
-        report.write(f"* **TAF**: {weather_data.get('TAF', 'Unavailable')}\n")
-        if weather_data.get('PIREP') and weather_data.get('PIREP') != "No recent PIREP":
-            report.write(f"* **PIREP**: {weather_data.get('PIREP')}\n")
-        if weather_data.get('SIGMET') and weather_data.get('SIGMET') != "No active SIGMET":
-            report.write(f"* **SIGMET**: {weather_data.get('SIGMET')}\n")
-    
-    # Recommendations
-    report.write("\n## Recommendations\n")
-    report.write(generate_recommendations(weather_data_list, waypoints))
-    
-    return report.getvalue()
+def build_weather_report(flight_plan, briefing):
+    """Collect everything the weather report shows into one model.
 
-def generate_weather_report_html(flight_plan, waypoints, weather_data_list, airport_coords):
-    """Generate an HTML version of the weather report."""
-    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC")
-    
-    html = f"""
-    <html>
-    <head>
-        <style>
-            body {{ font-family: Arial, sans-serif; margin: 20px; }}
-            h1 {{ color: #2563eb; }}
-            h2 {{ color: #1e3a8a; border-bottom: 1px solid #93c5fd; padding-bottom: 5px; }}
-            h3 {{ color: #1e40af; }}
-            .container {{ max-width: 800px; margin: 0 auto; }}
-            .warning {{ color: #b91c1c; font-weight: bold; }}
-            .safe {{ color: #15803d; }}
-            .caution {{ color: #b45309; }}
-            table {{ width: 100%; border-collapse: collapse; margin: 15px 0; }}
-            th, td {{ padding: 8px; text-align: left; border-bottom: 1px solid #ddd; }}
-            th {{ background-color: #e0ecff; }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>Flight Weather Briefing</h1>
-            <h2>{flight_plan}</h2>
-            <p>Generated on: {now}</p>
-            
-            <h2>Flight Summary</h2>
+    Classification and recommendations run once here; every export format is a
+    template rendering of this dict (see services.template_service).
     """
-    
-    # Flight summary information
-    total_distance = calculate_distance(waypoints, airport_coords)
-    html += f"<p><strong>Route</strong>: {' → '.join([icao for icao, _ in waypoints])}</p>"
-    html += f"<p><strong>Distance</strong>: {total_distance:.1f} NM</p>"
-    html += f"<p><strong>Waypoints</strong>: {len(waypoints)}</p>"
-    
-    # Weather overview
-    html += "<h2>Weather Overview</h2>"
-    conditions = [classify_conditions(weather_data) for weather_data in weather_data_list]
-    overall = get_overall_conditions(conditions)
-    css_class = "safe" if "Good" in overall else "caution" if "Marginal" in overall else "warning"
-    html += f"<p><strong>Overall Conditions</strong>: <span class='{css_class}'>{overall}</span></p>"
-    
-    hazards = count_hazards(weather_data_list)
-    css_class = "safe" if "None" in hazards else "warning"
-    html += f"<p><strong>Hazard Areas</strong>: <span class='{css_class}'>{hazards}</span></p>"
-    
-    # Detailed waypoint information
-    html += "<h2>Waypoint Details</h2>"
-    html += "<table>"
-    html += "<tr><th>Waypoint</th><th>Altitude</th><th>Conditions</th><th>Details</th></tr>"
-    
-    for i, ((icao, altitude), weather_data) in enumerate(zip(waypoints, weather_data_list)):
-        condition = classify_conditions(weather_data)
-        css_class = "safe" if condition == "VFR" else "caution" if condition == "MVFR" else "warning"
-        
-        details = ""
-        if "SIGMET" in weather_data and weather_data["SIGMET"] != "No active SIGMET":
-            details += f"<span class='warning'>SIGMET</span>: {weather_data['SIGMET']}<br>"
-        if "PIREP" in weather_data and weather_data["PIREP"] != "No recent PIREP":
-            details += f"PIREP: {weather_data['PIREP']}<br>"
-        
-        html += f"<tr>"
-        html += f"<td>{icao}</td>"
-        html += f"<td>{altitude}ft</td>"
-        html += f"<td class='{css_class}'>{condition}</td>"
-        html += f"<td>{details}</td>"
-        html += f"</tr>"
-    
-    html += "</table>"
-    
-    # Recommendations
-    html += "<h2>Recommendations</h2>"
-    html += f"<p>{generate_recommendations(weather_data_list, waypoints).replace('\n', '<br>')}</p>"
-    
-    html += """
-        </div>
-    </body>
-    </html>
+    overall = get_overall_conditions([assessment.conditions for assessment in briefing.assessments])
+    hazards = count_hazards(briefing)
+    waypoints = []
+    for number, assessment in enumerate(briefing.assessments, 1):
+        weather_data = assessment.weather
+        waypoints.append({
+            "number": number,
+            "icao": assessment.icao,
+            "altitude": assessment.altitude,
+            "conditions": assessment.conditions,
+            "label": assessment.label,
+            # The CSS class follows the shared severity so the table matches the map colours
+            "css_class": ("safe", "caution", "warning")[assessment.severity],
+            "metar": weather_data.get("METAR", "Unavailable"),
+            "taf": weather_data.get("TAF", "Unavailable"),
+            "eta": format_time(assessment.eta) if assessment.eta is not None else None,
+            "forecast": assessment.forecast,
+            "pirep": weather_data.get("PIREP") if assessment.has_pirep else None,
+            "sigmet": "; ".join(waypoint_sigmets(assessment)) or None,
+            "unknown": ", ".join(assessment.unknown) or None,
+        })
+    return {
+        "flight_plan": flight_plan,
+        "generated_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC"),
+        "route": [icao for icao, _ in briefing.waypoints],
+        "distance_nm": briefing.total_distance,
+        "overall": overall,
+        "overall_class": "safe" if "Good" in overall else "caution" if "Marginal" in overall else "warning",
+        "hazards": hazards,
+        "hazards_class": "safe" if "None" in hazards else "warning",
+        "waypoints": waypoints,
+        "leg_hazards": altitude_hazard_legs(briefing),
+        "route_advisories": route_advisory_legs(briefing),
+        "route_pireps": route_pirep_legs(briefing),
+        "flight_time": flight_time_summary(briefing),
+        "recommendations": list_recommendations(briefing),
+    }
+
+def waypoint_sigmets(assessment):
+    """Return the SIGMETs affecting a waypoint: its station feed text and any SIGMET area covering it.
+
+    The feed text is skipped when the feed could not be fetched, since it is then only a placeholder.
     """
-    
-    return html
+    sigmets = [area["raw"] for area in assessment.advisories if area["kind"] == "SIGMET"]
+    text = assessment.weather.get("SIGMET")
+    if text and text != "No active SIGMET" and "SIGMET" not in assessment.unknown:
+        sigmets.insert(0, text)
+    return list(dict.fromkeys(sigmets))
+
+def leg_name(briefing, leg):
+    return f"{briefing.waypoints[leg][0]} → {briefing.waypoints[leg + 1][0]}"
+
+def altitude_hazard_legs(briefing):
+    """Return every leg with its planned altitude band and the hazards overlapping it."""
+    legs = []
+    for leg, hazards in enumerate(briefing.leg_hazards):
+        low, high = sorted((briefing.waypoints[leg][1], briefing.waypoints[leg + 1][1]))
+        legs.append({
+            "leg": leg_name(briefing, leg),
+            "altitudes": f"{low}ft" if low == high else f"{low}-{high}ft",
+            "hazards": [f"{hazard['kind']}: {hazard['description']}" for hazard in hazards],
+            "css_class": ("safe", "caution", "warning")[briefing.leg_severities[leg]],
+        })
+    return legs
+
+def route_advisory_legs(briefing):
+    """Return the legs crossing SIGMET or G-AIRMET areas, with where along each leg the area lies."""
+    legs = []
+    for leg, crossings in enumerate(briefing.leg_advisories):
+        if not crossings:
+            continue
+        advisories = []
+        for crossing in crossings:
+            area = briefing.advisory_areas[crossing["area"]]
+            advisories.append({
+                "kind": area["kind"],
+                "hazard": area["hazard"],
+                "altitudes": altitude_range_text(area),
+                "from_nm": crossing["from_nm"],
+                "to_nm": crossing["to_nm"],
+                "raw": area["raw"],
+                "severe": area["severity"] == 2,
+                "at_altitude": crossing["at_altitude"],
+            })
+        legs.append({"leg": leg_name(briefing, leg), "advisories": advisories})
+    return legs
+
+def route_pirep_legs(briefing):
+    """Return the legs with pilot reports near them and within the altitude band, in route order."""
+    legs = []
+    for leg, reports in enumerate(briefing.leg_pireps):
+        if not reports:
+            continue
+        legs.append({
+            "leg": leg_name(briefing, leg),
+            "reports": [
+                dict(report, hazards=", ".join(kind.capitalize() for kind in PIREP_HAZARDS if report[kind]))
+                for report in reports
+            ],
+        })
+    return legs
+
+def wind_component_text(headwind_kt):
+    return f"{abs(headwind_kt):.0f} kt {'headwind' if headwind_kt >= 0 else 'tailwind'}"
+
+def flight_time_summary(briefing):
+    """Return the wind-corrected time en route and fuel, in total and per leg, or None without an airspeed."""
+    winds = briefing.winds
+    if winds is None:
+        return None
+    legs = []
+    for leg, hours in enumerate(winds.leg_hours):
+        legs.append({
+            "leg": leg_name(briefing, leg),
+            "distance_nm": round(float(briefing.geometry.leg_nm[leg])),
+            "wind": wind_component_text(winds.leg_headwind_kt[leg]),
+            "groundspeed_kt": round(float(winds.leg_groundspeed_kt[leg])),
+            "ete": format_duration(hours),
+            "fuel_gal": round(float(winds.leg_fuel_gal[leg]), 1),
+        })
+    if not winds.covered.any():
+        note = "No winds-aloft forecast along the route; still air assumed."
+    elif not winds.covered.all():
+        note = "No winds-aloft forecast for part of the route; still air assumed there."
+    else:
+        note = None
+    return {
+        "true_airspeed_kt": round(winds.true_airspeed_kt),
+        "ete": format_duration(briefing.total_hours),
+        "fuel_gal": round(briefing.total_fuel, 1),
+        "legs": legs,
+        "note": note,
+    }
+
+def export_weather_report(flight_plan, briefing, formats=tuple(FORMAT_EXTENSIONS)):
+    """Render the weather report to every requested format from a single model: {format_type: text}."""
+    return render_all_formats("weather_report", build_weather_report(flight_plan, briefing), formats)
+
+def generate_weather_report(flight_plan, briefing, airport_coords):
+    """Generate a comprehensive weather report for the flight plan."""
+    return render_document("weather_report", "markdown", build_weather_report(flight_plan, briefing))
+
+def generate_weather_report_html(flight_plan, briefing, airport_coords):
+    """Generate an HTML version of the weather report."""
+    return render_document("weather_report", "html", build_weather_report(flight_plan, briefing))
 
 def get_download_link(report, filename, format_type="markdown"):
     """Generate a download link for the report."""
-    if format_type == "html":
-        b64 = base64.b64encode(report.encode()).decode()
-        mime = "text/html"
-        ext = "html"
-    else:  # markdown
-        b64 = base64.b64encode(report.encode()).decode()
-        mime = "text/markdown"
-        ext = "md"
+    b64 = base64.b64encode(report.encode()).decode()
+    mime = REPORT_MIME_TYPES.get(format_type, "text/markdown")
+    ext = FORMAT_EXTENSIONS.get(format_type, "md")
     
     href = f'<a href="data:{mime};base64,{b64}" download="{filename}.{ext}" class="download-button">Download {format_type.upper()} Report</a>'
     return href
 
 def classify_conditions(weather_data):
     """Classify weather conditions as VFR, MVFR, or IFR."""
-    metar = weather_data.get("METAR", "")
-    if not metar:
-        return "Unknown"
-    
-    if "OVC" in metar and any(cloud_height <= 500 for cloud_height in extract_cloud_heights(metar)):
-        return "IFR"
-    elif "BKN" in metar and any(cloud_height <= 1000 for cloud_height in extract_cloud_heights(metar)):
-        return "MVFR"
-    else:
-        return "VFR"
+    return WaypointAssessment(None, None, weather_data).conditions
 
 def extract_cloud_heights(metar):
     """Extract cloud heights from METAR."""
-    import re
-    # Look for patterns like "OVC050" (overcast at 5000 feet)
-    cloud_layers = re.findall(r'(OVC|BKN|SCT|FEW)(\d{3})', metar)
-    heights = [int(height) * 100 for _, height in cloud_layers]
+    heights = [base for _, base in decode_metar(metar).clouds if base is not None]
     return heights if heights else [10000]  # Default to high ceiling if none found
 
 def get_overall_conditions(conditions):
@@ -176,75 +202,90 @@ def get_overall_conditions(conditions):
     else:
         return "Good - VFR conditions throughout"
 
-def count_hazards(weather_data_list):
-    """Count hazardous weather areas in the flight path."""
-    hazard_count = sum(1 for data in weather_data_list 
-                     if data.get("SIGMET") and data.get("SIGMET") != "No active SIGMET")
-    if hazard_count == 0:
+def count_hazards(briefing):
+    """Count hazardous weather areas in the flight path: advisory areas crossed at the planned altitude and stations with SIGMETs."""
+    crossed = len(briefing.hazard_areas)
+    hazard_count = sum(1 for assessment in briefing.assessments if assessment.has_sigmet)
+    if crossed == 0 and hazard_count == 0:
         return "None reported"
-    else:
-        return f"{hazard_count} area{'s' if hazard_count > 1 else ''} with active SIGMETs"
+    counts = []
+    if crossed:
+        counts.append(f"{crossed} advisory area{'s' if crossed > 1 else ''} crossed at the planned altitude")
+    if hazard_count:
+        counts.append(f"{hazard_count} area{'s' if hazard_count > 1 else ''} with active SIGMETs")
+    return "; ".join(counts)
 
 def calculate_distance(waypoints, airport_coords):
     """Calculate total distance of flight path in nautical miles."""
-    import math
-    
-    def haversine(lat1, lon1, lat2, lon2):
-        """Calculate distance between two coordinates in NM."""
-        R = 3440.065  # Earth radius in NM
-        dLat = math.radians(lat2 - lat1)
-        dLon = math.radians(lon2 - lon1)
-        a = math.sin(dLat/2) * math.sin(dLat/2) + \
-            math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * \
-            math.sin(dLon/2) * math.sin(dLon/2)
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        return R * c
-    
-    total_distance = 0
-    for i in range(len(waypoints) - 1):
-        icao1, _ = waypoints[i]
-        icao2, _ = waypoints[i+1]
-        lat1, lon1 = airport_coords[icao1]
-        lat2, lon2 = airport_coords[icao2]
-        distance = haversine(lat1, lon1, lat2, lon2)
-        total_distance += distance
-    
-    return total_distance
+    lats, lons = airport_coords.coordinates([icao for icao, _ in waypoints])
+    return float(route_geometry(lats, lons).cumulative_nm[-1])
 
-def generate_recommendations(weather_data_list, waypoints):
-    """Generate flight recommendations based on weather data."""
-    conditions = [classify_conditions(data) for data in weather_data_list]
+def list_recommendations(briefing):
+    """Return the flight recommendations based on weather data, one sentence each."""
+    conditions = [assessment.conditions for assessment in briefing.assessments]
     
-    recommendations = ""
+    recommendations = []
     
     # Check for IFR conditions
-    ifr_waypoints = [waypoints[i][0] for i, cond in enumerate(conditions) if cond == "IFR"]
+    ifr_waypoints = [a.icao for a in briefing.assessments if a.conditions == "IFR"]
     if ifr_waypoints:
-        recommendations += f"- IFR conditions at {', '.join(ifr_waypoints)}. File an IFR flight plan.\n"
+        recommendations.append(f"IFR conditions at {', '.join(ifr_waypoints)}. File an IFR flight plan.")
     
     # Check for SIGMETs
-    sigmet_waypoints = [waypoints[i][0] for i, data in enumerate(weather_data_list) 
-                        if data.get("SIGMET") and data.get("SIGMET") != "No active SIGMET"]
+    sigmet_waypoints = [a.icao for a in briefing.assessments if a.has_sigmet]
     if sigmet_waypoints:
-        recommendations += f"- Active SIGMETs near {', '.join(sigmet_waypoints)}. Consider route deviation.\n"
+        recommendations.append(f"Active SIGMETs near {', '.join(sigmet_waypoints)}. Consider route deviation.")
+    
+    # Check for advisory areas the route passes through
+    crossing_legs = [
+        leg_name(briefing, leg) for leg, crossings in enumerate(briefing.leg_advisories)
+        if any(crossing["at_altitude"] for crossing in crossings)
+    ]
+    if crossing_legs:
+        recommendations.append(f"Route crosses SIGMET/G-AIRMET areas at the planned altitude on {', '.join(crossing_legs)}. Consider a deviation or another altitude.")
+    
+    # Check for cloud and icing layers at the planned altitude
+    layer_waypoints = [a.icao for a in briefing.assessments if a.altitude_hazards]
+    if layer_waypoints:
+        recommendations.append(f"Planned altitude is in or near cloud or possible icing at {', '.join(layer_waypoints)}. Review the altitude for those waypoints.")
+    
+    # Check for turbulence and icing reported by pilots along the route
+    reported = [report for reports in briefing.leg_pireps for report in reports]
+    hazards = [kind for kind in PIREP_HAZARDS if any(report[kind] for report in reported)]
+    if hazards:
+        recommendations.append(f"Pilots report {' and '.join(hazards)} near your route and altitude. Review the PIREPs along the route.")
+    
+    # Check for strong headwinds at the planned altitude
+    if briefing.winds is not None:
+        limit = STRONG_HEADWIND_FRACTION * briefing.winds.true_airspeed_kt
+        windy_legs = [
+            f"{leg_name(briefing, leg)} ({headwind:.0f} kt)"
+            for leg, headwind in enumerate(briefing.winds.leg_headwind_kt) if headwind > limit
+        ]
+        if windy_legs:
+            recommendations.append(f"Strong headwinds at the planned altitude on {', '.join(windy_legs)}. Consider another altitude and plan extra fuel.")
     
     # Check for cloud layers
-    high_cloud_waypoints = [waypoints[i][0] for i, data in enumerate(weather_data_list)
-                           if data.get("METAR") and ("OVC" in data["METAR"] or "BKN" in data["METAR"])]
+    high_cloud_waypoints = [a.icao for a in briefing.assessments if a.has_ceiling]
     if high_cloud_waypoints:
-        recommendations += f"- Significant cloud coverage at {', '.join(high_cloud_waypoints)}. Review ceiling heights.\n"
+        recommendations.append(f"Significant cloud coverage at {', '.join(high_cloud_waypoints)}. Review ceiling heights.")
     
     # General recommendations
     if "IFR" in conditions:
-        recommendations += "- Ensure IFR currency and equipment requirements are met.\n"
+        recommendations.append("Ensure IFR currency and equipment requirements are met.")
     
     if not recommendations:
-        recommendations += "- Good VFR conditions throughout. Standard precautions advised.\n"
+        recommendations.append("Good VFR conditions throughout. Standard precautions advised.")
     
     return recommendations
 
-def create_route_profile_chart(waypoints, weather_data_list, airport_coords):
+def generate_recommendations(briefing):
+    """Generate flight recommendations based on weather data as a Markdown list."""
+    return "".join(f"- {recommendation}\n" for recommendation in list_recommendations(briefing))
+
+def create_route_profile_chart(briefing, airport_coords):
     """Create a matplotlib figure showing the flight profile with weather severity."""
+    waypoints = briefing.waypoints
     # Set up the figure
     fig, ax = plt.subplots(figsize=(10, 6))
     
@@ -252,69 +293,44 @@ def create_route_profile_chart(waypoints, weather_data_list, airport_coords):
     icao_labels = [icao for icao, _ in waypoints]
     altitudes = [alt for _, alt in waypoints]
     
-    # Calculate distances
-    distances = [0]
-    total_distance = 0
-    for i in range(len(waypoints) - 1):
-        icao1, _ = waypoints[i]
-        icao2, _ = waypoints[i+1]
-        lat1, lon1 = airport_coords[icao1]
-        lat2, lon2 = airport_coords[icao2]
-        
-        # Simple distance calculation (not accurate for long distances)
-        import math
-        R = 3440.065  # Earth radius in NM
-        dLat = math.radians(lat2 - lat1)
-        dLon = math.radians(lon2 - lon1)
-        a = math.sin(dLat/2) * math.sin(dLat/2) + \
-            math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * \
-            math.sin(dLon/2) * math.sin(dLon/2)
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        distance = R * c
-        
-        total_distance += distance
-        distances.append(total_distance)
+    # Cumulative great-circle distance of each waypoint, computed once per briefing
+    distances = briefing.geometry.cumulative_nm
+    total_distance = briefing.total_distance
     
-    # Create x points for smooth curve
-    x_smooth = np.linspace(0, total_distance, 100)
+    # Create x points for smooth curve, including where the route enters and leaves advisory areas
+    spans = np.asarray(briefing.hazard_spans, dtype=np.float64).reshape(-1, 3)
+    x_smooth = np.union1d(np.linspace(0, total_distance, PROFILE_SAMPLES), spans[:, :2].ravel())
     
-    # Interpolate altitudes
-    from scipy.interpolate import interp1d
-    if len(waypoints) > 1:
-        altitude_curve = interp1d(distances, altitudes, kind='linear')
-        y_smooth = altitude_curve(x_smooth)
-    else:
-        y_smooth = np.array([altitudes[0]] * 100)
-        
-    # Get weather severity
-    severity = []
-    for data in weather_data_list:
-        if data.get("SIGMET") and data.get("SIGMET") != "No active SIGMET":
-            severity.append(2)  # High severity
-        elif data.get("METAR") and ("OVC" in data["METAR"] or "BKN" in data["METAR"]):
-            severity.append(1)  # Medium severity
-        else:
-            severity.append(0)  # Low severity
+    # Get weather severity (0 good, 1 marginal, 2 hazardous), shared with the map
+    severity = briefing.severities
     
     # Plot flight path
     ax.plot(distances, altitudes, 'o-', color='blue', markersize=8)
     
-    # Create color segments for the smoothed curve
+    # Color the smoothed curve by interpolated severity as a single LineCollection
     if len(waypoints) > 1:
+        y_smooth = np.interp(x_smooth, distances, altitudes)
+        severity_smooth = np.maximum(np.interp(x_smooth, distances, severity), briefing.span_severity(x_smooth))
+        points = np.column_stack((x_smooth, y_smooth))
+        segments = np.stack((points[:-1], points[1:]), axis=1)
         color_map = LinearSegmentedColormap.from_list("", ["green", "yellow", "red"])
-        severity_interp = interp1d(distances, severity, kind='linear')
-        severity_smooth = severity_interp(x_smooth)
-        
-        # Plot the smooth curve with colors
-        for i in range(len(x_smooth)-1):
-            sev = severity_smooth[i]
-            color = color_map(sev/2)  # Normalize to [0, 1]
-            ax.plot(x_smooth[i:i+2], y_smooth[i:i+2], color=color, linewidth=3)
+        ax.add_collection(LineCollection(segments, colors=color_map(severity_smooth[:-1] / 2), linewidths=3))
+    
+    # Headwind component along the route at the planned altitude, on its own axis
+    winds = briefing.winds
+    if winds is not None:
+        wind_ax = ax.twinx()
+        wind_ax.plot(winds.distances_nm, winds.headwind_kt, color='gray', linestyle=':', linewidth=1.5)
+        wind_ax.axhline(0, color='gray', linewidth=0.5)
+        wind_ax.set_ylabel('Headwind component (kt)')
     
     # Add labels and formatting
     ax.set_xlabel('Distance (NM)')
     ax.set_ylabel('Altitude (ft)')
-    ax.set_title('Flight Profile with Weather Conditions')
+    title = 'Flight Profile with Weather Conditions'
+    if winds is not None:
+        title += f" (ETE {format_duration(briefing.total_hours)} at {winds.true_airspeed_kt:.0f} kt TAS)"
+    ax.set_title(title)
     ax.grid(True, linestyle='--', alpha=0.7)
     
     # Add airport labels
@@ -323,11 +339,42 @@ def create_route_profile_chart(waypoints, weather_data_list, airport_coords):
     
     # Add legend
     import matplotlib.patches as mpatches
+    from matplotlib.lines import Line2D
     legend_elements = [
         mpatches.Patch(color='green', label='Good Conditions'),
         mpatches.Patch(color='yellow', label='Marginal Conditions'),
         mpatches.Patch(color='red', label='Hazardous Conditions')
     ]
-    ax.legend(handles=legend_elements, loc='upper right')
+    if winds is not None:
+        legend_elements.append(Line2D([], [], color='gray', linestyle=':', label='Headwind Component'))
+    # On the wind axis when there is one, so the legend is drawn above the headwind trace
+    (wind_ax if winds is not None else ax).legend(handles=legend_elements, loc='upper right')
     
-    return fig
\ No newline at end of file
+    return fig
+
+def profile_winds_digest(winds):
+    """Hash what the profile chart draws from a RouteWinds: the headwind trace and the ETE in its title."""
+    if winds is None:
+        return None
+    digest = hashlib.sha1()
+    for values in (winds.distances_nm, winds.headwind_kt, winds.cumulative_hours[-1:]):
+        digest.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+    digest.update(str(winds.true_airspeed_kt).encode())
+    return digest.hexdigest()
+
+@st.cache_data(max_entries=PROFILE_CACHE_SIZE, show_spinner=False)
+def render_route_profile_png(waypoints, severities, hazard_spans, winds_digest, _briefing, _airport_coords):
+    """Render the route profile chart to PNG bytes, cached per (waypoints, severities, hazard_spans, winds_digest).
+
+    The waypoints fix the distances and altitudes, the severities and advisory crossings fix the colors
+    and winds_digest (profile_winds_digest of the briefing's winds) the headwind trace and title,
+    so repeat views of the same briefing are served without re-rendering. The
+    figure is closed once saved so long-running servers don't accumulate figures.
+    """
+    fig = create_route_profile_chart(_briefing, _airport_coords)
+    try:
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png", bbox_inches="tight")
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
\ No newline at end of file
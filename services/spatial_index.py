@@ -0,0 +1,147 @@
+# services/spatial_index.py
+import numpy as np
+import streamlit as st
+from scipy.spatial import cKDTree
+from services.airport_service import load_airport_table
+from utils.geodesy import to_unit_vectors, nm_to_chord, chord_to_nm, angle_between, sample_legs, EARTH_RADIUS_NM
+
+# Constants
+DEFAULT_CORRIDOR_NM = 25
+DEFAULT_ALTERNATE_RADIUS_NM = 50
+ROUTE_ALTERNATES_PER_LEG = 3
+
+class AirportSpatialIndex:
+    """KD-tree over airport positions as 3-D unit vectors.
+
+    Working on the unit sphere avoids the distortion and antimeridian problems of
+    a lat/lon grid: great-circle radius queries become exact chord-length queries.
+    All methods return row numbers into the AirportTable the index was built from.
+    """
+
+    def __init__(self, lats, lons):
+        self.vectors = to_unit_vectors(lats, lons)
+        self.tree = cKDTree(self.vectors)
+
+    def within_radius(self, lat, lon, radius_nm):
+        """Return (rows, distances_nm) of airports within radius_nm of a point, nearest first."""
+        point = to_unit_vectors(lat, lon)
+        rows = np.asarray(self.tree.query_ball_point(point, nm_to_chord(radius_nm)), dtype=np.intp)
+        distances = chord_to_nm(np.linalg.norm(self.vectors[rows] - point, axis=1))
+        order = np.argsort(distances)
+        return rows[order], distances[order]
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def nearest(self, lat, lon, k=5):
+        """Return (rows, distances_nm) of the k airports nearest to a point, nearest first.
+
+        Fewer rows are returned when the index holds fewer than k airports.
+        """
+        k = min(k, len(self))
+        if k < 1:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        chords, rows = self.tree.query(to_unit_vectors(lat, lon), k=k)
+        chords, rows = np.atleast_1d(chords), np.atleast_1d(rows)
+        # cKDTree pads missing neighbours with an infinite distance and an out-of-range row
+        found = np.isfinite(chords)
+        return rows[found], chord_to_nm(chords[found])
+
+    def along_route(self, lats, lons, corridor_nm=DEFAULT_CORRIDOR_NM):
+        """Find airports within corridor_nm of each great-circle leg of a route.
+
+        Every leg is sampled at corridor_nm spacing and all samples are queried in
+        one KD-tree call with a radius that covers the corridor between samples;
+        the candidates are then filtered by exact distance to the leg. Returns one
+        (rows, distances_nm) pair per leg, ordered by distance along the leg.
+        """
+        waypoints = to_unit_vectors(lats, lons)
+        starts, ends = waypoints[:-1], waypoints[1:]
+        if len(starts) == 0:
+            return []
+
+        samples, leg_ids, _ = sample_legs(starts, ends, corridor_nm)
+        # A ball of this radius around each sample covers the corridor up to the next sample
+        search_chord = nm_to_chord(np.hypot(corridor_nm, corridor_nm / 2.0))
+        hits = self.tree.query_ball_point(samples, search_chord)
+
+        candidates_per_leg = [set() for _ in range(len(starts))]
+        for leg_id, rows in zip(leg_ids, hits):
+            candidates_per_leg[leg_id].update(rows)
+
+        results = []
+        for leg_id, candidates in enumerate(candidates_per_leg):
+            rows = np.fromiter(candidates, dtype=np.intp, count=len(candidates))
+            distances, along = leg_distances(self.vectors[rows], starts[leg_id], ends[leg_id])
+            keep = distances <= corridor_nm
+            order = np.argsort(along[keep])
+            results.append((rows[keep][order], distances[keep][order]))
+        return results
+
+def leg_distances(points, start, end):
+    """Return (distance_nm to the leg, distance_nm along the leg) for unit vectors vs great-circle legs.
+
+    start and end are either one leg's unit vectors or (n, 3) arrays giving a leg per point.
+    """
+    points = np.atleast_2d(points)
+    start = np.broadcast_to(start, points.shape)
+    end = np.broadcast_to(end, points.shape)
+    normal = np.cross(start, end)
+    norm = np.linalg.norm(normal, axis=1, keepdims=True)
+    degenerate = norm[:, 0] < 1e-12
+    normal = normal / np.where(degenerate[:, None], 1.0, norm)
+    to_start = EARTH_RADIUS_NM * angle_between(points, start)
+    to_end = EARTH_RADIUS_NM * angle_between(points, end)
+
+    side = np.einsum("ij,ij->i", points, normal)
+    cross_track = EARTH_RADIUS_NM * np.abs(np.arcsin(np.clip(side, -1.0, 1.0)))
+    projected = points - side[:, None] * normal
+    projected /= np.maximum(np.linalg.norm(projected, axis=1, keepdims=True), 1e-12)
+    # The projection lies between the endpoints when it is on the inner side of both
+    inside = (
+        (np.einsum("ij,ij->i", np.cross(start, projected), normal) >= 0)
+        & (np.einsum("ij,ij->i", np.cross(projected, end), normal) >= 0)
+        & ~degenerate
+    )
+    distances = np.where(inside, cross_track, np.minimum(to_start, to_end))
+    along = EARTH_RADIUS_NM * angle_between(projected, start)
+    along = np.where(inside, along, np.where(to_start <= to_end, 0.0, along))
+    return distances, np.where(degenerate, 0.0, along)
+
+@st.cache_resource
+def load_airport_index():
+    """Build the spatial index over the airport table once per process."""
+    table = load_airport_table()
+    return AirportSpatialIndex(table.lat, table.lon)
+
+def suggest_alternates(icao_id, radius_nm=DEFAULT_ALTERNATE_RADIUS_NM, limit=3):
+    """Return (icao, name, distance_nm) for the airports closest to icao_id within radius_nm."""
+    table = load_airport_table()
+    if icao_id not in table:
+        return []
+    lat, lon = table[icao_id]
+    rows, distances = load_airport_index().within_radius(lat, lon, radius_nm)
+    alternates = [
+        (table.icao[row], table.name[row], float(distance))
+        for row, distance in zip(rows, distances)
+        if table.icao[row] != icao_id
+    ]
+    return alternates[:limit]
+
+def route_alternates(icao_ids, corridor_nm=DEFAULT_CORRIDOR_NM, limit=ROUTE_ALTERNATES_PER_LEG):
+    """Return, per leg of a route, (icao, name, distance_nm off the leg) for alternates within corridor_nm.
+
+    Each leg keeps the limit airports closest to it, other than the route's own
+    waypoints, listed in the order they are passed. Raises KeyError for a
+    waypoint missing from the airport table.
+    """
+    table = load_airport_table()
+    lats, lons = table.coordinates(icao_ids)
+    on_route = set(icao_ids)
+    legs = []
+    for rows, distances in load_airport_index().along_route(lats, lons, corridor_nm):
+        keep = np.array([table.icao[row] not in on_route for row in rows], dtype=bool)
+        rows, distances = rows[keep], distances[keep]
+        closest = np.sort(np.argsort(distances, kind="stable")[:limit])
+        legs.append([(table.icao[row], table.name[row], float(distances[i])) for i, row in zip(closest, rows[closest])])
+    return legs
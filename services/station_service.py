@@ -0,0 +1,149 @@
+# services/station_service.py
+import gzip
+import json
+import logging
+import os
+import sqlite3
+from contextlib import closing
+import numpy as np
+import pandas as pd
+import streamlit as st
+from scipy.spatial import cKDTree
+from services import http_client
+from services.airport_service import DATA_DIR, load_airport_table
+from utils.geodesy import to_unit_vectors, chord_to_nm
+
+# Constants
+STATIONS_CACHE_URL = "https://aviationweather.gov/data/cache/stations.cache.json.gz"
+NEIGHBOR_COUNT = 4  # Reporting stations kept per airport (the airport itself counts when it reports)
+MAX_FALLBACK_DISTANCE_NM = 60  # Farther stations are not representative of the airport's weather
+# Kept apart from the airport store, which is replaced whenever it is rebuilt
+STATION_DB_PATH = os.path.join(DATA_DIR, "stations.sqlite")
+
+logger = logging.getLogger(__name__)
+
+def fetch_reporting_stations():
+    """Download the AWC station list and keep the stations that issue METARs."""
+    response = http_client.get(STATIONS_CACHE_URL, timeout=30)
+    response.raise_for_status()
+    content = response.content
+    # The file is gzip on disk; some proxies decompress it in transit
+    if content[:2] == b"\x1f\x8b":
+        content = gzip.decompress(content)
+    stations = pd.DataFrame(json.loads(content))
+    site_types = stations.get("siteType", pd.Series([[]] * len(stations))).map(
+        lambda types: types if isinstance(types, list) else []
+    )
+    stations = pd.DataFrame({
+        "icao": stations["icaoId"],
+        "lat": pd.to_numeric(stations["lat"], errors="coerce"),
+        "lon": pd.to_numeric(stations["lon"], errors="coerce"),
+        "has_taf": site_types.map(lambda types: "TAF" in types).astype(int),
+    })[site_types.map(lambda types: "METAR" in types)]
+    stations = stations.dropna().drop_duplicates(subset="icao")
+    return stations.sort_values("icao").reset_index(drop=True)
+
+def compute_neighbors(airport_lats, airport_lons, station_lats, station_lons, k=NEIGHBOR_COUNT):
+    """Return (station rows, distances_nm), each shaped (airports, k), nearest station first."""
+    tree = cKDTree(to_unit_vectors(station_lats, station_lons))
+    k = min(k, len(station_lats))
+    chords, rows = tree.query(to_unit_vectors(airport_lats, airport_lons), k=k)
+    return rows.reshape(len(airport_lats), k), chord_to_nm(chords).reshape(len(airport_lats), k)
+
+def _affected_airports(table, old_neighbors, old_stations, new_stations):
+    """Return a mask of airports whose stored neighbour lists may change with the new station list."""
+    old_positions = dict(zip(old_stations["icao"], zip(old_stations["lat"], old_stations["lon"])))
+    new_positions = dict(zip(new_stations["icao"], zip(new_stations["lat"], new_stations["lon"])))
+    removed = {icao for icao, pos in old_positions.items() if new_positions.get(icao) != pos}
+    added = new_stations[[old_positions.get(icao) != pos for icao, pos in new_positions.items()]]
+
+    stored = old_neighbors.groupby("airport")
+    kth_distance = stored["distance_nm"].max().reindex(table.icao).to_numpy(dtype=np.float64)
+    uses_removed = old_neighbors[old_neighbors["station"].isin(removed)]["airport"].unique()
+
+    # Airports never computed (NaN) or referencing a removed/moved station must be redone
+    affected = np.isnan(kth_distance) | np.isin(table.icao, uses_removed)
+    if len(added):
+        # An added station matters only where it beats the current k-th nearest station
+        tree = cKDTree(to_unit_vectors(added["lat"], added["lon"]))
+        chords, _ = tree.query(to_unit_vectors(table.lat, table.lon), k=1)
+        affected |= chord_to_nm(chords) < np.nan_to_num(kth_distance, nan=np.inf)
+    return affected
+
+def refresh_station_neighbors(db_path=STATION_DB_PATH, stations=None):
+    """Precompute each airport's nearest METAR-reporting stations and store them in the station store.
+
+    When a previous mapping exists only the airports affected by added, moved or
+    removed stations (or new to the airport table) are recomputed. Returns the
+    number of airports recomputed.
+    """
+    table = load_airport_table()
+    stations = fetch_reporting_stations() if stations is None else stations
+
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    # The inner context commits; closing() releases the file
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS reporting_stations (icao TEXT PRIMARY KEY, lat REAL, lon REAL, has_taf INTEGER)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS station_neighbors (airport TEXT, rank INTEGER, station TEXT, "
+            "distance_nm REAL, PRIMARY KEY (airport, rank)) WITHOUT ROWID"
+        )
+        old_stations = pd.read_sql("SELECT icao, lat, lon FROM reporting_stations", conn)
+        old_neighbors = pd.read_sql("SELECT airport, station, distance_nm FROM station_neighbors", conn)
+
+        affected = _affected_airports(table, old_neighbors, old_stations, stations)
+        rows, distances = compute_neighbors(
+            table.lat[affected], table.lon[affected], stations["lat"].to_numpy(), stations["lon"].to_numpy()
+        )
+        airports = table.icao[affected]
+        station_ids = stations["icao"].to_numpy()[rows]
+        records = [
+            (airport, rank, station_ids[i, rank], float(distances[i, rank]))
+            for i, airport in enumerate(airports)
+            for rank in range(rows.shape[1])
+        ]
+
+        conn.executemany("DELETE FROM station_neighbors WHERE airport = ?", [(airport,) for airport in airports])
+        conn.executemany("INSERT INTO station_neighbors VALUES (?, ?, ?, ?)", records)
+        conn.execute("DELETE FROM reporting_stations")
+        stations[["icao", "lat", "lon", "has_taf"]].to_sql("reporting_stations", conn, if_exists="append", index=False)
+    return int(affected.sum())
+
+@st.cache_resource
+def load_station_neighbors(db_path=STATION_DB_PATH):
+    """Load the precomputed airport -> [(station, distance_nm), ...] mapping, nearest first.
+
+    The mapping is built offline (python -m services.station_service); when it has
+    not been built yet a warning is logged and no fallback stations are offered.
+    """
+    neighbors = {}
+    records = None
+    if os.path.exists(db_path):
+        with closing(sqlite3.connect(db_path)) as conn:
+            has_mapping = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'station_neighbors'"
+            ).fetchone()
+            if has_mapping:
+                records = conn.execute(
+                    "SELECT airport, station, distance_nm FROM station_neighbors ORDER BY airport, rank"
+                ).fetchall()
+    if not records:
+        logger.warning(
+            "No nearest-station mapping in %s; nearest-station fallback is off until "
+            "python -m services.station_service is run", db_path
+        )
+        return neighbors
+    for airport, station, distance in records:
+        neighbors.setdefault(airport, []).append((station, distance))
+    return neighbors
+
+def nearest_reporting_stations(icao_id, max_distance_nm=MAX_FALLBACK_DISTANCE_NM):
+    """Return the nearby reporting stations other than the airport itself, nearest first."""
+    try:
+        candidates = load_station_neighbors().get(icao_id, [])
+    except Exception:
+        return []
+    return [(station, distance) for station, distance in candidates if station != icao_id and distance <= max_distance_nm]
+
+if __name__ == "__main__":
+    print(f"Recomputed nearest reporting stations for {refresh_station_neighbors()} airports")
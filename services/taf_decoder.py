@@ -0,0 +1,245 @@
+# services/taf_decoder.py
+import re
+import time
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from services.metar_decoder import decode_metar, flight_category, CEILING_COVERS
+
+# Constants
+ISSUE_RE = re.compile(r"^(\d{2})(\d{2})(\d{2})Z$")
+VALID_RE = re.compile(r"^(\d{2})(\d{2})/(\d{2})(\d{2})$")
+FROM_RE = re.compile(r"^FM(\d{2})(\d{2})(\d{2})$")
+PROB_RE = re.compile(r"^PROB(\d{2})$")
+TEMPORARY_KINDS = ("TEMPO", "PROB")  # Change groups that fluctuate around the prevailing forecast
+
+class ForecastPeriod:
+    """One TAF period: prevailing conditions (BASE/FM/BECMG) or a TEMPO/PROB fluctuation.
+
+    start and end are epoch seconds. Prevailing periods hold the full forecast in
+    force from start; temporary ones hold only the elements the group gives,
+    while flight_category is that of the prevailing forecast with them applied.
+    """
+
+    __slots__ = (
+        "kind", "start", "end", "raw", "wind_direction", "wind_speed", "wind_gust",
+        "visibility_sm", "visibility_bound", "weather", "clouds", "sky_clear", "flight_category",
+    )
+
+    def __init__(self, kind, start, end, raw=""):
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.raw = raw
+        self.wind_direction = None
+        self.wind_speed = None
+        self.wind_gust = None
+        self.visibility_sm = None
+        self.visibility_bound = ""
+        self.weather = ()
+        self.clouds = ()
+        self.sky_clear = False
+        self.flight_category = "Unknown"
+
+    @property
+    def ceiling_ft(self):
+        bases = [base for cover, base in self.clouds if cover in CEILING_COVERS and base is not None]
+        return min(bases) if bases else None
+
+    def apply(self, observation, tokens):
+        """Overwrite the elements a decoded change group specifies."""
+        if observation.wind_speed is not None:
+            self.wind_direction = observation.wind_direction
+            self.wind_speed = observation.wind_speed
+            self.wind_gust = observation.wind_gust
+        if observation.visibility_sm is not None:
+            self.visibility_sm = observation.visibility_sm
+            self.visibility_bound = observation.visibility_bound
+        if observation.weather or "NSW" in tokens:
+            self.weather = observation.weather
+        if observation.clouds or observation.sky_clear:
+            self.clouds = observation.clouds
+            self.sky_clear = observation.sky_clear
+
+    def copy(self, kind, start, end, raw):
+        period = ForecastPeriod(kind, start, end, raw)
+        for name in ("wind_direction", "wind_speed", "wind_gust", "visibility_sm", "visibility_bound", "weather", "clouds",
+                     "sky_clear"):
+            setattr(period, name, getattr(self, name))
+        return period
+
+    def describe(self):
+        """Short text of the forecast elements, e.g. "MVFR; wind 300° 15G25 kt; 3 SM; -SHRA; BKN025" (P6 SM for P6SM)."""
+        parts = [] if self.kind.startswith(TEMPORARY_KINDS) else [self.flight_category]
+        if self.wind_speed is not None:
+            direction = "VRB" if self.wind_direction == "VRB" else f"{self.wind_direction:03d}°"
+            gust = f"G{self.wind_gust}" if self.wind_gust else ""
+            parts.append(f"wind {direction} {self.wind_speed}{gust} kt")
+        if self.visibility_sm is not None:
+            parts.append(f"{self.visibility_bound}{self.visibility_sm:g} SM")
+        parts.extend(self.weather)
+        if self.sky_clear and not self.clouds:
+            parts.append("SKC")
+        parts.extend(f"{cover}{base // 100:03d}" if base is not None else cover for cover, base in self.clouds)
+        return "; ".join(parts)
+
+class TafForecast:
+    """A decoded TAF: prevailing periods and temporary groups, each sorted by start time."""
+
+    def __init__(self, station=None, issued=None, valid_from=None, valid_to=None, prevailing=(), temporary=()):
+        self.station = station
+        self.issued = issued
+        self.valid_from = valid_from
+        self.valid_to = valid_to
+        self.prevailing = sorted(prevailing, key=lambda period: period.start)
+        self.temporary = sorted(temporary, key=lambda period: period.start)
+        self.prevailing_starts = [period.start for period in self.prevailing]
+        self.temporary_starts = [period.start for period in self.temporary]
+
+    def covers(self, when):
+        return self.valid_from is not None and self.valid_from <= when < self.valid_to
+
+    def forecast_at(self, when):
+        """Return (prevailing period, [temporary periods]) in force at an epoch time.
+
+        Both lookups are binary searches over the start times; the prevailing
+        period is None when the TAF's validity does not cover the time.
+        """
+        if not self.covers(when):
+            return None, []
+        prevailing = self.prevailing[bisect_right(self.prevailing_starts, when) - 1]
+        started = bisect_right(self.temporary_starts, when)
+        return prevailing, [period for period in self.temporary[:started] if period.end > when]
+
+def _resolve(day, hour, minute, reference):
+    """Turn a TAF day/hour/minute into a UTC datetime near the reference (handles hour 24 and month ends)."""
+    candidates = []
+    for months in (-1, 0, 1):
+        year, month = reference.year, reference.month + months
+        year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+        try:
+            candidates.append(datetime(year, month, day, tzinfo=timezone.utc) + timedelta(hours=hour, minutes=minute))
+        except ValueError:
+            continue
+    return min(candidates, key=lambda candidate: abs(candidate - reference))
+
+def _interval(token, reference):
+    match = VALID_RE.match(token)
+    day1, hour1, day2, hour2 = (int(value) for value in match.groups())
+    start = _resolve(day1, hour1, 0, reference)
+    end = _resolve(day2, hour2, 0, start)
+    return start, end
+
+def parse_taf(raw, reference):
+    """Decode a raw TAF into a TafForecast, resolving its day-of-month times around reference (a UTC datetime).
+
+    BECMG changes are applied from the start of their window (the conservative
+    reading); TEMPO and PROB groups are kept as temporary periods.
+    """
+    tokens = (raw or "").split()
+    while tokens and tokens[0] in ("TAF", "AMD", "COR"):
+        tokens = tokens[1:]
+    if len(tokens) < 3 or not re.fullmatch(r"[A-Z][A-Z0-9]{3}", tokens[0]):
+        return TafForecast()
+    station = tokens[0]
+    match = ISSUE_RE.match(tokens[1])
+    if not match:
+        return TafForecast(station)
+    issued = _resolve(*(int(value) for value in match.groups()), reference)
+    if not VALID_RE.match(tokens[2]):
+        return TafForecast(station, issued.timestamp())
+    valid_from, valid_to = _interval(tokens[2], issued)
+
+    # Split the body into (kind, window token or None, element tokens) groups
+    groups = [["BASE", None, []]]
+    body = tokens[3:]
+    i = 0
+    while i < len(body):
+        token = body[i]
+        if token == "RMK":
+            break
+        if FROM_RE.match(token):
+            groups.append(["FM", token, []])
+        elif token in ("BECMG", "TEMPO") or PROB_RE.match(token):
+            kind = token
+            if PROB_RE.match(token) and i + 1 < len(body) and body[i + 1] == "TEMPO":
+                kind = f"{token} TEMPO"
+                i += 1
+            window = body[i + 1] if i + 1 < len(body) and VALID_RE.match(body[i + 1]) else None
+            i += 1 if window else 0
+            groups.append([kind, window, []])
+        else:
+            groups[-1][2].append(token)
+        i += 1
+
+    prevailing = []
+    temporary = []
+    current = None
+    for kind, window, elements in groups:
+        observation = decode_metar(" ".join([station] + elements))
+        raw_group = " ".join(part for part in [kind if kind not in ("BASE", "FM") else None, window] + elements if part)
+        if kind == "BASE":
+            current = ForecastPeriod("BASE", valid_from.timestamp(), valid_to.timestamp(), raw_group)
+            current.apply(observation, elements)
+            prevailing.append(current)
+        elif kind == "FM":
+            day, hour, minute = (int(value) for value in FROM_RE.match(window).groups())
+            start = _resolve(day, hour, minute, valid_from).timestamp()
+            current = ForecastPeriod("FM", start, valid_to.timestamp(), raw_group)
+            current.apply(observation, elements)
+            prevailing.append(current)
+        elif window is None:
+            continue
+        elif kind == "BECMG":
+            start, end = _interval(window, valid_from)
+            current = current.copy("BECMG", start.timestamp(), valid_to.timestamp(), raw_group)
+            current.apply(observation, elements)
+            prevailing.append(current)
+        else:
+            start, end = _interval(window, valid_from)
+            period = ForecastPeriod(kind, start.timestamp(), end.timestamp(), raw_group)
+            period.apply(observation, elements)
+            temporary.append(period)
+
+    # Each prevailing period lasts until the next one starts
+    prevailing.sort(key=lambda period: period.start)
+    for period, following in zip(prevailing, prevailing[1:]):
+        period.end = following.start
+    for period in prevailing:
+        period.flight_category = flight_category(period.ceiling_ft, period.visibility_sm)
+    forecast = TafForecast(station, issued.timestamp(), valid_from.timestamp(), valid_to.timestamp(), prevailing, temporary)
+    for period in forecast.temporary:
+        # A fluctuation's category is the prevailing forecast with its elements applied
+        base, _ = forecast.forecast_at(period.start)
+        if base is not None:
+            merged = base.copy(period.kind, period.start, period.end, period.raw)
+            merged.apply(period, [])
+            period.flight_category = flight_category(merged.ceiling_ft, merged.visibility_sm)
+    return forecast
+
+@lru_cache(maxsize=1024)
+def decode_taf(raw):
+    """Decode a raw TAF into a TafForecast. Results are cached per raw report.
+
+    Day-of-month times are resolved around the current UTC time, which is
+    unambiguous for a TAF that is still being served.
+    """
+    return parse_taf(raw, datetime.fromtimestamp(time.time(), tz=timezone.utc))
+
+def format_time(epoch):
+    """Format an epoch time as "HH:MMZ", with the date in front when it is not today (UTC)."""
+    moment = datetime.fromtimestamp(epoch, tz=timezone.utc)
+    today = datetime.fromtimestamp(time.time(), tz=timezone.utc).date()
+    return moment.strftime("%H:%MZ") if moment.date() == today else moment.strftime("%d %b %H:%MZ")
+
+def forecast_text(taf, when):
+    """Describe the forecast in force at an epoch time, temporary groups included, or None without a TAF."""
+    if taf.valid_from is None:
+        return None
+    prevailing, temporary = taf.forecast_at(when)
+    if prevailing is None:
+        return f"Outside the TAF validity ({format_time(taf.valid_from)} to {format_time(taf.valid_to)})"
+    text = prevailing.describe()
+    for period in temporary:
+        text += f"; {period.kind} {period.describe()} ({period.flight_category})"
+    return text
@@ -0,0 +1,31 @@
+# services/template_service.py
+import os
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, select_autoescape
+
+# Constants
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+FORMAT_EXTENSIONS = {"markdown": "md", "html": "html", "text": "txt"}
+
+_environment = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(enabled_extensions=("html.j2",), default_for_string=False),
+    undefined=StrictUndefined,
+    trim_blocks=True,
+    lstrip_blocks=True,
+    keep_trailing_newline=True,
+)
+
+# Every template is compiled once at import; rendering afterwards is a plain function call
+TEMPLATES = {name: _environment.get_template(name) for name in _environment.list_templates(extensions=["j2"])}
+
+def render_document(document, format_type, context):
+    """Render a document model (e.g. "weather_report") to "markdown", "html" or "text"."""
+    return TEMPLATES[f"{document}.{FORMAT_EXTENSIONS[format_type]}.j2"].render(**context)
+
+def render_all_formats(document, context, formats=tuple(FORMAT_EXTENSIONS)):
+    """Render one document model to several formats, returning {format_type: text}."""
+    return {format_type: render_document(document, format_type, context) for format_type in formats}
+
+def template_macro(template_name, macro_name):
+    """Return a macro exported by a compiled template, callable like a function."""
+    return getattr(TEMPLATES[template_name].module, macro_name)
@@ -1,74 +1,481 @@
 # services/weather_service.py
-import requests
+import re
+import threading
+import time
+from concurrent.futures import as_completed
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from services import http_client
+from services.acquisition_service import iter_concurrently, run_concurrently, product_timeout, submit_fetch
+from services.briefing_model import WaypointAssessment
+from services.advisory_service import parse_advisory_areas
+from services.airport_service import load_airport_table
+from services.pirep_service import PirepIndex, station_pirep_text
+from services.station_service import nearest_reporting_stations
+from services.winds_aloft_service import parse_winds_aloft
+from utils.weather_cache import get_product, put_product
 
 # Constants
 API_BASE_URL = "https://aviationweather.gov/api/data"
+MAX_URL_LENGTH = 2000  # Keep batched ids=A,B,C requests well under common server limits
+STREAM_CHUNK_IDS = 5  # Smaller batches when streaming, so the first stations land sooner
+
+# Product name -> (API endpoint, placeholder when the station reports nothing usable)
+STATION_PRODUCTS = {
+    "METAR": ("metar", "No METAR available"),
+    "TAF": ("taf", "No TAF available"),
+}
+
+# Global feeds are downloaded once and shared by every waypoint (and briefing) while cached
+FEED_PRODUCTS = {
+    "PIREP": ("pirep", "No recent PIREP"),
+    "SIGMET": ("sigmet", "No active SIGMET"),
+}
+# Area-only feeds: parsed into advisory polygons for the route, never quoted per station
+AREA_FEEDS = {
+    "GAIRMET": "gairmet",
+}
+# PIREP location field, and a station written with its radial and distance in it (e.g. /OV KJFK090010)
+OV_FIELD_RE = re.compile(r"/OV\s+([^/]+)")
+OV_STATION_RE = re.compile(r"\b([A-Z]{3,4})(?=\d{6}\b)")
+# Winds/temps aloft (FD) text product: low levels (3,000-39,000 ft), 6-hour forecast, every region
+WINDS_ALOFT_ENDPOINT = "windtemp?region=all&level=low&fcst=06"
+FEED_STATION = "*"  # Cache key station for whole-feed snapshots
+# Everything a route briefing uses; callers that render less pass their own subset
+WEATHER_PRODUCTS = (*STATION_PRODUCTS, *FEED_PRODUCTS, *AREA_FEEDS, "WINDS")
+
+_feed_locks = {product: threading.Lock() for product in (*FEED_PRODUCTS, *AREA_FEEDS, "WINDS")}
+
+def chunk_station_ids(icao_ids, endpoint, max_url_length=MAX_URL_LENGTH, max_ids=None):
+    """Split ICAO IDs into groups whose batched request URL stays under max_url_length.
+
+    max_ids additionally caps the number of stations per group.
+    """
+    base_length = len(f"{API_BASE_URL}/{endpoint}?ids=&format=json")
+    chunks = []
+    current = []
+    length = base_length
+    for icao_id in icao_ids:
+        extra = len(icao_id) + (1 if current else 0)
+        if current and (length + extra > max_url_length or (max_ids and len(current) >= max_ids)):
+            chunks.append(current)
+            current = []
+            length = base_length
+            extra = len(icao_id)
+        current.append(icao_id)
+        length += extra
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _report_time(entry):
+    """Return a report's observation (METAR) or issue (TAF) time in epoch seconds, or None if absent."""
+    value = entry.get("obsTime") or entry.get("issueTime")
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not isinstance(value, str):
+        return None
+    try:
+        reported = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if reported.tzinfo is None:
+        reported = reported.replace(tzinfo=timezone.utc)
+    return reported.timestamp()
+
+def _fetch_station_chunk(chunk, product, timeout=5):
+    """Fetch one product for a single chunk of stations with one ids=A,B,C request.
+
+    Returns ({icao: raw report}, {icao: report time}) for the stations that reported.
+    """
+    endpoint, missing = STATION_PRODUCTS[product]
+    url = f"{API_BASE_URL}/{endpoint}?ids={','.join(chunk)}&format=json"
+    response = http_client.get(url, timeout=timeout, deadline=time.monotonic() + timeout)
+    response.raise_for_status()
+    results = {}
+    issued = {}
+    if not response.content:
+        return results, issued
+    requested = set(chunk)
+    for entry in response.json() or []:
+        icao_id = entry.get("icaoId")
+        # The API lists the newest report first, so keep the first one per station
+        if icao_id in requested and icao_id not in results:
+            results[icao_id] = entry.get("rawTAF") or entry.get("rawOb") or missing
+            issued[icao_id] = _report_time(entry)
+    return results, issued
+
+def _split_cached(icao_ids, product):
+    """Return (cached results, stations that still need fetching) for a station product."""
+    cached = {}
+    missing = []
+    for icao_id in dict.fromkeys(icao_ids):
+        value = get_product(icao_id, product)
+        if value is None:
+            missing.append(icao_id)
+        else:
+            cached[icao_id] = value
+    return cached, missing
+
+def _store_chunk(chunk, product, results, issued):
+    """Cache a fetched chunk, timed from each report, recording stations without a report as empty."""
+    for icao_id in chunk:
+        put_product(icao_id, product, results.get(icao_id, ""), issued.get(icao_id))
+
+def fetch_station_products(icao_ids, product):
+    """Fetch one product (METAR or TAF) for many stations, one request per URL-sized chunk.
+
+    Stations already in the shared product cache are served without a request.
+    """
+    endpoint, _ = STATION_PRODUCTS[product]
+    results, missing = _split_cached(icao_ids, product)
+    for chunk in chunk_station_ids(missing, endpoint):
+        fetched, issued = _fetch_station_chunk(chunk, product, product_timeout(product))
+        _store_chunk(chunk, product, fetched, issued)
+        results.update(fetched)
+    return results
+
+def feed_raw_text(entry):
+    """Return the raw report text of a PIREP or SIGMET feed entry."""
+    return entry.get("rawOb") or entry.get("rawAirSigmet") or entry.get("rawSigmet") or ""
+
+def _index_feed(entries):
+    """Map each identifier-like token in the feed's raw text to the first report mentioning it.
+
+    Besides whole tokens, the stations of PIREP /OV station-radial-distance
+    locations (KJFK090010, JFK090010-BOS045020) are indexed by their identifier.
+    """
+    index = {}
+    for entry in entries:
+        raw = feed_raw_text(entry)
+        tokens = re.findall(r"\b[A-Z0-9]{3,4}\b", raw)
+        for field in OV_FIELD_RE.findall(raw):
+            tokens.extend(OV_STATION_RE.findall(field))
+        for token in tokens:
+            index.setdefault(token, raw)
+    return index
+
+@contextmanager
+def _feed_lock(product, deadline):
+    """Hold a feed's download lock, waiting for another download of it no later than deadline."""
+    lock = _feed_locks[product]
+    if not lock.acquire(timeout=max(0.0, deadline - time.monotonic())):
+        raise TimeoutError(f"{product} download still in progress")
+    try:
+        yield
+    finally:
+        lock.release()
+
+def get_feed_snapshot(product, timeout=5):
+    """Return the parsed and indexed PIREP, SIGMET or G-AIRMET feed, downloading it at most once per TTL.
+
+    timeout bounds the whole call, including waiting on a download already in progress.
+    """
+    deadline = time.monotonic() + timeout
+    with _feed_lock(product, deadline):
+        snapshot = get_product(FEED_STATION, product)
+        if snapshot is not None:
+            return snapshot
+
+        endpoint = FEED_PRODUCTS[product][0] if product in FEED_PRODUCTS else AREA_FEEDS[product]
+        response = http_client.get(f"{API_BASE_URL}/{endpoint}?format=json", timeout=timeout, deadline=deadline)
+        response.raise_for_status()
+        entries = response.json() if response.content else []
+        snapshot = {
+            "fetched_at": time.time(),
+            "entries": entries,
+            "index": _index_feed(entries),
+        }
+        if product in ("SIGMET", *AREA_FEEDS):
+            snapshot["areas"] = parse_advisory_areas(entries, product)
+        elif product == "PIREP":
+            snapshot["reports"] = PirepIndex(entries)
+        put_product(FEED_STATION, product, snapshot)
+        return snapshot
+
+def get_winds_aloft(timeout=5):
+    """Return the winds aloft as a services.winds_aloft_service.WindGrid, downloading the product at most once per TTL.
+
+    timeout bounds the whole call, including waiting on a download already in progress.
+    """
+    deadline = time.monotonic() + timeout
+    with _feed_lock("WINDS", deadline):
+        grid = get_product(FEED_STATION, "WINDS")
+        if grid is not None:
+            return grid
+        response = http_client.get(f"{API_BASE_URL}/{WINDS_ALOFT_ENDPOINT}", timeout=timeout, deadline=deadline)
+        response.raise_for_status()
+        grid = parse_winds_aloft(response.text, load_airport_table())
+        put_product(FEED_STATION, "WINDS", grid)
+        return grid
+
+def lookup_feed(snapshot, icao_id, product):
+    """Look up the reports relevant to an ICAO ID in a feed snapshot.
+
+    PIREPs are matched by distance from the station's position; SIGMETs, and
+    PIREPs near stations missing from the airport table, by the identifiers in their text.
+    """
+    _, missing = FEED_PRODUCTS[product]
+    if product == "PIREP" and "reports" in snapshot:
+        try:
+            table = load_airport_table()
+        except Exception:
+            table = {}
+        if icao_id in table:
+            lat, lon = table[icao_id]
+            return station_pirep_text(snapshot["reports"], lat, lon, missing)
+    return snapshot["index"].get(icao_id, missing)
+
+def cached_pirep_index():
+    """Return the PirepIndex of the cached feed snapshot, without downloading anything (None if not cached)."""
+    snapshot = get_product(FEED_STATION, "PIREP")
+    return snapshot.get("reports") if snapshot is not None else None
+
+def cached_advisory_areas():
+    """Return the SIGMET and G-AIRMET polygons of the cached feed snapshots, without downloading anything."""
+    areas = []
+    for product in ("SIGMET", *AREA_FEEDS):
+        snapshot = get_product(FEED_STATION, product)
+        if snapshot is not None:
+            areas.extend(snapshot.get("areas", []))
+    return areas
+
+def cached_wind_grid():
+    """Return the cached WindGrid, without downloading anything (None if not cached)."""
+    return get_product(FEED_STATION, "WINDS")
+
+def fetch_wind_grid():
+    """Return the WindGrid, downloading it on the shared fetch pool within its budget; None if it can't be had."""
+    grid = cached_wind_grid()
+    if grid is not None:
+        return grid
+    timeout = product_timeout("WINDS")
+    outcome = run_concurrently({"WINDS": (get_winds_aloft, (timeout,), timeout)})["WINDS"]
+    return None if isinstance(outcome, Exception) else outcome
+
+def _degraded_placeholder(product, error):
+    """Describe a product that could not be fetched for a station."""
+    reason = "request timed out" if isinstance(error, TimeoutError) else "service unavailable"
+    return f"{product} unavailable ({reason})"
+
+def _iter_station_weather(icao_ids, max_chunk_ids=None, products=WEATHER_PRODUCTS):
+    """Fetch every product for the given unique ICAO IDs, yielding {icao: weather_data} as stations update.
+
+    A station is first yielded once the chunks holding its METAR and TAF have
+    resolved, without waiting on the global feeds. When the PIREP or SIGMET feed
+    resolves, the stations already yielded are yielded again with it filled in;
+    the rest get it with their first yield. A station's weather_data is the same
+    dict every time. Only the given products (see WEATHER_PRODUCTS) are fetched.
+    """
+    tasks = {}
+    cached = {}
+    chunks = {}
+    for product, (endpoint, _) in STATION_PRODUCTS.items():
+        if product not in products:
+            cached[product], chunks[product] = {}, []
+            continue
+        cached[product], missing = _split_cached(icao_ids, product)
+        chunks[product] = chunk_station_ids(missing, endpoint, max_ids=max_chunk_ids)
+        for i, chunk in enumerate(chunks[product]):
+            timeout = product_timeout(product)
+            tasks[(product, i)] = (_fetch_station_chunk, (chunk, product, timeout), timeout)
+    for product in (*FEED_PRODUCTS, *AREA_FEEDS):
+        if product in products:
+            timeout = product_timeout(product)
+            tasks[(product, None)] = (get_feed_snapshot, (product, timeout), timeout)
+    if "WINDS" in products:
+        tasks[("WINDS", None)] = (get_winds_aloft, (product_timeout("WINDS"),), product_timeout("WINDS"))
+
+    weather_by_icao = {icao_id: {"Degraded": []} for icao_id in icao_ids}
+    waiting = {icao_id: set() for icao_id in icao_ids}
+    for product in STATION_PRODUCTS:
+        for icao_id, value in cached[product].items():
+            weather_by_icao[icao_id][product] = value
+        for i, chunk in enumerate(chunks[product]):
+            for icao_id in chunk:
+                waiting[icao_id].add((product, i))
+
+    # Stations served entirely from the cache are complete before any fetch
+    cached_stations = {icao_id: weather_by_icao[icao_id] for icao_id in icao_ids if not waiting[icao_id]}
+    if cached_stations:
+        yield cached_stations
+
+    for key, outcome in iter_concurrently(tasks):
+        product, i = key
+        if product in AREA_FEEDS or product == "WINDS":
+            # Only cached for the route (advisory areas, winds aloft); no station waits on them
+            continue
+        if i is None:
+            for icao_id in icao_ids:
+                if isinstance(outcome, Exception):
+                    weather_by_icao[icao_id][product] = _degraded_placeholder(product, outcome)
+                    weather_by_icao[icao_id]["Degraded"].append(product)
+                else:
+                    weather_by_icao[icao_id][product] = lookup_feed(outcome, icao_id, product)
+            updated = {icao_id: weather_by_icao[icao_id] for icao_id in icao_ids if not waiting[icao_id]}
+        else:
+            affected = chunks[product][i]
+            if not isinstance(outcome, Exception):
+                reports, issued = outcome
+                _store_chunk(affected, product, reports, issued)
+            for icao_id in affected:
+                if isinstance(outcome, Exception):
+                    weather_by_icao[icao_id][product] = _degraded_placeholder(product, outcome)
+                    weather_by_icao[icao_id]["Degraded"].append(product)
+                else:
+                    weather_by_icao[icao_id][product] = reports.get(icao_id, "")
+            updated = {}
+            for icao_id in affected:
+                waiting[icao_id].discard(key)
+                if not waiting[icao_id]:
+                    updated[icao_id] = weather_by_icao[icao_id]
+        if updated:
+            yield updated
+
+def fetch_weather_batch(icao_ids, products=WEATHER_PRODUCTS):
+    """Fetch METAR, TAF, PIREP, and SIGMET data for a list of ICAO IDs.
+
+    METARs and TAFs are requested with a single ids=A,B,C call per product (split
+    into chunks when the URL would get too long) and mapped back to each station.
+    PIREPs and SIGMETs come from shared feed snapshots, so each global feed is
+    downloaded and parsed at most once per TTL window; the G-AIRMET feed is
+    fetched alongside for the route's advisory areas (see cached_advisory_areas), and
+    the winds aloft for its flight time (see cached_wind_grid). Products still valid in
+    the shared cache (utils.weather_cache) are not re-requested. All requests run
+    concurrently; a product that fails or times out is reported as degraded for
+    the affected stations (listed under "Degraded") instead of failing the batch.
+    products limits the fetch to a subset of WEATHER_PRODUCTS, so callers that
+    don't render the route feeds don't request them.
+    Accepts either bare ICAO IDs or the (icao, altitude) tuples from parse_flight_plan.
+    """
+    icao_ids = [item[0] if isinstance(item, tuple) else item for item in icao_ids]
+    unique_ids = list(dict.fromkeys(icao_ids))
+
+    completed = {}
+    for stations in _iter_station_weather(unique_ids, products=products):
+        completed.update(stations)
+    weather_by_icao = {icao_id: completed[icao_id] for icao_id in unique_ids}
+    apply_station_fallback(weather_by_icao, products=products)
+    return weather_by_icao
+
+def iter_weather_batch(icao_ids, max_chunk_ids=STREAM_CHUNK_IDS):
+    """Streaming fetch_weather_batch: yield {icao: weather_data} for each group of stations as it lands.
+
+    Station batches are capped at max_chunk_ids so the first results arrive after
+    one small request rather than the whole route's. Stations are yielded as soon
+    as their METAR and TAF land and again as updates when the PIREP/SIGMET feeds
+    or the nearest-station fallback fill them in. Fallback lookups run on the
+    shared fetch pool, so a group missing a report doesn't hold back the stream.
+    """
+    icao_ids = [item[0] if isinstance(item, tuple) else item for item in icao_ids]
+    seen = set()
+    lookups = {}
+    for stations in _iter_station_weather(list(dict.fromkeys(icao_ids)), max_chunk_ids):
+        arrived = {icao_id: data for icao_id, data in stations.items() if icao_id not in seen}
+        seen.update(arrived)
+        for weather_data in arrived.values():
+            weather_data.setdefault("Sources", {})
+        lacking = {
+            icao_id: data for icao_id, data in arrived.items()
+            if any(not data.get(product) for product in STATION_PRODUCTS)
+        }
+        if lacking:
+            lookups[submit_fetch(find_station_fallbacks, lacking)] = lacking
+        yield stations
+        yield from _finished_fallbacks(lookups, wait=False)
+    yield from _finished_fallbacks(lookups, wait=True)
+
+def _finished_fallbacks(lookups, wait):
+    """Apply and yield the fallback lookups that are done, or with wait all of them as they finish."""
+    futures = as_completed(list(lookups)) if wait else [future for future in list(lookups) if future.done()]
+    for future in futures:
+        stations = lookups.pop(future)
+        try:
+            substitutes = future.result()
+        except Exception:
+            # The fallback is best effort; the stations keep their placeholders
+            continue
+        if substitutes:
+            apply_station_fallback(stations, substitutes)
+            yield {icao_id: stations[icao_id] for icao_id in substitutes}
+
+def find_station_fallbacks(weather_by_icao, products=WEATHER_PRODUCTS):
+    """Find nearest-station substitutes for the METARs/TAFs missing from weather_by_icao.
+
+    Candidates come from the precomputed airport -> nearest stations mapping, so no
+    nearest-neighbour search runs here; all candidates are fetched in one batch per product.
+    Returns {icao: {product: (report, station, distance_nm)}} without changing weather_by_icao.
+    Station products not in products are left alone.
+    """
+    substitutes = {}
+    for product in STATION_PRODUCTS:
+        if product not in products:
+            continue
+        missing = [icao_id for icao_id, data in weather_by_icao.items() if not data.get(product)]
+        candidates = {icao_id: nearest_reporting_stations(icao_id) for icao_id in missing}
+        stations = [station for options in candidates.values() for station, _ in options]
+        if not stations:
+            continue
+        try:
+            reports = fetch_station_products(stations, product)
+        except Exception:
+            continue
+        for icao_id, options in candidates.items():
+            for station, distance in options:
+                if reports.get(station):
+                    substitutes.setdefault(icao_id, {})[product] = (reports[station], station, distance)
+                    break
+    return substitutes
+
+def apply_station_fallback(weather_by_icao, substitutes=None, products=WEATHER_PRODUCTS):
+    """Fill missing METARs/TAFs from the nearest reporting station, recording where they came from.
+
+    substitutes come from find_station_fallbacks, which is called when they aren't given.
+    Substituted products are listed under "Sources" as {product: (station, distance_nm)}.
+    """
+    if substitutes is None:
+        substitutes = find_station_fallbacks(weather_by_icao, products)
+    for icao_id, weather_data in weather_by_icao.items():
+        sources = weather_data.setdefault("Sources", {})
+        for product, (report, station, distance) in substitutes.get(icao_id, {}).items():
+            weather_data[product] = report
+            sources[product] = (station, distance)
+    return weather_by_icao
 
 def fetch_weather_data(icao_id):
     """Fetch METAR, TAF, PIREP, and SIGMET data for an ICAO ID."""
-    try:
-        weather_data = {"METAR": "", "TAF": "", "PIREP": "", "SIGMET": ""}
-        metar_url = f"{API_BASE_URL}/metar?ids={icao_id}&format=json"
-        metar_response = requests.get(metar_url, timeout=5)
-        if metar_response.status_code == 200 and metar_response.json():
-            weather_data["METAR"] = metar_response.json()[0].get("rawOb", "No METAR available")
-        
-        taf_url = f"{API_BASE_URL}/taf?ids={icao_id}&format=json"
-        taf_response = requests.get(taf_url, timeout=5)
-        if taf_response.status_code == 200 and taf_response.json():
-            weather_data["TAF"] = taf_response.json()[0].get("rawOb", "No TAF available")
-        
-        pirep_url = f"{API_BASE_URL}/pirep?format=json"
-        pirep_response = requests.get(pirep_url, timeout=5)
-        if pirep_response.status_code == 200:
-            pireps = [p for p in pirep_response.json() if icao_id in p.get("rawOb", "")]
-            weather_data["PIREP"] = pireps[0].get("rawOb", "No recent PIREP") if pireps else "No recent PIREP"
-        
-        sigmet_url = f"{API_BASE_URL}/sigmet?format=json"
-        sigmet_response = requests.get(sigmet_url, timeout=5)
-        if sigmet_response.status_code == 200:
-            sigmets = [s for s in sigmet_response.json() if icao_id in s.get("rawOb", "")]
-            weather_data["SIGMET"] = sigmets[0].get("rawOb", "No active SIGMET") if sigmets else "No active SIGMET"
-        
-        return weather_data
-    except Exception as e:
-        return {"Error": f"Unable to fetch weather data for {icao_id}. Please try again later."}
-
-def classify_weather(weather_data):
-    """Classify weather as VFR, Significant, or Severe."""
-    metar = weather_data.get("METAR", "")
-    sigmet = weather_data.get("SIGMET", "")
-    if "No active SIGMET" in sigmet and ("CLR" in metar or "SKC" in metar):
-        return "VFR Conditions", "green"
-    elif "TS" in metar or "SEV" in sigmet:
-        return "Severe Weather Activity", "red"
-    else:
-        return "Significant Weather Activity", "yellow"
-    
+    return fetch_weather_batch([icao_id])[icao_id]
+
+def classify_weather(weather_data, advisories=()):
+    """Classify weather as VFR, Significant, or Severe, counting any advisory areas covering the station."""
+    assessment = WaypointAssessment(None, None, weather_data, advisories)
+    return assessment.label, assessment.color
+
+def product_text(weather_data, product):
+    """Return a fetched station product, or its "No ... available" placeholder when the station has none."""
+    _, missing = STATION_PRODUCTS[product]
+    return weather_data.get(product) or missing
+
+def weather_summary_fields(weather_data):
+    """Return a station's briefing fields as [(label, value), ...]."""
+    return [
+        ("Current Conditions", weather_data["METAR"]),
+        ("Forecast", weather_data["TAF"]),
+        ("Recent Reports", weather_data["PIREP"]),
+        ("SIGMETs", weather_data["SIGMET"]),
+    ]
+
 def get_weather_summary(departure, destination, flight_date):
     """Generate a weather summary for the flight route."""
     try:
-        departure_weather = fetch_weather_data(departure)
-        destination_weather = fetch_weather_data(destination)
+        weather_by_icao = fetch_weather_batch([departure, destination])
         
-        if "Error" in departure_weather or "Error" in destination_weather:
-            return None
-            
         summary = []
-        
-        # Departure weather
-        summary.append(f"### Departure ({departure})")
-        summary.append(f"*Current Conditions:* {departure_weather['METAR']}")
-        summary.append(f"*Forecast:* {departure_weather['TAF']}")
-        summary.append(f"*Recent Reports:* {departure_weather['PIREP']}")
-        summary.append(f"*SIGMETs:* {departure_weather['SIGMET']}")
-        
-        # Destination weather
-        summary.append(f"\n### Destination ({destination})")
-        summary.append(f"*Current Conditions:* {destination_weather['METAR']}")
-        summary.append(f"*Forecast:* {destination_weather['TAF']}")
-        summary.append(f"*Recent Reports:* {destination_weather['PIREP']}")
-        summary.append(f"*SIGMETs:* {destination_weather['SIGMET']}")
+        for heading, icao_id in (("Departure", departure), ("Destination", destination)):
+            if summary:
+                summary.append("")
+            summary.append(f"### {heading} ({icao_id})")
+            summary.extend(f"*{label}:* {value}" for label, value in weather_summary_fields(weather_by_icao[icao_id]))
         
         return "\n".join(summary)
     except Exception as e:
@@ -0,0 +1,214 @@
+# services/winds_aloft_service.py
+import re
+from collections import namedtuple
+import numpy as np
+from scipy.spatial import cKDTree
+from utils.geodesy import to_unit_vectors, chord_to_nm, densify_route, great_circle_nm, initial_courses
+
+# Constants
+WIND_NEIGHBORS = 4  # Forecast sites blended (inverse-distance squared) at each route point
+WIND_RADIUS_NM = 300  # Sites farther than this from a point don't describe its wind
+WIND_SPACING_NM = 10  # Max spacing of the route points where the wind is evaluated
+MIN_GROUNDSPEED_KT = 1.0  # Floor for the wind triangle when the wind exceeds the airspeed
+DEFAULT_TRUE_AIRSPEED_KT = 120
+DEFAULT_FUEL_BURN_GPH = 10.0
+SITE_PREFIXES = ("K", "P")  # FD sites drop the ICAO prefix: contiguous US "K", Alaska/Hawaii/Pacific "P"
+
+HEADER_RE = re.compile(r"^FT\s+\d")
+GROUP_RE = re.compile(r"^(\d{2})(\d{2})([+-]?\d{2})?$")
+
+# Per-sample arrays follow the densified route; per-leg arrays have len(waypoints) - 1 entries and
+# cumulative_hours has one per waypoint, starting at 0. covered is False where no forecast site was in range.
+RouteWinds = namedtuple("RouteWinds", [
+    "distances_nm", "headwind_kt", "covered", "leg_nm", "leg_headwind_kt", "leg_groundspeed_kt", "leg_hours", "leg_fuel_gal",
+    "cumulative_hours", "true_airspeed_kt",
+])
+
+def decode_wind_group(group):
+    """Decode one FD group (e.g. "2427+14", "731960", "9900") to (direction, speed_kt, temperature_c).
+
+    Direction and speed are None for a missing group; 9900 is light and variable
+    (speed 0). Directions of 51-86 encode speeds of 100 kt or more; six-digit
+    groups (above 24,000 ft) carry an implied negative temperature.
+    """
+    match = GROUP_RE.match(group or "")
+    if not match:
+        return None, None, None
+    direction, speed = int(match.group(1)), int(match.group(2))
+    if direction == 99 and speed == 0:
+        direction, speed = 0, 0
+    elif 51 <= direction <= 86:
+        direction, speed = direction - 50, speed + 100
+    temperature = match.group(3)
+    if temperature is not None:
+        temperature = int(temperature) if temperature[0] in "+-" else -int(temperature)
+    return direction * 10 % 360, speed, temperature
+
+def _locate_site(site, airport_table):
+    for prefix in SITE_PREFIXES:
+        if f"{prefix}{site}" in airport_table:
+            return airport_table[f"{prefix}{site}"]
+    return None
+
+def parse_winds_aloft(text, airport_table):
+    """Decode the winds/temps aloft (FD) text product into a WindGrid.
+
+    Each FT header gives the levels of the rows under it; a row is split by
+    column, a group belonging to the level whose header it ends under (levels
+    near or below the site's elevation are left blank in the product). Sites
+    are placed with the airport table; those it doesn't know are skipped.
+    """
+    columns = None
+    sites, lats, lons, rows = [], [], [], []
+    for line in (text or "").splitlines():
+        if HEADER_RE.match(line):
+            columns = [(match.end(), int(match.group())) for match in re.finditer(r"\d+", line)]
+            ends = np.array([end for end, _ in columns])
+            continue
+        tokens = list(re.finditer(r"\S+", line))
+        if columns is None or not tokens or not re.fullmatch(r"[A-Z0-9]{3}", tokens[0].group()):
+            continue
+        position = _locate_site(tokens[0].group(), airport_table)
+        if position is None:
+            continue
+        row = {}
+        for token in tokens[1:]:
+            row[columns[int(np.abs(ends - token.end()).argmin())][1]] = decode_wind_group(token.group())
+        sites.append(tokens[0].group())
+        lats.append(position[0])
+        lons.append(position[1])
+        rows.append(row)
+
+    altitudes = sorted({altitude for row in rows for altitude in row})
+    values = np.full((len(rows), len(altitudes), 3), np.nan)
+    for i, row in enumerate(rows):
+        for altitude, group in row.items():
+            values[i, altitudes.index(altitude)] = [np.nan if value is None else value for value in group]
+    return WindGrid(sites, lats, lons, altitudes, values[:, :, 0], values[:, :, 1], values[:, :, 2])
+
+class WindGrid:
+    """Forecast winds aloft on a site × altitude grid, interpolated at any point and altitude.
+
+    u and v are the wind's east and north components in knots (the way the air
+    moves), one row per site and one column per level in altitudes_ft, so
+    interpolation blends vectors rather than directions. Levels the product
+    leaves blank take the nearest forecast level of the same site. Sites are
+    3-D unit vectors in a KD-tree, as in services.pirep_service.
+    """
+
+    def __init__(self, sites, lats, lons, altitudes_ft, directions, speeds, temperatures):
+        directions = np.asarray(directions, dtype=np.float64)
+        speeds = np.asarray(speeds, dtype=np.float64)
+        levels = np.arange(directions.shape[1])
+        valid = ~np.isnan(speeds)
+        # Fill each site's blank levels from the level below, or above for the lowest ones
+        below = np.maximum.accumulate(np.where(valid, levels, -1), axis=1)
+        above = np.minimum.accumulate(np.where(valid, levels, len(levels))[:, ::-1], axis=1)[:, ::-1]
+        source = np.where(below >= 0, below, above)
+        forecast = valid.any(axis=1)
+        source = np.clip(source[forecast], 0, max(len(levels) - 1, 0))
+        rows = np.arange(forecast.sum())[:, None]
+
+        radians = np.radians(directions[forecast][rows, source])
+        self.sites = [site for site, keep in zip(sites, forecast) if keep]
+        self.lat = np.asarray(lats, dtype=np.float64)[forecast]
+        self.lon = np.asarray(lons, dtype=np.float64)[forecast]
+        self.altitudes_ft = np.asarray(altitudes_ft, dtype=np.float64)
+        self.u = -speeds[forecast][rows, source] * np.sin(radians)
+        self.v = -speeds[forecast][rows, source] * np.cos(radians)
+        self.temperature_c = np.asarray(temperatures, dtype=np.float64)[forecast]
+        self.vectors = to_unit_vectors(self.lat, self.lon).reshape(-1, 3)
+        self.tree = cKDTree(self.vectors) if len(self.vectors) else None
+
+    def __len__(self):
+        return len(self.sites)
+
+    def wind_at(self, lats, lons, altitudes_ft, radius_nm=WIND_RADIUS_NM):
+        """Interpolate (u, v, covered) at each point and altitude in one vectorized pass.
+
+        Each site's column is interpolated linearly to the altitude (clamped to
+        the product's levels), then the nearest WIND_NEIGHBORS sites within
+        radius_nm are blended by inverse distance squared. Points without a site
+        in range get still air and covered False.
+        """
+        points = to_unit_vectors(lats, lons).reshape(-1, 3)
+        altitudes = np.broadcast_to(np.asarray(altitudes_ft, dtype=np.float64), (len(points),))
+        if self.tree is None:
+            calm = np.zeros(len(points))
+            return calm, calm.copy(), np.zeros(len(points), dtype=bool)
+
+        k = min(WIND_NEIGHBORS, len(self))
+        chords, sites = self.tree.query(points, k=k)
+        chords, sites = chords.reshape(len(points), k), sites.reshape(len(points), k)
+        distances = chord_to_nm(chords)
+        weights = np.where(distances <= radius_nm, 1.0 / np.maximum(distances, 1.0) ** 2, 0.0)
+        total = weights.sum(axis=1)
+        covered = total > 0
+        weights = weights / np.where(covered, total, 1.0)[:, None]
+
+        level = np.interp(altitudes, self.altitudes_ft, np.arange(len(self.altitudes_ft)))
+        lo = np.floor(level).astype(np.intp)
+        hi = np.minimum(lo + 1, len(self.altitudes_ft) - 1)
+        fraction = (level - lo)[:, None]
+        u = (1.0 - fraction) * self.u[sites, lo[:, None]] + fraction * self.u[sites, hi[:, None]]
+        v = (1.0 - fraction) * self.v[sites, lo[:, None]] + fraction * self.v[sites, hi[:, None]]
+        return (weights * u).sum(axis=1), (weights * v).sum(axis=1), covered
+
+def route_winds(wind_grid, lats, lons, altitudes, true_airspeed_kt, fuel_burn_gph=DEFAULT_FUEL_BURN_GPH,
+                spacing_nm=WIND_SPACING_NM):
+    """Estimate headwinds, groundspeed and time en route along a route flown at the planned altitudes.
+
+    The route is densified (utils.geodesy.densify_route) to points no more than
+    spacing_nm apart, with the planned altitude interpolated along each leg, and
+    the wind is interpolated at every point at once. Each segment between points
+    is flown at the wind triangle's groundspeed for its mean wind and course.
+    Without a wind grid (or where no site is in range) still air is assumed.
+    Returns a RouteWinds, or None for a route with fewer than two waypoints.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    altitudes = np.asarray(altitudes, dtype=np.float64)
+    n_legs = len(lats) - 1
+    if n_legs < 1:
+        return None
+    sample_lats, sample_lons, leg_ids, fractions = densify_route(lats, lons, max_spacing_nm=spacing_nm)
+    sample_altitudes = altitudes[leg_ids] + fractions * (altitudes[np.minimum(leg_ids + 1, n_legs)] - altitudes[leg_ids])
+    if wind_grid is not None:
+        u, v, covered = wind_grid.wind_at(sample_lats, sample_lons, sample_altitudes)
+    else:
+        u, v, covered = np.zeros(len(sample_lats)), np.zeros(len(sample_lats)), np.zeros(len(sample_lats), dtype=bool)
+
+    # Segment i runs from sample i to sample i + 1 and belongs to the leg of its start
+    segment_nm = great_circle_nm(sample_lats[:-1], sample_lons[:-1], sample_lats[1:], sample_lons[1:])
+    course = np.radians(initial_courses(sample_lats[:-1], sample_lons[:-1], sample_lats[1:], sample_lons[1:]))
+    segment_u, segment_v = (u[:-1] + u[1:]) / 2.0, (v[:-1] + v[1:]) / 2.0
+    tailwind = segment_u * np.sin(course) + segment_v * np.cos(course)
+    crosswind = segment_u * np.cos(course) - segment_v * np.sin(course)
+    groundspeed = np.sqrt(np.maximum(true_airspeed_kt ** 2 - crosswind ** 2, 0.0)) + tailwind
+    segment_hours = segment_nm / np.maximum(groundspeed, MIN_GROUNDSPEED_KT)
+    segment_legs = leg_ids[:-1]
+
+    leg_nm = np.bincount(segment_legs, weights=segment_nm, minlength=n_legs)
+    leg_hours = np.bincount(segment_legs, weights=segment_hours, minlength=n_legs)
+    leg_tailwind = np.bincount(segment_legs, weights=tailwind * segment_nm, minlength=n_legs)
+    sample_hours = np.concatenate(([0.0], np.cumsum(segment_hours)))
+    leg_starts = np.searchsorted(leg_ids, np.arange(n_legs))
+    # Each point takes the course of the segment leaving it (the last one that of the final segment)
+    point_course = np.append(course, course[-1])
+    return RouteWinds(
+        distances_nm=np.concatenate(([0.0], np.cumsum(segment_nm))),
+        headwind_kt=-(u * np.sin(point_course) + v * np.cos(point_course)),
+        covered=covered,
+        leg_nm=leg_nm,
+        leg_headwind_kt=-leg_tailwind / np.where(leg_nm > 0, leg_nm, 1.0),
+        leg_groundspeed_kt=np.where(leg_hours > 0, leg_nm / np.where(leg_hours > 0, leg_hours, 1.0), true_airspeed_kt),
+        leg_hours=leg_hours,
+        leg_fuel_gal=leg_hours * fuel_burn_gph,
+        cumulative_hours=np.append(sample_hours[leg_starts], sample_hours[-1]),
+        true_airspeed_kt=float(true_airspeed_kt),
+    )
+
+def format_duration(hours):
+    """Format a duration in hours as "1 h 05 min"."""
+    minutes = int(round(hours * 60))
+    return f"{minutes // 60} h {minutes % 60:02d} min" if minutes >= 60 else f"{minutes} min"
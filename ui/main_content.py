@@ -1,19 +1,26 @@
+import itertools
 import streamlit as st
-from streamlit_folium import folium_static
+import streamlit.components.v1 as components
 import matplotlib.pyplot as plt
 from services.flight_plan_service import parse_flight_plan
-from services.weather_service import fetch_weather_data, classify_weather
+from services.weather_service import iter_weather_batch, cached_advisory_areas, cached_pirep_index, cached_wind_grid
+from services.winds_aloft_service import DEFAULT_TRUE_AIRSPEED_KT, DEFAULT_FUEL_BURN_GPH, format_duration
+from services.briefing_model import WaypointAssessment, build_briefing
 from utils.flight_history import save_flight_to_history
-from ui.weather_components import generate_summary, generate_detailed_report, create_weather_map
-from services.pilot_briefing_service import generate_pilot_briefing_from_route, export_briefing_to_pdf
+from ui.weather_components import (
+    generate_summary, generate_detailed_report, get_weather_map_html, render_weather_map_html, DEFAULT_MAP_STYLE
+)
+from services.pilot_briefing_service import build_pilot_briefing, briefing_pdf_filename
+from services.pdf_service import request_briefing_pdf, PDF_TIMEOUT
+from services.template_service import FORMAT_EXTENSIONS, render_document
 from ui.about_help import display_about_section, display_help_section
-from datetime import date
-import os
+from datetime import date, datetime, timezone
 from services.report_service import (
-    generate_weather_report, 
-    generate_weather_report_html,
-    get_download_link,
-    create_route_profile_chart
+    export_weather_report,
+    REPORT_MIME_TYPES,
+    create_route_profile_chart,
+    profile_winds_digest,
+    render_route_profile_png
 )
 
 def display_main_content(airport_coords):
@@ -28,85 +35,31 @@ def display_main_content(airport_coords):
         st.write("Format: ICAO,Altitude,ICAO,Altitude,... (e.g., KPHX,1500,KLAX,35000,KJFK,39000)")
         
         flight_plan = st.text_input("", placeholder="Enter flight plan here", key="flight_plan", value=st.session_state.get('flight_plan', ''))
+        # Departure time, airspeed and winds aloft give each waypoint an ETA for the TAF lookup
+        if "departure_date" not in st.session_state:
+            now = datetime.now(timezone.utc)
+            st.session_state.departure_date = now.date()
+            st.session_state.departure_time = now.time().replace(second=0, microsecond=0)
+        date_column, time_column, speed_column, fuel_column = st.columns(4)
+        date_column.date_input("Departure Date (UTC)", key="departure_date")
+        time_column.time_input("Departure Time (UTC)", key="departure_time")
+        speed_column.number_input("True Airspeed (kt)", min_value=30, max_value=700, value=DEFAULT_TRUE_AIRSPEED_KT, step=10, key="true_airspeed")
+        fuel_column.number_input("Fuel Burn (gal/hr)", min_value=1.0, max_value=5000.0, value=DEFAULT_FUEL_BURN_GPH, step=1.0, key="fuel_burn")
         submit = st.button("Generate Weather Briefing", key="generate_button")
 
         if 'weather_data_dict' not in st.session_state:
             st.session_state.weather_data_dict = {}
 
-        if submit:
-            if not flight_plan:
-                st.error("Please enter a valid flight plan.")
-                return
-
-            save_flight_to_history(flight_plan)
-
-            with st.spinner("Processing flight plan..."):
-                waypoints = parse_flight_plan(flight_plan, airport_coords)
-                if isinstance(waypoints, str):
-                    st.error(waypoints)
-                    return
-
-                weather_data_list = []
-                weather_data_dict = {}
-                summaries = []
-                detailed_reports = []
-
-                for icao_id, altitude in waypoints:
-                    with st.spinner(f"Fetching weather data for {icao_id}..."):
-                        weather_data = fetch_weather_data(icao_id)
-                        if "Error" in weather_data:
-                            st.error(weather_data["Error"])
-                            return
-
-                        classification, color = classify_weather(weather_data)
-                        weather_data["classification"] = (classification, color)
-
-                        weather_data_list.append(weather_data)
-                        weather_data_dict[icao_id] = weather_data
-                        summaries.append(generate_summary(weather_data, icao_id, altitude))
-                        detailed_reports.append(generate_detailed_report(weather_data, icao_id, altitude))
-
-                st.session_state.weather_data_dict = weather_data_dict
-
-            st.markdown("<hr>", unsafe_allow_html=True)
-
-            tab1, tab2, tab3, tab4 = st.tabs([
-                "Weather Summary", 
-                "Detailed Reports", 
-                "Weather Map", 
-                "Generate Report"
-            ])
-
-            with tab1:
-                st.markdown('<h3 class="text-2xl font-bold text-blue-600 mb-4">Weather Summary</h3>', unsafe_allow_html=True)
-                for summary in summaries:
-                    st.markdown(f'<div class="p-4 mb-4 border border-gray-300 rounded-lg bg-white">{summary}</div>', unsafe_allow_html=True)
-
-            with tab2:
-                st.markdown('<h3 class="text-2xl font-bold text-blue-600 mb-4">Detailed Weather Reports</h3>', unsafe_allow_html=True)
-                for i, (icao_id, altitude) in enumerate(waypoints, 1):
-                    with st.expander(f"Report for {icao_id} (Altitude: {altitude}ft)", expanded=False):
-                        st.markdown(detailed_reports[i-1], unsafe_allow_html=True)
-
-            with tab3:
-                st.markdown('<h3 class="text-2xl font-bold text-blue-600 mb-4">Weather Map Overlay</h3>', unsafe_allow_html=True)
-                weather_map = create_weather_map(waypoints, weather_data_list, airport_coords)
-                folium_static(weather_map, width=700, height=500)
-                st.markdown("""
-                    ### Legend
-                    - 🟢 Green: VFR Conditions
-                    - 🟡 Yellow: Significant Weather Activity
-                    - 🔴 Red: Severe Weather Activity
-                    - Heat Map: Shows intensity of weather conditions along route
-                """)
-                st.checkbox("Show/Hide Heatmap Layer", value=True, key="heatmap_visible")
-
-            with tab4:
-                st.markdown('<h3 class="text-2xl font-bold text-blue-600 mb-4">Flight Weather Profile</h3>', unsafe_allow_html=True)
-                
-                with st.spinner("Generating flight profile chart..."):
-                    fig = create_route_profile_chart(waypoints, weather_data_list, airport_coords)
-                    st.pyplot(fig)
+        if submit and not flight_plan:
+            st.error("Please enter a valid flight plan.")
+        elif submit:
+            departure = datetime.combine(st.session_state.departure_date, st.session_state.departure_time, tzinfo=timezone.utc)
+            run_weather_briefing(
+                flight_plan, airport_coords, departure.timestamp(), st.session_state.true_airspeed, st.session_state.fuel_burn
+            )
+        elif st.session_state.get("briefing_result") is not None:
+            # Results live in session state, so view interactions (map style, toggles) rerun without re-fetching
+            display_briefing_results(st.session_state.briefing_result, airport_coords)
 
     with main_tab2:
         st.title("Pilot Briefing")
@@ -120,17 +73,206 @@ def display_main_content(airport_coords):
                 st.warning("Please enter a valid flight route.")
             else:
                 with st.spinner("Fetching pilot briefing..."):
-                    briefing = generate_pilot_briefing_from_route(route_input, flight_date)
-                    st.markdown(briefing, unsafe_allow_html=True)
-
-                    route = route_input.split(',')
-                    departure = route[0].strip().upper()
-                    destination = route[-2].strip().upper() if len(route) > 2 else route[0].strip().upper()
+                    briefing = build_pilot_briefing(route_input, flight_date)
+                if briefing["error"]:
+                    st.warning(briefing["error"])
+                else:
+                    # The PDF renders in a worker process while the briefing is shown; both come from the same model
+                    pdf = request_briefing_pdf(briefing)
+                    st.markdown(render_document("pilot_briefing", "markdown", briefing), unsafe_allow_html=True)
 
-                    pdf_path = export_briefing_to_pdf(departure, destination, flight_date, briefing)
-                    with open(pdf_path, "rb") as f:
-                        st.download_button("Download Briefing as PDF", f, file_name=os.path.basename(pdf_path))
+                    try:
+                        with st.spinner("Preparing PDF..."):
+                            pdf_bytes = pdf.result(timeout=PDF_TIMEOUT)
+                    except Exception as e:
+                        st.error(f"Could not generate the PDF: {e}")
+                    else:
+                        st.download_button(
+                            "Download Briefing as PDF",
+                            pdf_bytes,
+                            file_name=briefing_pdf_filename(briefing),
+                            mime="application/pdf"
+                        )
 
     st.markdown("<hr>", unsafe_allow_html=True)
     display_about_section()
     display_help_section()
+
+def run_weather_briefing(flight_plan, airport_coords, departure_time=None, true_airspeed_kt=None,
+                         fuel_burn_gph=DEFAULT_FUEL_BURN_GPH):
+    """Fetch and assess the weather for a flight plan, rendering each waypoint as its data lands.
+
+    Summary cards fill in as stations land and are updated as the global feeds
+    arrive. The map and profile redraw from the leading run of waypoints received
+    so far, since a route with gaps would join stations that aren't adjacent. The finished briefing is kept in
+    session state for later reruns. departure_time (epoch seconds) and
+    true_airspeed_kt, corrected for the winds aloft, set each waypoint's ETA
+    for the forecast lookup and the estimated time en route and fuel.
+    """
+    save_flight_to_history(flight_plan)
+
+    with st.spinner("Processing flight plan..."):
+        waypoints = parse_flight_plan(flight_plan, airport_coords)
+    if isinstance(waypoints, str):
+        st.session_state.pop("briefing_result", None)
+        st.error(waypoints)
+        return
+
+    slots = create_result_layout(waypoints)
+    weather_by_icao = {}
+    degraded = {}
+    drawn = 0
+    with st.spinner(f"Fetching weather data for {len(waypoints)} waypoints..."):
+        for stations in iter_weather_batch(waypoints):
+            weather_by_icao.update(stations)
+            for icao_id, weather_data in stations.items():
+                # Stations are yielded again as feeds land; warn about each failed product once
+                new = [product for product in weather_data["Degraded"] if product not in degraded.get(icao_id, ())]
+                if new:
+                    degraded[icao_id] = list(weather_data["Degraded"])
+                    slots["warnings"].warning(f"Partial data for {icao_id}: {', '.join(new)} could not be retrieved.")
+
+            # The leading run of received waypoints, whose ETAs are already those of the full route
+            prefix = list(itertools.takewhile(lambda waypoint: waypoint[0] in weather_by_icao, waypoints))
+            partial = None
+            if prefix:
+                partial = build_briefing(
+                    prefix, weather_by_icao, airport_coords, cached_advisory_areas(),
+                    departure_time=departure_time, true_airspeed_kt=true_airspeed_kt,
+                    wind_grid=cached_wind_grid(), fuel_burn_gph=fuel_burn_gph
+                )
+            for i, (icao_id, altitude) in enumerate(waypoints):
+                if i < len(prefix) and (i >= drawn or icao_id in stations):
+                    render_summary(slots["summaries"][i], partial.assessments[i])
+                elif icao_id in stations:
+                    # Past a gap in the route: no ETA yet, so a provisional card with the current forecast
+                    render_summary(slots["summaries"][i], WaypointAssessment(icao_id, altitude, weather_by_icao[icao_id]))
+            prefix_changed = len(prefix) > drawn or any(icao_id in stations for icao_id, _ in prefix)
+            if prefix and len(prefix) < len(waypoints) and prefix_changed:
+                show_map(slots["map"], render_weather_map_html(partial, airport_coords, current_map_style()))
+                fig = create_route_profile_chart(partial, airport_coords)
+                slots["profile"].pyplot(fig)
+                plt.close(fig)
+            drawn = len(prefix)
+
+    # Classify every waypoint once; all tabs render from this model
+    briefing = build_briefing(
+        waypoints, weather_by_icao, airport_coords, cached_advisory_areas(), cached_pirep_index(),
+        departure_time, true_airspeed_kt, cached_wind_grid(), fuel_burn_gph
+    )
+    st.session_state.weather_data_dict = weather_by_icao
+    st.session_state.briefing_result = {
+        "flight_plan": flight_plan,
+        "briefing": briefing,
+        "degraded": degraded,
+    }
+    # Cards past a gap in the received route were provisional; redraw them all from the full briefing
+    for slot, assessment in zip(slots["summaries"], briefing.assessments):
+        render_summary(slot, assessment)
+    render_map_and_profile(slots, briefing, airport_coords)
+    render_detailed_reports(slots["details"], briefing)
+    render_report_downloads(slots["downloads"], flight_plan, briefing)
+
+def current_map_style():
+    return st.session_state.get("map_style", DEFAULT_MAP_STYLE)
+
+def create_result_layout(waypoints):
+    """Lay out the result tabs with a placeholder for each waypoint card, the map and the profile."""
+    slots = {"warnings": st.container()}
+    st.markdown("<hr>", unsafe_allow_html=True)
+
+    tab1, tab2, tab3, tab4 = st.tabs([
+        "Weather Summary", 
+        "Detailed Reports", 
+        "Weather Map", 
+        "Generate Report"
+    ])
+
+    with tab1:
+        st.markdown('<h3 class="text-2xl font-bold text-blue-600 mb-4">Weather Summary</h3>', unsafe_allow_html=True)
+        slots["summaries"] = []
+        for icao_id, altitude in waypoints:
+            slot = st.empty()
+            slot.markdown(f'<div class="p-4 mb-4 border border-gray-300 rounded-lg bg-white"><b>{icao_id} (Altitude: {altitude}ft)</b>: fetching weather...</div>', unsafe_allow_html=True)
+            slots["summaries"].append(slot)
+
+    with tab2:
+        st.markdown('<h3 class="text-2xl font-bold text-blue-600 mb-4">Detailed Weather Reports</h3>', unsafe_allow_html=True)
+        slots["details"] = st.container()
+
+    with tab3:
+        st.markdown('<h3 class="text-2xl font-bold text-blue-600 mb-4">Weather Map Overlay</h3>', unsafe_allow_html=True)
+        slots["map"] = st.empty()
+        st.markdown("""
+            ### Legend
+            - 🟢 Green: VFR Conditions
+            - 🟡 Yellow: Significant Weather Activity
+            - 🔴 Red: Severe Weather Activity
+            - Heat Map: Shows intensity of weather conditions along route
+            - Route legs: blue when clear at the planned altitude, amber or red when hazards overlap it
+            - Purple areas: Active SIGMETs; orange areas: G-AIRMETs (bold outline where the route crosses them)
+            
+            Use the layer control in the map's corner to show or hide the route, markers, heatmap and advisory areas.
+        """)
+
+    with tab4:
+        st.markdown('<h3 class="text-2xl font-bold text-blue-600 mb-4">Flight Weather Profile</h3>', unsafe_allow_html=True)
+        slots["profile"] = st.empty()
+        slots["flight_time"] = st.empty()
+        slots["downloads"] = st.container()
+    return slots
+
+def render_summary(slot, assessment):
+    slot.markdown(f'<div class="p-4 mb-4 border border-gray-300 rounded-lg bg-white">{generate_summary(assessment)}</div>', unsafe_allow_html=True)
+
+def show_map(slot, html):
+    with slot:
+        components.html(html, width=700, height=510)
+
+def render_map_and_profile(slots, briefing, airport_coords):
+    """Draw the final map and profile from their caches."""
+    show_map(slots["map"], get_weather_map_html(briefing, airport_coords, current_map_style()))
+    winds = briefing.winds
+    slots["profile"].image(render_route_profile_png(
+        tuple(briefing.waypoints), tuple(briefing.severities), tuple(briefing.hazard_spans), profile_winds_digest(winds),
+        briefing, airport_coords
+    ))
+    if winds is not None:
+        slots["flight_time"].markdown(
+            f"**Estimated time en route:** {format_duration(briefing.total_hours)} · "
+            f"**Fuel:** {briefing.total_fuel:.1f} gal ({winds.true_airspeed_kt:.0f} kt TAS, winds aloft at the planned altitudes)"
+        )
+
+def render_detailed_reports(container, briefing):
+    """List a toggle per waypoint; a detailed report is only generated once its toggle is switched on."""
+    with container:
+        for i, assessment in enumerate(briefing.assessments):
+            if st.toggle(f"Report for {assessment.icao} (Altitude: {assessment.altitude}ft)", key=f"details_{i}_{assessment.icao}"):
+                with st.container(border=True):
+                    st.markdown(generate_detailed_report(assessment), unsafe_allow_html=True)
+
+def render_report_downloads(container, flight_plan, briefing):
+    """Offer the weather report in every format, all rendered from one report model."""
+    exports = export_weather_report(flight_plan, briefing)
+    with container:
+        st.markdown('<h3 class="text-2xl font-bold text-blue-600 mb-4">Download Weather Report</h3>', unsafe_allow_html=True)
+        for column, (format_type, report) in zip(st.columns(len(exports)), exports.items()):
+            column.download_button(
+                f"Download {format_type.title()}",
+                report,
+                file_name=f"weather_report.{FORMAT_EXTENSIONS[format_type]}",
+                mime=REPORT_MIME_TYPES[format_type],
+                key=f"report_{format_type}"
+            )
+
+def display_briefing_results(result, airport_coords):
+    """Render the stored briefing in the summary, details, map and profile tabs."""
+    briefing = result["briefing"]
+    slots = create_result_layout(briefing.waypoints)
+    for icao_id, products in result["degraded"].items():
+        slots["warnings"].warning(f"Partial data for {icao_id}: {', '.join(products)} could not be retrieved.")
+    for slot, assessment in zip(slots["summaries"], briefing.assessments):
+        render_summary(slot, assessment)
+    render_map_and_profile(slots, briefing, airport_coords)
+    render_detailed_reports(slots["details"], briefing)
+    render_report_downloads(slots["downloads"], result["flight_plan"], briefing)
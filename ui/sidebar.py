@@ -1,6 +1,7 @@
 # ui/sidebar.py
 import streamlit as st
 from utils.flight_history import get_recent_flights
+from ui.weather_components import MAP_TILES
 
 def setup_sidebar():
     """Setup the sidebar with navigation, recent flights, and settings."""
@@ -27,8 +28,9 @@ def setup_sidebar():
         st.markdown("### Settings")
         map_style = st.selectbox(
             "Map Style",
-            ["CartoDB Positron", "OpenStreetMap", "Stamen Terrain"],
-            index=0
+            list(MAP_TILES),
+            index=0,
+            key="map_style"
         )
         
         display_units = st.radio(
@@ -1,85 +1,189 @@
 # ui/weather_components.py
+import threading
 import folium
+import numpy as np
+from cachetools import LRUCache
 from folium.plugins import HeatMap
-from services.weather_service import classify_weather
+from services.advisory_service import altitude_range_text
+from services.taf_decoder import format_time
+from utils.geodesy import densify_route, unwrap_longitudes
 
-def generate_summary(weather_data, icao_id, altitude):
+# Constants
+DEFAULT_MAP_STYLE = "CartoDB Positron"
+# Sidebar map style -> (folium tiles, attribution). Stamen's free tiles were retired,
+# so "Stamen Terrain" is served by the closest keyless terrain layer, OpenTopoMap.
+MAP_TILES = {
+    "CartoDB Positron": ("CartoDB Positron", None),
+    "OpenStreetMap": ("OpenStreetMap", None),
+    "Stamen Terrain": (
+        "https://{s}.tile.opentopomap.org/{z}/{x}/{y}.png",
+        "Map data: &copy; OpenStreetMap contributors, SRTM | Map style: &copy; OpenTopoMap (CC-BY-SA)",
+    ),
+}
+MAP_CACHE_BYTES = 32 * 1024 * 1024  # Rendered map HTML kept in memory, evicted least recently used
+HEATMAP_SPACING_NM = 20  # Keeps the heat trail continuous at the default zoom
+HEATMAP_INTENSITIES = (0.3, 0.6, 1.0)  # By severity: green, yellow, red
+ADVISORY_COLORS = {"SIGMET": "purple", "G-AIRMET": "orange"}
+LEG_COLORS = ("#3366cc", "#d97706", "#dc2626")  # Route legs by severity of the hazards at the planned altitude
+
+def source_note(weather_data, product):
+    """Describe where a product came from when it was substituted from a nearby station."""
+    source = weather_data.get("Sources", {}).get(product)
+    if not source:
+        return ""
+    station, distance = source
+    return f" (from {station}, {distance:.0f} NM away)"
+
+def generate_summary(assessment):
     """Generate a concise weather summary for a waypoint using an HTML list."""
-    summary = f"<b>{icao_id} (Altitude: {altitude}ft)</b>:<ul>"
-    metar = weather_data.get("METAR", "")
-    if "CLR" in metar or "SKC" in metar:
-        summary += "<li><b>Conditions</b>: Clear skies 🌞</li>"
-    elif "OVC" in metar or "BKN" in metar:
-        summary += "<li><b>Conditions</b>: Cloudy ☁️</li>"
+    weather_data = assessment.weather
+    summary = f"<b>{assessment.icao} (Altitude: {assessment.altitude}ft)</b>:<ul>"
+    observation = assessment.observation
+    metar_note = source_note(weather_data, "METAR")
+    if observation.sky_clear:
+        summary += f"<li><b>Conditions</b>: Clear skies 🌞{metar_note}</li>"
+    elif observation.ceiling_ft is not None:
+        summary += f"<li><b>Conditions</b>: Cloudy ☁️{metar_note}</li>"
+    else:
+        summary += f"<li><b>Conditions</b>: Variable 🌥️{metar_note}</li>"
+    taf_note = source_note(weather_data, "TAF")
+    forecast_label = f"Forecast at ETA {format_time(assessment.eta)}" if assessment.eta is not None else "Forecast now"
+    if assessment.forecast:
+        summary += f"<li><b>{forecast_label}</b>: {assessment.forecast} 📈{taf_note}</li>"
+    elif weather_data.get("TAF", ""):
+        summary += f"<li><b>Forecast</b>: {weather_data['TAF']} 📈{taf_note}</li>"
     else:
-        summary += "<li><b>Conditions</b>: Variable 🌥️</li>"
-    taf = weather_data.get("TAF", "")
-    summary += "<li><b>Forecast</b>: Stable conditions expected 📈</li>" if taf else "<li><b>Forecast</b>: Unavailable ❓</li>"
+        summary += "<li><b>Forecast</b>: Unavailable ❓</li>"
     pirep = weather_data.get("PIREP", "")
-    summary += "<li><b>Pilot Reports</b>: No significant issues ✅</li>" if "No recent PIREP" in pirep else f"<li><b>Pilot Reports</b>: {pirep} ✈️</li>"
+    if "PIREP" in assessment.unknown:
+        summary += "<li><b>Pilot Reports</b>: Unknown, feed unavailable ❓</li>"
+    else:
+        summary += f"<li><b>Pilot Reports</b>: {pirep} ✈️</li>" if assessment.has_pirep else "<li><b>Pilot Reports</b>: No significant issues ✅</li>"
     sigmet = weather_data.get("SIGMET", "")
-    summary += "<li><b>Hazards</b>: None reported 🟢</li>" if (("No active SIGMET" in sigmet) or (not sigmet)) else f"<li><b>Hazards</b>: {sigmet} ⚠️</li>"
+    hazards = [sigmet] if sigmet and sigmet != "No active SIGMET" and "SIGMET" not in assessment.unknown else []
+    hazards += [f"{area['kind']} {area['hazard']} ({altitude_range_text(area)})" for area in assessment.advisories]
+    hazards += [hazard["description"] for hazard in assessment.altitude_hazards]
+    summary += f"<li><b>Hazards</b>: {'; '.join(hazards)} ⚠️</li>" if hazards else "<li><b>Hazards</b>: None reported 🟢</li>"
+    if "SIGMET" in assessment.unknown:
+        summary += "<li><b>SIGMETs</b>: Unknown, feed unavailable ❓</li>"
     summary += "</ul>"
     return summary
 
-def generate_detailed_report(weather_data, icao_id, altitude):
+def generate_detailed_report(assessment):
     """Generate a detailed weather report for a waypoint with line breaks."""
-    report = f"<b>Detailed Weather Report for {icao_id} (Altitude: {altitude}ft)</b>:<br>"
-    report += f"- <b>METAR</b>: {weather_data.get('METAR', 'Unavailable')}<br>"
-    report += f"- <b>TAF</b>: {weather_data.get('TAF', 'Unavailable')}<br>"
+    weather_data = assessment.weather
+    report = f"<b>Detailed Weather Report for {assessment.icao} (Altitude: {assessment.altitude}ft)</b>:<br>"
+    report += f"- <b>METAR</b>: {weather_data.get('METAR', 'Unavailable')}{source_note(weather_data, 'METAR')}<br>"
+    report += f"- <b>TAF</b>: {weather_data.get('TAF', 'Unavailable')}{source_note(weather_data, 'TAF')}<br>"
     report += f"- <b>PIREP</b>: {weather_data.get('PIREP', 'No recent PIREP')}<br>"
     report += f"- <b>SIGMET</b>: {weather_data.get('SIGMET') if weather_data.get('SIGMET') else "No activate SIGMET"}<br>"
-    classification, _ = classify_weather(weather_data)
-    report += f"- <b>Weather Classification</b>: {classification}<br>"
+    report += f"- <b>Weather Classification</b>: {assessment.label} ({assessment.conditions})<br>"
     return report
 
-def create_weather_map(waypoints, weather_data_list, airport_coords):
-    """Create a Folium map with weather overlays and heatmap."""
-    lats = [airport_coords[icao][0] for icao, _ in waypoints]
-    lons = [airport_coords[icao][1] for icao, _ in waypoints]
-    center_lat = sum(lats) / len(lats)
-    center_lon = sum(lons) / len(lons)
+_map_cache = LRUCache(maxsize=MAP_CACHE_BYTES, getsizeof=len)
+_map_cache_lock = threading.Lock()
+
+def create_weather_map(briefing, airport_coords, map_style=DEFAULT_MAP_STYLE):
+    """Create a Folium map with the great-circle route, weather markers and heatmap."""
+    waypoints = briefing.waypoints
+    lats, lons = airport_coords.coordinates([icao for icao, _ in waypoints])
+    # Unwrap the waypoint longitudes the same way as the route so markers sit on the line across the antimeridian
+    lons = unwrap_longitudes(lons)
+    center_lat = float(lats.mean())
+    center_lon = float(lons.mean())
     
-    m = folium.Map(location=[center_lat, center_lon], zoom_start=5, tiles="CartoDB Positron")
+    tiles, attribution = MAP_TILES.get(map_style, MAP_TILES[DEFAULT_MAP_STYLE])
+    m = folium.Map(location=[center_lat, center_lon], zoom_start=5, tiles=tiles, attr=attribution)
+    # Each overlay is its own layer so the LayerControl toggles it in the browser, without a rerun
+    route_layer = folium.FeatureGroup(name="Route")
+    marker_layer = folium.FeatureGroup(name="Waypoint Weather")
+    heat_layer = folium.FeatureGroup(name="Weather Heatmap")
+    advisory_layer = folium.FeatureGroup(name="Advisory Areas")
     
+    # Add the route as great-circle polylines, dense only where the curvature needs it and
+    # coloured per leg by the hazards at the planned altitude
+    route_lats, route_lons, route_legs, _ = densify_route(lats, lons)
+    bounds = np.searchsorted(route_legs, np.arange(len(waypoints)))
+    bounds[-1] = len(route_lats)
+    for leg, hazards in enumerate(briefing.leg_hazards):
+        # Each leg's line runs to the first sample of the next leg, so the legs join up
+        stop = min(bounds[leg + 1] + 1, len(route_lats))
+        summary = "; ".join(f"{hazard['kind']}: {hazard['description']}" for hazard in hazards) or "No hazards at planned altitude"
+        folium.PolyLine(
+            list(zip(route_lats[bounds[leg]:stop].tolist(), route_lons[bounds[leg]:stop].tolist())),
+            color=LEG_COLORS[briefing.leg_severities[leg]],
+            weight=3,
+            opacity=0.8,
+            tooltip=f"{waypoints[leg][0]} → {waypoints[leg + 1][0]}: {summary}"
+        ).add_to(route_layer)
+
     # Add waypoint markers
-    for (icao_id, altitude), weather_data in zip(waypoints, weather_data_list):
-        lat, lon = airport_coords[icao_id]
-        classification, color = classify_weather(weather_data)
+    for assessment, lat, lon in zip(briefing.assessments, lats.tolist(), lons.tolist()):
         folium.CircleMarker(
             location=[lat, lon],
             radius=12,
-            popup=folium.Popup(f"<b>{icao_id}</b><br>Altitude: {altitude}ft<br>{classification}", max_width=300),
-            color=color,
+            popup=folium.Popup(f"<b>{assessment.icao}</b><br>Altitude: {assessment.altitude}ft<br>{assessment.label} ({assessment.conditions})", max_width=300),
+            color=assessment.color,
             fill=True,
-            fill_color=color,
+            fill_color=assessment.color,
             fill_opacity=0.7
-        ).add_to(m)
+        ).add_to(marker_layer)
 
-    # Prepare heatmap data
-    heat_data = []
-    for i in range(len(waypoints)-1):
-        start_lat, start_lon = airport_coords[waypoints[i][0]]
-        end_lat, end_lon = airport_coords[waypoints[i+1][0]]
-        _, color = classify_weather(weather_data_list[i])
-        intensity = 0.3 if color == "green" else 0.6 if color == "yellow" else 1.0
-        steps = 10
-        for step in range(steps + 1):
-            factor = step / steps
-            lat = start_lat + factor * (end_lat - start_lat)
-            lon = start_lon + factor * (end_lon - start_lon)
-            heat_data.append([lat, lon, intensity])
+    # Prepare heatmap data: evenly spaced great-circle samples, each taking its leg's severity
+    # raised to that of any advisory area the route is crossing there
+    heat_lats, heat_lons, leg_ids, fractions = densify_route(lats, lons, max_spacing_nm=HEATMAP_SPACING_NM)
+    severity = np.asarray(briefing.severities)[leg_ids]
+    if briefing.geometry is not None:
+        along_nm = briefing.geometry.cumulative_nm[leg_ids] + fractions * briefing.geometry.leg_nm[leg_ids]
+        severity = np.maximum(severity, briefing.span_severity(along_nm).astype(int))
+    intensities = np.asarray(HEATMAP_INTENSITIES)[severity]
+    heat_data = np.column_stack((heat_lats, heat_lons, intensities)).tolist()
     
     # Add heatmap layer
     HeatMap(
         heat_data,
         radius=15,
         blur=10,
-        gradient={'0.3': 'blue', '0.6': 'yellow', '1': 'red'},
-        name='Weather Heatmap'
-    ).add_to(m)
+        gradient={'0.3': 'blue', '0.6': 'yellow', '1': 'red'}
+    ).add_to(heat_layer)
+
+    # Add SIGMET and G-AIRMET polygons, outlining the ones the route crosses
+    crossed = set(briefing.crossed_areas)
+    for i, area in enumerate(briefing.advisory_areas):
+        folium.Polygon(
+            area["coords"],
+            color=ADVISORY_COLORS.get(area["kind"], "purple"),
+            weight=4 if i in crossed else 2,
+            fill=True,
+            fill_opacity=0.15,
+            tooltip=f"{area['kind']} {area['hazard']} {altitude_range_text(area)}",
+            popup=folium.Popup(area["raw"] or area["hazard"], max_width=400)
+        ).add_to(advisory_layer)
+
+    for layer in (route_layer, heat_layer, advisory_layer, marker_layer):
+        layer.add_to(m)
     
     # Add layer control
-    folium.LayerControl().add_to(m)
+    folium.LayerControl(collapsed=False).add_to(m)
     
-    return m
\ No newline at end of file
+    return m
+
+def render_weather_map_html(briefing, airport_coords, map_style=DEFAULT_MAP_STYLE):
+    """Render the weather map to standalone HTML without caching (used for partial, streaming briefings)."""
+    return folium.Figure().add_child(create_weather_map(briefing, airport_coords, map_style)).render()
+
+def get_weather_map_html(briefing, airport_coords, map_style=DEFAULT_MAP_STYLE):
+    """Return the weather map as standalone HTML, cached per (waypoints, weather snapshot, map style).
+
+    The map is fully determined by the route, the fetched weather and the tiles, so
+    re-submitting a recent route reuses the rendered HTML instead of rebuilding it.
+    """
+    key = (tuple(briefing.waypoints), briefing.weather_digest, map_style)
+    with _map_cache_lock:
+        html = _map_cache.get(key)
+    if html is None:
+        html = render_weather_map_html(briefing, airport_coords, map_style)
+        if len(html) <= MAP_CACHE_BYTES:
+            with _map_cache_lock:
+                _map_cache[key] = html
+    return html
@@ -0,0 +1,54 @@
+# utils/altitude_index.py
+import numpy as np
+
+class AltitudeIndex:
+    """Static interval tree over altitude ranges (feet), answering "what overlaps this band?".
+
+    Intervals are sorted by base and a segment tree keeps the highest top under
+    each node. A query binary-searches the intervals whose base lies at or below
+    the band's top, then descends only into nodes whose highest top reaches the
+    band's bottom, so it costs O((k + 1) log n) for k matches. A top of None means
+    unbounded. Items come back in order of base.
+    """
+
+    def __init__(self, bases, tops, items=None):
+        bases = np.asarray(bases, dtype=np.float64).reshape(-1)
+        tops = np.array([np.inf if top is None else top for top in tops], dtype=np.float64).reshape(-1)
+        items = list(range(len(bases))) if items is None else list(items)
+        order = np.argsort(bases, kind="stable")
+        self.bases = bases[order]
+        self.tops = tops[order]
+        self.items = [items[i] for i in order]
+
+        # Implicit binary tree: node 1 is the root, leaves start at self.size
+        self.size = 1 << max(len(self.bases) - 1, 0).bit_length()
+        tree = np.full(2 * self.size, -np.inf)
+        tree[self.size:self.size + len(self.tops)] = self.tops
+        level = self.size
+        while level > 1:
+            tree[level // 2:level] = np.maximum(tree[level:2 * level:2], tree[level + 1:2 * level:2])
+            level //= 2
+        self.max_top = tree
+
+    def __len__(self):
+        return len(self.items)
+
+    def overlapping(self, low, high=None):
+        """Return the items whose range overlaps [low, high] (a single altitude when high is None)."""
+        high = low if high is None else high
+        end = int(np.searchsorted(self.bases, high, side="right"))
+        matches = []
+        stack = [1] if end else []
+        while stack:
+            node = stack.pop()
+            if self.max_top[node] < low:
+                continue
+            depth = node.bit_length() - 1
+            start = (node - (1 << depth)) * (self.size >> depth)
+            if start >= end:
+                continue
+            if node >= self.size:
+                matches.append(node - self.size)
+            else:
+                stack.extend((2 * node + 1, 2 * node))
+        return [self.items[i] for i in matches]
@@ -0,0 +1,154 @@
+# utils/geodesy.py
+from collections import namedtuple
+import numpy as np
+
+# Constants
+EARTH_RADIUS_NM = 3440.065
+DENSIFY_TOLERANCE_NM = 2.0  # Max gap between a drawn route segment and the true great circle
+
+# Per-leg arrays have len(waypoints) - 1 entries; cumulative_nm starts at 0 and has one per waypoint
+RouteGeometry = namedtuple("RouteGeometry", ["leg_nm", "cumulative_nm", "courses_deg", "mid_lats", "mid_lons"])
+
+def to_unit_vectors(lats, lons):
+    """Convert latitude/longitude arrays in degrees to (n, 3) unit vectors on the sphere."""
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+def from_unit_vectors(vectors):
+    """Convert (n, 3) vectors back to latitude/longitude arrays in degrees."""
+    vectors = np.asarray(vectors, dtype=np.float64)
+    x, y, z = vectors[..., 0], vectors[..., 1], vectors[..., 2]
+    return np.degrees(np.arctan2(z, np.hypot(x, y))), np.degrees(np.arctan2(y, x))
+
+def nm_to_chord(distance_nm):
+    """Convert a great-circle distance in NM to the straight-line chord between unit vectors."""
+    return 2.0 * np.sin(np.asarray(distance_nm, dtype=np.float64) / (2.0 * EARTH_RADIUS_NM))
+
+def chord_to_nm(chord):
+    """Convert a chord length between unit vectors to a great-circle distance in NM."""
+    return 2.0 * EARTH_RADIUS_NM * np.arcsin(np.clip(np.asarray(chord, dtype=np.float64) / 2.0, 0.0, 1.0))
+
+def angle_between(a, b):
+    """Return the angle in radians between matching rows of two unit-vector arrays."""
+    cross = np.linalg.norm(np.cross(a, b), axis=-1)
+    dot = np.sum(a * b, axis=-1)
+    return np.arctan2(cross, dot)
+
+def points_on_legs(starts, ends, leg_ids, fractions):
+    """Return unit vectors at the given fractions along great-circle legs (one fraction per sample)."""
+    omega = angle_between(starts, ends)[leg_ids][:, None]
+    f = np.asarray(fractions, dtype=np.float64)[:, None]
+    sin_omega = np.sin(omega)
+    degenerate = sin_omega < 1e-12
+    safe = np.where(degenerate, 1.0, sin_omega)
+    w_start = np.where(degenerate, 1.0 - f, np.sin((1.0 - f) * omega) / safe)
+    w_end = np.where(degenerate, f, np.sin(f * omega) / safe)
+    points = w_start * starts[leg_ids] + w_end * ends[leg_ids]
+    return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+def sample_legs(starts, ends, max_spacing_nm):
+    """Sample many great-circle legs at once, no more than max_spacing_nm apart.
+
+    starts and ends are (L, 3) unit-vector arrays. Returns (points, leg_ids,
+    fractions): the (N, 3) sample vectors, the leg each sample belongs to and
+    its fraction along that leg. Both endpoints of every leg are included.
+    """
+    starts = np.atleast_2d(np.asarray(starts, dtype=np.float64))
+    ends = np.atleast_2d(np.asarray(ends, dtype=np.float64))
+    omega = angle_between(starts, ends)
+    counts = np.maximum(np.ceil(omega * EARTH_RADIUS_NM / max_spacing_nm).astype(np.intp), 1) + 1
+
+    leg_ids = np.repeat(np.arange(len(starts)), counts)
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    fractions = (np.arange(counts.sum()) - offsets) / (counts[leg_ids] - 1)
+    return points_on_legs(starts, ends, leg_ids, fractions), leg_ids, fractions
+
+def unwrap_longitudes(lons):
+    """Make a longitude sequence continuous (e.g. 179, 181 instead of 179, -179) for map polylines."""
+    return np.degrees(np.unwrap(np.radians(np.asarray(lons, dtype=np.float64))))
+
+def densify_route(lats, lons, tolerance_nm=DENSIFY_TOLERANCE_NM, max_spacing_nm=None, max_depth=16):
+    """Sample a route's great-circle legs adaptively for drawing on a map.
+
+    Each leg starts as one straight lat/lon segment; every segment whose midpoint
+    strays more than tolerance_nm from the true great circle (or that is longer
+    than max_spacing_nm, when given) is halved, all segments of all legs at once,
+    until every segment is within tolerance. Short hops therefore stay at two
+    points while long legs get as many as their curvature needs.
+
+    Returns (lats, lons, leg_ids, fractions) for the samples in route order.
+    Longitudes are unwrapped, so legs crossing the antimeridian draw as one
+    continuous line rather than wrapping around the globe.
+    """
+    vectors = to_unit_vectors(lats, lons)
+    starts, ends = vectors[:-1], vectors[1:]
+    n_legs = len(starts)
+    if n_legs == 0:
+        return np.asarray(lats, dtype=np.float64), unwrap_longitudes(lons), np.zeros(len(vectors), dtype=np.intp), np.zeros(len(vectors))
+    leg_nm = EARTH_RADIUS_NM * angle_between(starts, ends)
+
+    seg_leg = np.arange(n_legs)
+    seg_lo = np.zeros(n_legs)
+    seg_hi = np.ones(n_legs)
+    done_leg, done_lo = [], []
+    for _ in range(max_depth):
+        lo_lat, lo_lon = from_unit_vectors(points_on_legs(starts, ends, seg_leg, seg_lo))
+        hi_lat, hi_lon = from_unit_vectors(points_on_legs(starts, ends, seg_leg, seg_hi))
+        mid_lat, mid_lon = from_unit_vectors(points_on_legs(starts, ends, seg_leg, (seg_lo + seg_hi) / 2.0))
+        # Where a straight map segment would put the midpoint (longitude difference taken the short way)
+        dlon = (hi_lon - lo_lon + 180.0) % 360.0 - 180.0
+        error = great_circle_nm(mid_lat, mid_lon, (lo_lat + hi_lat) / 2.0, lo_lon + dlon / 2.0)
+        split = error > tolerance_nm
+        if max_spacing_nm is not None:
+            split |= (seg_hi - seg_lo) * leg_nm[seg_leg] > max_spacing_nm
+        done_leg.append(seg_leg[~split])
+        done_lo.append(seg_lo[~split])
+        if not split.any():
+            break
+        mid = (seg_lo[split] + seg_hi[split]) / 2.0
+        seg_leg = np.concatenate((seg_leg[split], seg_leg[split]))
+        seg_lo, seg_hi = np.concatenate((seg_lo[split], mid)), np.concatenate((mid, seg_hi[split]))
+    else:
+        done_leg.append(seg_leg)
+        done_lo.append(seg_lo)
+
+    # Every segment contributes its start; the route's final waypoint closes the line
+    leg_ids = np.concatenate(done_leg + [[n_legs - 1]]).astype(np.intp)
+    fractions = np.concatenate(done_lo + [[1.0]])
+    order = np.lexsort((fractions, leg_ids))
+    leg_ids, fractions = leg_ids[order], fractions[order]
+    sample_lats, sample_lons = from_unit_vectors(points_on_legs(starts, ends, leg_ids, fractions))
+    return sample_lats, unwrap_longitudes(sample_lons), leg_ids, fractions
+
+def great_circle_nm(lats1, lons1, lats2, lons2):
+    """Haversine distance in NM between matching (broadcastable) coordinate arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lats1, lons1, lats2, lons2))
+    a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_NM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def initial_courses(lats1, lons1, lats2, lons2):
+    """Initial true course in degrees [0, 360) from each start point to each end point."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lats1, lons1, lats2, lons2))
+    dlon = lon2 - lon1
+    y = np.sin(dlon) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlon)
+    return np.degrees(np.arctan2(y, x)) % 360.0
+
+def route_geometry(lats, lons):
+    """Compute leg distances, cumulative distance, initial courses and leg midpoints for a route."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    leg_nm = great_circle_nm(lats[:-1], lons[:-1], lats[1:], lons[1:])
+    cumulative_nm = np.concatenate(([0.0], np.cumsum(leg_nm)))
+    courses = initial_courses(lats[:-1], lons[:-1], lats[1:], lons[1:])
+    vectors = to_unit_vectors(lats, lons)
+    mid_lats, mid_lons = from_unit_vectors(vectors[:-1] + vectors[1:])
+    return RouteGeometry(leg_nm, cumulative_nm, courses, mid_lats, mid_lons)
+
+def distance_matrix(lats_a, lons_a, lats_b, lons_b):
+    """Great-circle distances in NM between every airport in set A (rows) and set B (columns)."""
+    return EARTH_RADIUS_NM * angle_between(
+        to_unit_vectors(lats_a, lons_a)[:, None, :], to_unit_vectors(lats_b, lons_b)[None, :, :]
+    )
@@ -0,0 +1,99 @@
+# utils/weather_cache.py
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from cachetools import TLRUCache
+
+# Constants
+MAX_CACHED_PRODUCTS = 4096  # Shared by every session in the process; least recently used entries go first
+METAR_REFRESH_MINUTE = 58  # Routine METARs are issued around HH:51-HH:56 and appear upstream shortly after
+METAR_ROUTINE_MINUTE = 45  # Observations from HH:45 on are the routine hourly report; earlier ones are SPECIs
+TAF_ISSUE_HOURS = (0, 6, 12, 18)  # Routine TAF issuance, UTC
+TAF_ISSUE_LEAD = timedelta(minutes=40)  # Routine TAFs are issued up to this long before their valid hour
+TAF_AMENDMENT_WINDOW = timedelta(minutes=30)  # Re-check at least this often so amendments are picked up
+FEED_TTL_SECONDS = 300  # PIREP and SIGMET feeds change continuously
+WINDS_TTL_SECONDS = 3600  # Winds aloft are issued four times a day
+MISSING_TTL_SECONDS = 300  # Stations that reported nothing are re-asked after this long
+STALE_RETRY_SECONDS = 300  # Reports already due to be replaced are re-asked after this long
+
+def _next_metar_issue(now, observed=None):
+    """Return when the METAR replacing the one observed at `observed` should be available.
+
+    A routine report is replaced by the next hour's and a SPECI by the routine
+    report of its own hour. Without an observation time, the next routine issue after now.
+    """
+    if observed is None:
+        issue = now.replace(minute=METAR_REFRESH_MINUTE, second=0, microsecond=0)
+        return issue if issue > now else issue + timedelta(hours=1)
+    issue = observed.replace(minute=METAR_REFRESH_MINUTE, second=0, microsecond=0)
+    return issue + timedelta(hours=1) if observed.minute >= METAR_ROUTINE_MINUTE else issue
+
+def _next_taf_refresh(now, issued=None):
+    """Return when the TAF issued at `issued` may be replaced: the next routine issue or amendment check, whichever comes first.
+
+    Routine TAFs come out up to TAF_ISSUE_LEAD before their valid hour, so the
+    one following a TAF is that of the first routine hour beyond its own.
+    Without an issue time, the next routine hour after now.
+    """
+    reference = now if issued is None else issued + TAF_ISSUE_LEAD
+    day = reference.replace(hour=0, minute=0, second=0, microsecond=0)
+    issues = [day.replace(hour=h) for h in TAF_ISSUE_HOURS] + [day + timedelta(days=1)]
+    next_issue = min(issue for issue in issues if issue > reference)
+    if issued is not None:
+        next_issue -= TAF_ISSUE_LEAD
+    return min(next_issue, now + TAF_AMENDMENT_WINDOW)
+
+def product_expiry(product, value, now, issued=None):
+    """Return the epoch time at which a cached product stops being valid.
+
+    issued is the report's observation (METAR) or issue (TAF) time in epoch
+    seconds; station products are timed from it when known, so a report that
+    is already due to be replaced is only kept for STALE_RETRY_SECONDS.
+    """
+    if not value:
+        return now + MISSING_TTL_SECONDS
+    current = datetime.fromtimestamp(now, tz=timezone.utc)
+    reported = datetime.fromtimestamp(issued, tz=timezone.utc) if issued is not None else None
+    if product == "METAR":
+        expiry = _next_metar_issue(current, reported).timestamp()
+    elif product == "TAF":
+        expiry = _next_taf_refresh(current, reported).timestamp()
+    elif product == "WINDS":
+        return now + WINDS_TTL_SECONDS
+    else:
+        return now + FEED_TTL_SECONDS
+    return expiry if expiry > now else now + STALE_RETRY_SECONDS
+
+def _time_to_use(key, entry, now):
+    """cachetools TLRU hook: expire each entry according to its product's validity."""
+    _, product = key
+    value, issued = entry
+    return product_expiry(product, value, now, issued)
+
+_cache = TLRUCache(maxsize=MAX_CACHED_PRODUCTS, ttu=_time_to_use, timer=time.time)
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+def get_product(station, product):
+    """Return the cached product for a station, or None when it is absent or expired."""
+    with _lock:
+        entry = _cache.get((station, product))
+        _stats["hits" if entry is not None else "misses"] += 1
+        return entry[0] if entry is not None else None
+
+def put_product(station, product, value, issued=None):
+    """Store a freshly fetched product for a station, with its observation or issue time (epoch seconds) when known."""
+    with _lock:
+        _cache[(station, product)] = (value, issued)
+
+def cache_stats():
+    """Return hit/miss counters and the current number of cached products."""
+    with _lock:
+        return {"hits": _stats["hits"], "misses": _stats["misses"], "size": len(_cache)}
+
+def clear_cache():
+    """Drop every cached product and reset the counters."""
+    with _lock:
+        _cache.clear()
+        _stats["hits"] = 0
+        _stats["misses"] = 0